@@ -0,0 +1,41 @@
+"""
+Benchmark of the advertising report decoding used by blescan.parse_events, comparing the original
+string/dict based decoder with the struct based decoder on the recorded HCI packet corpus.
+
+Usage: python benchmarks/bench_blescan.py
+"""
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from Drivers.Tilt.decoder import decode_packet
+from hci_corpus import load_corpus, legacy_decode_packet
+
+
+def bench(decoder, corpus, repeat=5, number=50):
+    """
+    Returns the best time per packet in microseconds
+    """
+    def run():
+        for pkt in corpus:
+            decoder(pkt)
+
+    best = min(timeit.repeat(run, repeat=repeat, number=number))
+    return best / (number * len(corpus)) * 1e6
+
+
+def main():
+    corpus = load_corpus()
+    legacy = bench(legacy_decode_packet, corpus)
+    current = bench(decode_packet, corpus)
+    print(f'{len(corpus)} packets')
+    print(f'legacy decoder:  {legacy:.2f} us/packet')
+    print(f'struct decoder:  {current:.2f} us/packet ({legacy / current:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
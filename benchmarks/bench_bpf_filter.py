@@ -0,0 +1,101 @@
+"""
+Measurement harness for the kernel side BPF filter of the Tilt scanner.
+
+The recorded HCI packet corpus is replayed at a fixed rate through a socketpair, and the number of
+packets delivered to the receiving end, i.e. the number of times the scanner would be woken up, is
+reported per second without a filter, with the iBeacon filter and with the Tilt uuid filter.
+
+Usage: python benchmarks/bench_bpf_filter.py [--rate PACKETS_PER_SECOND] [--duration SECONDS]
+"""
+import argparse
+import itertools
+import os
+import socket
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from Drivers.Tilt.bpf import ibeacon_filter, attach_filter
+from hci_corpus import load_corpus
+
+
+PURPLE_UUID = bytes.fromhex('a495bb40c5b14b44b5121370f02d74de')
+
+
+def replay(corpus, program, rate, duration):
+    """
+    Replays the corpus at the given rate for the given duration.
+    Returns the number of packets sent and delivered.
+    """
+    receiver, sender = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    receiver.settimeout(0.5)
+    delivered = 0
+
+    if program is not None:
+        attach_filter(receiver, program)
+
+    def receive():
+        nonlocal delivered
+
+        while True:
+            try:
+                if not receiver.recv(260):
+                    return
+                delivered += 1
+
+            except socket.timeout:
+                continue
+
+    thread = threading.Thread(target=receive)
+    thread.start()
+
+    sent = 0
+    start = time.monotonic()
+    packets = itertools.cycle(corpus)
+
+    while True:
+        elapsed = time.monotonic() - start
+
+        if elapsed >= duration:
+            break
+
+        # send the packets that are due and sleep a little, keeping the average rate
+        while sent < elapsed * rate:
+            sender.send(next(packets))
+            sent += 1
+
+        time.sleep(0.001)
+
+    sender.close()
+    thread.join()
+    receiver.close()
+    return sent, delivered
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rate', type=float, default=2000.0, help='replayed packets per second')
+    parser.add_argument('--duration', type=float, default=3.0, help='seconds per measurement')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    modes = [
+        ('no filter', None),
+        ('ibeacon filter', ibeacon_filter()),
+        ('tilt filter', ibeacon_filter([PURPLE_UUID])),
+    ]
+
+    print(f'replaying {len(corpus)} packets at {args.rate:.0f} packets/s for {args.duration:.1f}s per mode')
+
+    for name, program in modes:
+        sent, delivered = replay(corpus, program, args.rate, args.duration)
+        print(f'{name:15} {delivered / args.duration:9.1f} packets/s delivered of {sent / args.duration:.1f} sent '
+              f'({100.0 * delivered / sent:.1f}%)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of software SPI throughput for each GPIO backend.
+
+The RPi.GPIO backend runs against a stand-in module counting the library calls, so the figure is the
+Python side overhead only. The memory mapped backend runs against a fake register file mapped from
+a regular temp file, which performs the same register writes as /dev/gpiomem.
+
+Usage: python benchmarks/bench_gpio.py
+"""
+import os
+import sys
+import tempfile
+import timeit
+from unittest.mock import MagicMock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+
+try:
+    import RPi.GPIO
+except ImportError:
+    sys.modules['RPi.GPIO'] = MagicMock()
+    sys.modules['RPi'] = MagicMock(GPIO=sys.modules['RPi.GPIO'])
+
+from Drivers.GpioBackend import RPiGpioBackend, MemoryMappedGpioBackend
+from Drivers.SPI import BitBangSPI
+
+
+class CountingGPIO:
+    """
+    Minimal RPi.GPIO stand-in counting calls
+    """
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self):
+        self.calls = 0
+
+    def setup(self, pin, direction):
+        pass
+
+    def output(self, pin, value):
+        self.calls += 1
+
+    def input(self, pin):
+        self.calls += 1
+        return 0
+
+
+def bench(gpio, data, number=50):
+    """
+    Returns the transfer throughput in bytes per second
+    """
+    spi = BitBangSPI(cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11, gpio=gpio)
+    best = min(timeit.repeat(lambda: spi.transfer(data), repeat=5, number=number))
+    return len(data) * number / best
+
+
+def main():
+    data = bytes(range(256))
+
+    counting = CountingGPIO()
+    rpi = bench(RPiGpioBackend(counting), data)
+    calls = counting.calls / (5 * 50 * len(data))
+    print(f'rpi.gpio backend: {rpi / 1000:8.1f} kB/s ({calls:.1f} library calls/byte)')
+
+    fd, path = tempfile.mkstemp()
+
+    try:
+        os.write(fd, bytes(MemoryMappedGpioBackend.BLOCK_SIZE))
+        os.close(fd)
+        gpio = MemoryMappedGpioBackend(path=path)
+        mapped = bench(gpio, data)
+        gpio.cleanup()
+
+    finally:
+        os.remove(path)
+
+    print(f'gpiomem backend:  {mapped / 1000:8.1f} kB/s ({mapped / rpi:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
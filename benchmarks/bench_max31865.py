@@ -0,0 +1,58 @@
+"""
+Benchmark of MAX31865 temperature reads for each SPI transport against the emulated chip.
+The conversion wait is skipped, so only the cost of the register transactions is measured.
+
+Usage: python benchmarks/bench_max31865.py
+"""
+import os
+import sys
+import timeit
+from unittest.mock import MagicMock, patch
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+
+try:
+    import RPi.GPIO
+except ImportError:
+    sys.modules['RPi.GPIO'] = MagicMock()
+    sys.modules['RPi'] = MagicMock(GPIO=sys.modules['RPi.GPIO'])
+
+from Drivers.MAX31865 import MAX31865
+from Drivers.SPI import BitBangSPI, HardwareSPI
+from Drivers.GpioBackend import RPiGpioBackend
+from Drivers.Fakes.FakeMAX31865 import FakeMAX31865, FakeSpiDev, FakeGPIO
+
+
+def bitbang(chip):
+    gpio = FakeGPIO(chip, cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11)
+    return BitBangSPI(cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11, gpio=RPiGpioBackend(gpio))
+
+
+def spidev(chip):
+    return HardwareSPI(spi_device=FakeSpiDev(chip))
+
+
+def bench(transport, conversion_mode, number=200):
+    """
+    Returns the best time per temperature read in microseconds and the transactions per read
+    """
+    chip = FakeMAX31865()
+
+    with patch('time.sleep'):
+        sensor = MAX31865(spi=transport(chip), conversion_mode=conversion_mode)
+        chip.transactions = 0
+        best = min(timeit.repeat(sensor.temperature, repeat=5, number=number))
+
+    return best / number * 1e6, chip.transactions / (5 * number)
+
+
+def main():
+    for name, transport in [('bitbang', bitbang), ('spidev', spidev)]:
+        for conversion_mode in MAX31865.CONVERSION_MODES:
+            per_read, transactions = bench(transport, conversion_mode)
+            print(f'{name:8} {conversion_mode:11} {per_read:9.1f} us/read, {transactions:.0f} transactions/read')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Benchmark of the per event cost of the metrics instrumentation: counter increments, histogram observations and
+a timed observation as done around sensor reads and packet decoding, plus the time to render the registry.
+
+Usage: python benchmarks/bench_metrics.py
+"""
+import os
+import sys
+import time
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+
+from Drivers.Metrics import MetricsRegistry
+
+
+NUMBER = 200000
+
+
+def bench(name, statement):
+    seconds = min(timeit.repeat(statement, number=NUMBER, repeat=5))
+    print(f'{name:<24} {seconds / NUMBER * 1e6:8.3f} us/event')
+
+
+def main():
+    registry = MetricsRegistry()
+    counter = registry.counter('events', 'Events')
+    histogram = registry.histogram('duration_seconds', 'Durations')
+
+    for chamber in range(8):
+        registry.histogram('control_loop_seconds', 'Control loop durations', chamber=chamber).observe(0.001)
+
+    perf_counter = time.perf_counter
+
+    def timed():
+        start = perf_counter()
+        histogram.observe(perf_counter() - start)
+
+    bench('counter inc', counter.inc)
+    bench('histogram observe', lambda: histogram.observe(0.0003))
+    bench('timed observe', timed)
+
+    renders = 1000
+    seconds = min(timeit.repeat(registry.render, number=renders, repeat=5))
+    print(f'{"render":<24} {seconds / renders * 1e6:8.1f} us/scrape')
+
+
+if __name__ == '__main__':
+    main()
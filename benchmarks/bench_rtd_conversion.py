@@ -0,0 +1,54 @@
+"""
+Benchmark of RTD code to temperature conversion: the analytical resistance_to_celsius against the
+precomputed lookup table, for single readings and for converting a recorded history in bulk.
+
+Usage: python benchmarks/bench_rtd_conversion.py
+"""
+import os
+import random
+import sys
+import timeit
+from unittest.mock import MagicMock
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+
+try:
+    import RPi.GPIO
+except ImportError:
+    sys.modules['RPi.GPIO'] = MagicMock()
+    sys.modules['RPi'] = MagicMock(GPIO=sys.modules['RPi.GPIO'])
+
+from Drivers.MAX31865 import resistance_to_celsius, rtd_lookup_table, codes_to_celsius, RTD_CODES
+
+
+def best(statement, number):
+    return min(timeit.repeat(statement, repeat=5, number=number)) / number
+
+
+def main():
+    history = [random.randrange(0x1c00, 0x2400) for i in range(100000)]
+
+    build = best(lambda: (rtd_lookup_table.cache_clear(), rtd_lookup_table(430.0, 100.0)), 3)
+    table = rtd_lookup_table(430.0, 100.0)
+
+    def analytical_single():
+        for code in history[:1000]:
+            resistance_to_celsius(code / RTD_CODES * 430.0)
+
+    def table_single():
+        for code in history[:1000]:
+            float(table[code])
+
+    print(f'table build:            {build * 1e3:8.2f} ms')
+    print(f'analytical per reading: {best(analytical_single, 20) / 1000 * 1e9:8.0f} ns')
+    print(f'table per reading:      {best(table_single, 20) / 1000 * 1e9:8.0f} ns')
+
+    analytical_bulk = best(lambda: [resistance_to_celsius(code / RTD_CODES * 430.0) for code in history], 3)
+    table_bulk = best(lambda: codes_to_celsius(history), 3)
+    print(f'analytical {len(history)} codes: {analytical_bulk * 1e3:8.2f} ms')
+    print(f'vectorized {len(history)} codes: {table_bulk * 1e3:8.2f} ms ({analytical_bulk / table_bulk:.0f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark of the application import cost per module, from python -X importtime in a fresh interpreter with the
+Raspberry Pi and bluetooth stand-ins installed. Prints the modules imported by Main, slowest first.
+
+Usage: python benchmarks/bench_startup.py [module]
+"""
+import os
+import subprocess
+import sys
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS, '..')
+
+
+def import_times(module='Main', repeat=5):
+    """
+    Imports module in fresh interpreters and returns module name -> (self, cumulative) import time in milliseconds,
+    the best of repeat runs. Modules imported before, like the stand-ins, are not included.
+    """
+    statement = (f'import sys; sys.path[:0] = [{BENCHMARKS!r}, {os.path.join(ROOT, "fermentation")!r}]; '
+                 f'import fakes; fakes.install(); sys.stderr.write("--\\n"); import {module}')
+    times = dict()
+
+    for i in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], capture_output=True, text=True,
+                                check=True).stderr
+        lines = stderr.split('--\n', 1)[1].splitlines()
+
+        for line in lines:
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+
+            self_us, cumulative_us, name = line[len('import time:'):].split('|')
+            name = name.strip()
+            current = (int(self_us) / 1e3, int(cumulative_us) / 1e3)
+            times[name] = min(times[name], current) if name in times else current
+
+    return times
+
+
+def main():
+    module = sys.argv[1] if len(sys.argv) > 1 else 'Main'
+    times = import_times(module)
+    print(f'{"module":<40} {"self":>9} {"cumulative":>12}')
+
+    for name, (self_ms, cumulative_ms) in sorted(times.items(), key=lambda item: -item[1][1])[:40]:
+        print(f'{name:<40} {self_ms:7.2f}ms {cumulative_ms:10.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark of the per tick cost of TemperatureControl: the built-in StateMachine against a replica of the
+previous transitions.Machine based controller, plus the import time of each state machine module.
+Sensors and relays are plain stand-ins, so only the controller and state machine overhead is measured.
+
+Usage: python benchmarks/bench_state_machine.py
+Requires the transitions package for the comparison.
+"""
+import os
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+
+from TemperatureControl import TemperatureControl, COMPRESSOR_MIN_OFF_TIME_SEC
+
+try:
+    from transitions import Machine
+except ImportError:
+    Machine = None
+
+
+class Sensor:
+
+    def __init__(self, temperature):
+        self.value = temperature
+
+
+    def temperature(self):
+        return self.value
+
+
+class Relay:
+
+    def __init__(self):
+        self.elapsed = COMPRESSOR_MIN_OFF_TIME_SEC + 1
+        self._state = False
+
+
+    def on(self):
+        self._state = True
+
+
+    def off(self):
+        self._state = False
+
+
+    def state(self):
+        return self._state
+
+
+    def elapsed_time(self):
+        return self.elapsed
+
+
+class TransitionsTemperatureControl(TemperatureControl):
+    """
+    The controller with the transitions.Machine setup it used before the built-in state machine
+    """
+
+    def __init__(self, fridge_temp, beer_temp, comp_relay):
+        super().__init__(fridge_temp, beer_temp, comp_relay)
+
+        for trigger in ['start', '_update', 'stop']:
+            delattr(self, trigger)
+
+        self._machine = Machine(model=self, states=TemperatureControl.states, initial='stop', ignore_invalid_triggers=True)
+        self._machine.add_transition('start',   'stop',    'neutral')
+        self._machine.add_transition('_update', 'neutral', 'cooling', conditions=['_cooling_needed', '_cooling_on_allowed'], before='_start_cooling')
+        self._machine.add_transition('_update', 'neutral', 'heating', conditions=['_heating_needed', '_heating_on_allowed'], before='_start_heating')
+        self._machine.add_transition('_update', 'cooling', 'neutral', conditions=['_cooling_off_allowed'], unless=['_cooling_needed'], before='_stop_cooling')
+        self._machine.add_transition('_update', 'heating', 'neutral', conditions=['_heating_off_allowed'], unless=['_heating_needed'], before='_stop_heating')
+        self._machine.add_transition('stop',    '*',       'stop',    before=['_stop_cooling', '_stop_heating'])
+
+
+def bench(controller_class, number=20000):
+    """
+    Returns the best time per control loop tick in microseconds, with the controller idling in neutral
+    """
+    controller = controller_class(Sensor(20.0), Sensor(20.0), Relay())
+    controller.set_temperature_setpoint(20.0)
+    controller.start()
+    assert(controller.state == 'neutral')
+
+    best = min(timeit.repeat(controller.control_loop, repeat=5, number=number))
+    assert(controller.state == 'neutral')
+    return best / number * 1e6
+
+
+def import_time(module):
+    """
+    Returns the import time of a module in a fresh interpreter in milliseconds
+    """
+    statement = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'fermentation'))
+    output = subprocess.run([sys.executable, '-c', statement], env=env, capture_output=True, text=True, check=True).stdout
+    return float(output) * 1e3
+
+
+def main():
+    builtin = bench(TemperatureControl)
+    print(f'StateMachine  {builtin:8.2f} us/tick   import {import_time("StateMachine"):6.2f} ms')
+
+    if Machine is None:
+        print('transitions not installed, skipping comparison')
+        return
+
+    library = bench(TransitionsTemperatureControl)
+    print(f'transitions   {library:8.2f} us/tick   import {import_time("transitions"):6.2f} ms   ({library / builtin:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Stand-ins for the RPi.GPIO and bluetooth._bluetooth extension modules, so the drivers can be imported and
+benchmarked on a plain Linux box. Unlike MagicMock, the stand-ins are plain functions, so they add as
+little overhead as possible to the measurements.
+"""
+import sys
+import types
+
+
+def _fake_gpio():
+    gpio = types.ModuleType('RPi.GPIO')
+    gpio.BCM = 11
+    gpio.OUT = 0
+    gpio.IN = 1
+    gpio.LOW = 0
+    gpio.HIGH = 1
+    pins = dict()
+
+    gpio.setmode = lambda mode: None
+    gpio.setwarnings = lambda flag: None
+    gpio.setup = lambda pin, direction: pins.setdefault(pin, 0)
+    gpio.output = lambda pin, value: pins.__setitem__(pin, value)
+    gpio.input = lambda pin: pins.get(pin, 0)
+    gpio.cleanup = lambda *args: pins.clear()
+    return gpio
+
+
+def _fake_bluez():
+    bluez = types.ModuleType('bluetooth._bluetooth')
+    bluez.SOL_HCI = 0
+    bluez.HCI_FILTER = 2
+    bluez.HCI_EVENT_PKT = 4
+
+    bluez.hci_filter_new = lambda: bytearray(14)
+    bluez.hci_filter_all_events = lambda flt: None
+    bluez.hci_filter_set_ptype = lambda flt, ptype: None
+    bluez.hci_send_cmd = lambda sock, ogf, ocf, cmd: None
+    return bluez
+
+
+def install():
+    """
+    Installs the stand-ins for the modules which can't be imported
+    """
+    try:
+        import RPi.GPIO
+
+    except (ImportError, RuntimeError):
+        rpi = types.ModuleType('RPi')
+        rpi.GPIO = _fake_gpio()
+        sys.modules['RPi'] = rpi
+        sys.modules['RPi.GPIO'] = rpi.GPIO
+
+    try:
+        import bluetooth._bluetooth
+
+    except ImportError:
+        bluetooth = types.ModuleType('bluetooth')
+        bluetooth._bluetooth = _fake_bluez()
+        sys.modules['bluetooth'] = bluetooth
+        sys.modules['bluetooth._bluetooth'] = bluetooth._bluetooth
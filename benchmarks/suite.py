@@ -0,0 +1,262 @@
+"""
+Benchmark suite of the drivers, beacon decoding and control logic, runnable on a plain Linux box with stand-ins
+for RPi.GPIO and bluetooth._bluetooth. Results are written to a JSON file, and compared against a previous
+result file used as baseline, so regressions show up as a non-zero exit status.
+
+Usage:
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --output results.json --baseline baseline.json --threshold 0.2
+
+Baselines are only comparable when recorded on the same machine and Python version.
+"""
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import click
+
+BENCHMARKS = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(BENCHMARKS, '..')
+sys.path.insert(0, os.path.join(ROOT, 'fermentation'))
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+import fakes
+fakes.install()
+
+from hci_corpus import load_corpus
+from bench_startup import import_times
+from bench_max31865 import bitbang, spidev
+from bench_state_machine import Sensor, Relay
+from Configuration import import_configuration
+from Drivers.MAX31865 import MAX31865, resistance_to_celsius, rtd_lookup_table, RTD_CODES
+from Drivers.GpioBackend import MemoryMappedGpioBackend
+from Drivers.SPI import BitBangSPI
+from Drivers.Fakes.FakeMAX31865 import FakeMAX31865
+from Drivers.Tilt.blescan import parse_events
+from History import History
+from TemperatureControl import TemperatureControl
+from TemperatureProfile import TemperatureProfile
+
+
+class ReplaySocket:
+    """
+    HCI socket stand-in replaying the recorded packets in a loop
+    """
+
+    def __init__(self, packets):
+        self._packets = packets
+        self._index = 0
+
+
+    def recv(self, size):
+        pkt = self._packets[self._index]
+        self._index = (self._index + 1) % len(self._packets)
+        return pkt
+
+
+    def getsockopt(self, level, option, size):
+        return bytes(size)
+
+
+    def setsockopt(self, level, option, value):
+        pass
+
+
+class NoSleepClock:
+    """
+    Clock skipping the MAX31865 conversion waits, so only the register transactions are measured
+    """
+
+    def monotonic(self):
+        return time.monotonic()
+
+
+    def time(self):
+        return time.time()
+
+
+    def sleep(self, seconds):
+        pass
+
+
+def best(statement, number, repeat):
+    """
+    Returns the best time of a single call of statement in seconds
+    """
+    return min(timeit.repeat(statement, number=number, repeat=repeat)) / number
+
+
+def bench_parse_events(repeat):
+    corpus = load_corpus()
+    sock = ReplaySocket(corpus)
+    per_call = best(lambda: parse_events(sock, loop_count=len(corpus)), 20, repeat)
+    yield 'blescan.parse_events', per_call / len(corpus) * 1e6, 'us/packet'
+
+
+def bench_rtd_conversion(repeat):
+    codes = range(0x1c00, 0x2400, 2)
+    table = rtd_lookup_table(430.0, 100.0)
+
+    def analytical():
+        for code in codes:
+            resistance_to_celsius(code / RTD_CODES * 430.0)
+
+    def lookup():
+        for code in codes:
+            float(table[code])
+
+    yield 'rtd.resistance_to_celsius', best(analytical, 20, repeat) / len(codes) * 1e9, 'ns/reading'
+    yield 'rtd.lookup_table', best(lookup, 20, repeat) / len(codes) * 1e9, 'ns/reading'
+
+
+def bench_max31865(repeat):
+    fd, path = tempfile.mkstemp()
+    os.write(fd, bytes(MemoryMappedGpioBackend.BLOCK_SIZE))
+    os.close(fd)
+    gpiomem = MemoryMappedGpioBackend(path=path)
+
+    transports = [
+        ('bitbang', bitbang),
+        ('gpiomem', lambda chip: BitBangSPI(cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11, gpio=gpiomem)),
+        ('spidev', spidev),
+    ]
+
+    try:
+        for name, transport in transports:
+            for conversion_mode in MAX31865.CONVERSION_MODES:
+                sensor = MAX31865(spi=transport(FakeMAX31865()), conversion_mode=conversion_mode, clock=NoSleepClock())
+                yield f'max31865.{name}.{conversion_mode}', best(sensor.temperature, 200, repeat) * 1e6, 'us/read'
+
+    finally:
+        gpiomem.cleanup()
+        os.remove(path)
+
+
+def bench_control_loop(repeat):
+    schedule = TemperatureProfile([('hold', 18.0, 5 * 86400), ('ramp', 21.0, 2 * 86400), ('hold', 2.0, 3 * 86400)],
+                                 start=time.time() - 6 * 86400)
+
+    for name, history, profile in [('neutral', None, None), ('history', History(86400), None), ('profile', None, schedule)]:
+        controller = TemperatureControl(Sensor(20.0), Sensor(20.0), Relay(), history=history, profile=profile)
+        controller.set_temperature_setpoint(20.0)
+        controller.start()
+        yield f'control_loop.{name}', best(controller.control_loop, 20000, repeat) * 1e6, 'us/tick'
+
+
+def bench_configuration(repeat):
+    """
+    Loading the repository configuration, parsed from YAML and from the compiled cache
+    """
+    path = os.path.join(ROOT, 'configuration.yaml')
+
+    with tempfile.TemporaryDirectory() as cache_directory:
+        def parsed():
+            import_configuration(path, os.path.join(cache_directory, 'parsed'))
+            shutil.rmtree(os.path.join(cache_directory, 'parsed'))
+
+        yield 'configuration.parsed', best(parsed, 20, repeat) * 1e3, 'ms'
+        yield 'configuration.cached', best(lambda: import_configuration(path, cache_directory), 20, repeat) * 1e3, 'ms'
+
+
+def bench_startup(repeat):
+    """
+    Wall time of a fresh interpreter, with and without importing the application, and the import time of each
+    application module
+    """
+    setup = f'import sys; sys.path[:0] = [{BENCHMARKS!r}, {os.path.join(ROOT, "fermentation")!r}]; import fakes; fakes.install()'
+
+    def process(statement):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], check=True)
+        return time.perf_counter() - start
+
+    interpreter = min(process(setup) for i in range(repeat))
+    application = min(process(f'{setup}; import Main') for i in range(repeat))
+    yield 'startup.interpreter', interpreter * 1e3, 'ms'
+    yield 'startup.import_main', application * 1e3, 'ms'
+
+    # cumulative import time of each application module, so a slow new dependency shows up where it is imported
+    fermentation = os.path.join(ROOT, 'fermentation')
+    application_modules = {name[:-3] for name in os.listdir(fermentation) if name.endswith('.py')}
+
+    for name, (self_ms, cumulative_ms) in sorted(import_times('Main', repeat).items()):
+        if name.split('.')[0] in application_modules or name.startswith('Drivers.'):
+            yield f'import.{name}', cumulative_ms, 'ms'
+
+
+SUITE = [bench_parse_events, bench_rtd_conversion, bench_max31865, bench_control_loop, bench_configuration,
+         bench_startup]
+
+
+def run_suite(repeat=5, only=None):
+    """
+    Runs the benchmarks, or only those with a name containing only, and returns name -> {value, unit}
+    """
+    results = dict()
+
+    for benchmark in SUITE:
+        for name, value, unit in benchmark(repeat):
+            if only is None or only in name:
+                results[name] = {'value': value, 'unit': unit}
+                print(f'{name:<32} {value:12.3f} {unit}')
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the (name, baseline value, value, ratio) of the results slower than the baseline by more than threshold.
+    All benchmarks measure a time, so lower is better.
+    """
+    regressions = []
+
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = result['value'] / baseline[name]['value'] if baseline[name]['value'] else 1.0
+
+        if ratio > 1.0 + threshold:
+            regressions.append((name, baseline[name]['value'], result['value'], ratio))
+
+    return regressions
+
+
+@click.command()
+@click.option('--output', type=click.Path(dir_okay=False), help='write the results to this JSON file')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='JSON results to compare against')
+@click.option('--threshold', default=0.2, show_default=True, help='relative slowdown reported as a regression')
+@click.option('--repeat', default=5, show_default=True, help='repetitions, the best one is kept')
+@click.option('--only', help='only run benchmarks with a name containing this')
+def main(output, baseline, threshold, repeat, only):
+    results = run_suite(repeat, only)
+
+    if output:
+        with open(output, 'w') as result_file:
+            json.dump({
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'timestamp': time.time(),
+                'results': results,
+            }, result_file, indent=2, sort_keys=True)
+
+    if baseline:
+        with open(baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file)['results'], threshold)
+
+        for name, before, after, ratio in regressions:
+            print(f'REGRESSION {name}: {before:.3f} -> {after:.3f} ({(ratio - 1) * 100:+.0f}%)')
+
+        if regressions:
+            sys.exit(1)
+
+        print(f'no regressions above {threshold * 100:.0f}%')
+
+
+if __name__ == '__main__':
+    main()
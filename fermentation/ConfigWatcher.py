@@ -0,0 +1,142 @@
+import asyncio
+import ctypes
+import ctypes.util
+import logging
+import os
+
+
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+
+
+logger = logging.getLogger(__name__)
+
+
+def _signature(path):
+    """
+    Returns what identifies the current version of a file, or None when it doesn't exist
+    """
+    try:
+        stat = os.stat(path)
+
+    except OSError:
+        return None
+
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _inotify_watch(directory):
+    """
+    Returns a non-blocking inotify file descriptor watching the directory for written, created and moved in files,
+    or None when inotify is not available
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+    except (OSError, AttributeError):
+        return None
+
+    if fd < 0:
+        return None
+
+    if libc.inotify_add_watch(fd, os.fsencode(directory), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+        os.close(fd)
+        return None
+
+    return fd
+
+
+class ConfigWatcher:
+    """
+    Watches a configuration file and calls on_change whenever a new version of it has been written.
+
+    The directory of the file is watched with inotify rather than the file itself, as editors often save by
+    writing a new file and renaming it over the old one. Where inotify is not available the file is polled.
+    Either way, a change is only reported once the file has settled, so a file being written is not read half way.
+    """
+
+    def __init__(self, path, on_change, poll_interval=5.0, settle_time=0.5):
+        """
+        :param on_change: function called from the event loop when the file changed
+        :param poll_interval: seconds between checks when polling
+        :param settle_time: seconds to wait after a change before reporting it
+        """
+        self._path = os.path.abspath(path)
+        self._on_change = on_change
+        self._poll_interval = poll_interval
+        self._settle_time = settle_time
+        self._signature = _signature(self._path)
+
+
+    async def run(self, use_inotify=True):
+        """
+        Watches the file until cancelled
+        """
+        fd = _inotify_watch(os.path.dirname(self._path)) if use_inotify else None
+
+        if fd is None:
+            logger.info(f'polling {self._path} for changes every {self._poll_interval}s')
+            await self._poll()
+            return
+
+        logger.info(f'watching {self._path} for changes')
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        loop.add_reader(fd, self._drain, fd, event)
+
+        try:
+            while True:
+                await event.wait()
+                await asyncio.sleep(self._settle_time)
+                event.clear()
+                self.check()
+
+        finally:
+            loop.remove_reader(fd)
+            os.close(fd)
+
+
+    def check(self):
+        """
+        Calls on_change if the file changed since the last check. Returns True if it did.
+        """
+        signature = _signature(self._path)
+
+        # a missing file is being replaced, it is checked again once it is back
+        if signature is None or signature == self._signature:
+            return False
+
+        self._signature = signature
+
+        try:
+            self._on_change()
+
+        except Exception:
+            logger.error(f'applying changes of {self._path} failed', exc_info=True)
+
+        return True
+
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self._poll_interval)
+
+            if _signature(self._path) != self._signature:
+                await asyncio.sleep(self._settle_time)
+                self.check()
+
+
+    def _drain(self, fd, event):
+        """
+        Reads the pending inotify events, which only tell something in the directory changed
+        """
+        try:
+            while os.read(fd, 4096):
+                pass
+
+        except BlockingIOError:
+            pass
+
+        event.set()
@@ -7,59 +7,499 @@ tilt id?
 sensor and relay pin numbers
 """
 
+import json
 import logging
-import yaml
-from copy import deepcopy
+import os
+import zlib
+from datetime import date, datetime
+from dataclasses import dataclass, field, fields, replace, is_dataclass, MISSING
+from types import MappingProxyType
+from Drivers.Tilt.colours import TILTS
+
+
+DEFAULT_SETPOINT = 18.0
+DEFAULT_HYSTERESIS = 0.5
+DEFAULT_HISTORY_CAPACITY = 86400
+DEFAULT_SAMPLE_PERIOD_SEC = 5.0
+DEFAULT_MAX_AGE_FACTOR = 10
+
+CACHE_FORMAT = 1
+"""Version of the configuration cache files, older files are ignored"""
 
 
 logger = logging.getLogger(__name__)
 
 
+class ConfigurationError(Exception):
+    pass
+
+
+def _positive(value):
+    return None if value > 0 else 'must be positive'
+
+
+def _not_negative(value):
+    return None if value >= 0 else 'must not be negative'
+
+
+def _one_of(*choices):
+    return lambda value: None if value in choices else f'must be {" or ".join(choices)}'
+
+
+def _field(default=MISSING, check=None, default_factory=MISSING, compile=None):
+    """
+    A configuration field, check returns an error message for invalid values, and compile(value, path), if given,
+    replaces the type check and returns the value of the field
+    """
+    return field(default=default, default_factory=default_factory, metadata={'check': check, 'compile': compile})
+
+
+def _compile_sensor(section, path):
+    sensor_type = _compile_type(section, path)
+    sensor = _compile(_SENSOR_TYPES.get(sensor_type, SensorConfiguration), section, path)
+
+    if sensor.max_age is None:
+        sensor = replace(sensor, max_age=DEFAULT_MAX_AGE_FACTOR * sensor.sample_period)
+
+    if isinstance(sensor, Max31865Configuration) and sensor.transport == 'bitbang' and sensor.pins is None:
+        raise ConfigurationError(f'{path}.pins is missing')
+
+    return sensor
+
+
+def _compile_relay(section, path):
+    return _compile(_RELAY_TYPES.get(_compile_type(section, path), RelayConfiguration), section, path)
+
+
+def _compile_type(section, path):
+    if not isinstance(section, dict):
+        raise ConfigurationError(f'{path} must be a mapping')
+
+    if not isinstance(section.get('type'), str):
+        raise ConfigurationError(f'{path}.type is missing')
+
+    return section['type']
+
+
+def _compile_timestamp(value, path):
+    """
+    Returns the wall clock time of a YAML timestamp or date, an ISO 8601 string, or a number of seconds since the
+    epoch. Times without a timezone are local time.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+
+        except ValueError:
+            raise ConfigurationError(f'{path} has an invalid value {value!r}')
+
+    if isinstance(value, datetime):
+        return value.timestamp()
+
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day).timestamp()
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+
+    raise ConfigurationError(f'{path} has an invalid value {value!r}')
+
+
+def _compile_segments(value, path):
+    if not isinstance(value, list) or not value:
+        raise ConfigurationError(f'{path} must be a list of segments')
+
+    segments = tuple(_compile(ProfileSegment, segment, f'{path}[{index}]') for index, segment in enumerate(value))
+
+    if segments[0].type == 'ramp':
+        raise ConfigurationError(f'{path}[0] must be a hold, a ramp starts from the temperature of the previous segment')
+
+    for index, segment in enumerate(segments):
+        if segment.days == 0 and segment.hours == 0:
+            raise ConfigurationError(f'{path}[{index}] needs a duration in days and/or hours')
+
+    return segments
+
+
+# The configuration model doubles as its schema: the annotation of each field is the type expected in the YAML
+# document, fields without default are required, and keys which aren't fields are allowed but ignored, or passed
+# on in options for sensors and relays of types provided by plugins.
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class GpioConfiguration:
+    backend: str = _field('rpi', _one_of('rpi', 'gpiomem'))
+    path: str = '/dev/gpiomem'
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class SpiPins:
+    cs: int = _field(check=_not_negative)
+    miso: int = _field(check=_not_negative)
+    mosi: int = _field(check=_not_negative)
+    clk: int = _field(check=_not_negative)
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class SpidevConfiguration:
+    bus: int = _field(0, _not_negative)
+    device: int = _field(0, _not_negative)
+    max_speed_hz: int = _field(500000, _positive)
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class SensorConfiguration:
+    """
+    Temperature sensor, options holds the keys of types provided by plugins
+    """
+    type: str
+    offset: float = 0.0
+    sample_period: float = _field(DEFAULT_SAMPLE_PERIOD_SEC, _positive)
+    max_age: float = _field(None, _positive)
+    options: MappingProxyType = _field(default_factory=lambda: MappingProxyType(dict()))
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class Max31865Configuration(SensorConfiguration):
+    offset: float
+    conversion_mode: str = _field('one_shot', _one_of('one_shot', 'continuous'))
+    lookup_table: bool = False
+    transport: str = _field('bitbang', _one_of('bitbang', 'spidev'))
+    pins: SpiPins = None
+    spidev: SpidevConfiguration = _field(default_factory=SpidevConfiguration)
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class TiltConfiguration(SensorConfiguration):
+    colour: str = _field(check=_one_of(*TILTS))
+    kernel_filter: str = _field(None, _one_of('ibeacon', 'tilt'))
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class RelayConfiguration:
+    """
+    Relay, options holds the keys of types provided by plugins
+    """
+    type: str
+    options: MappingProxyType = _field(default_factory=lambda: MappingProxyType(dict()))
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class SsrConfiguration(RelayConfiguration):
+    pin: int = _field(check=_not_negative)
+    active_high: bool
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ProfileSegment:
+    type: str = _field(check=_one_of('hold', 'ramp'))
+    temperature: float
+    days: float = _field(0.0, _not_negative)
+    hours: float = _field(0.0, _not_negative)
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ProfileConfiguration:
+    """
+    Temperature profile, without start it starts when the chamber first runs with it
+    """
+    start: float = _field(None, compile=_compile_timestamp)
+    segments: tuple = _field(compile=_compile_segments)
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ChamberConfiguration:
+    name: str
+    setpoint: float = DEFAULT_SETPOINT
+    hysteresis: float = _field(DEFAULT_HYSTERESIS, _not_negative)
+    history_capacity: int = _field(DEFAULT_HISTORY_CAPACITY, _positive)
+    fridge_temperature: SensorConfiguration = _field(compile=_compile_sensor)
+    beer_temperature: SensorConfiguration = _field(compile=_compile_sensor)
+    compressor_relay: RelayConfiguration = _field(compile=_compile_relay)
+    heater_relay: RelayConfiguration = _field(None, compile=_compile_relay)
+    profile: ProfileConfiguration = None
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class StorageConfiguration:
+    path: str
+    batch_size: int = _field(60, _positive)
+    flush_interval: float = _field(300.0, _positive)
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class StateConfiguration:
+    path: str
+
+
+@dataclass(frozen=True, slots=True, kw_only=True)
+class ApplicationConfiguration:
+    gpio: GpioConfiguration = _field(default_factory=GpioConfiguration)
+    chambers: tuple = ()
+    storage: StorageConfiguration = None
+    state: StateConfiguration = None
+
+
+_SENSOR_TYPES = {
+    'max31865': Max31865Configuration,
+    'tilt': TiltConfiguration,
+}
+
+_RELAY_TYPES = {
+    'ssr': SsrConfiguration,
+}
+
+
 _default_config = {
-    'fridge_temperature': {
-        'type': 'max31865',
-        'offset': 0.0,
-        'pins': {
-            'cs': 8,
-            'miso': 9,
-            'mosi': 10,
-            'clk': 11
-        }
-    },
-    'beer_temperature': {
-        'type': 'tilt',
-        'colour': 'purple',
-    },
-    'compressor_relay': {
-        'type': 'ssr',
-        'pin': 18,
-        'active_high': True
+    'gpio': {
+        'backend': 'rpi'
     },
-    'heater_relay': {
-        'type': 'ssr',
-        'pin': 20,
-        'active_high': True
-    }
+    'chambers': [
+        {
+            'name': 'fermenter',
+            'setpoint': 18.0,
+            'hysteresis': 0.5,
+            'history_capacity': 86400,
+            'fridge_temperature': {
+                'type': 'max31865',
+                'offset': 0.0,
+                'sample_period': 2.0,
+                'max_age': 30.0,
+                'conversion_mode': 'continuous',
+                'lookup_table': True,
+                'transport': 'bitbang',
+                'spidev': {
+                    'bus': 0,
+                    'device': 0,
+                    'max_speed_hz': 500000
+                },
+                'pins': {
+                    'cs': 8,
+                    'miso': 9,
+                    'mosi': 10,
+                    'clk': 11
+                }
+            },
+            'beer_temperature': {
+                'type': 'tilt',
+                'colour': 'purple',
+                'sample_period': 15.0,
+                'max_age': 300.0,
+            },
+            'compressor_relay': {
+                'type': 'ssr',
+                'pin': 18,
+                'active_high': True
+            },
+            'heater_relay': {
+                'type': 'ssr',
+                'pin': 20,
+                'active_high': True
+            }
+        }
+    ]
 }
 
 
-def import_configuration(filepath):
+def import_configuration(filepath, cache_directory=None):
     """
     Attempts to load a configuration from the provided filepath.
-    Returns the loaded configuration as a dictionary
+    Returns the compiled ApplicationConfiguration, raises ConfigurationError if it is invalid.
+    The validated document is cached by file identity and modification time, so unless the file changed it is
+    loaded without parsing YAML, or even importing the YAML module.
     """
     logger.info(f'loading configuration from {filepath}')
-    config = dict()
+    cache_path = _cache_path(filepath, cache_directory)
+
+    with open(filepath, 'rb') as yamlfile:
+        # the file is identified by the open descriptor, so a file replaced meanwhile isn't mistaken for the cached one
+        stat = os.fstat(yamlfile.fileno())
+        signature = [os.path.abspath(filepath), stat.st_ino, stat.st_mtime_ns, stat.st_size]
+        document = _read_cache(cache_path, signature)
 
-    with open(filepath, 'r') as yamlfile:
-        config = yaml.load(yamlfile)
+        if document is not None:
+            logger.debug(f'configuration loaded from cache {cache_path}')
+            return compile_configuration(document)
 
+        document = _parse_yaml(yamlfile, filepath)
+
+    config = compile_configuration(document)
+    _write_cache(cache_path, signature, document)
     return config
 
 
+def _parse_yaml(yamlfile, filepath):
+    # imported here as it is slow to import, and not needed when running on the default configuration or from cache
+    import yaml
+
+    # libyaml's loader is an order of magnitude faster than the pure Python one, but isn't always built
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+    try:
+        return yaml.load(yamlfile, Loader=loader)
+
+    except yaml.YAMLError as e:
+        raise ConfigurationError(f'{filepath} is not valid YAML, {e}')
+
+
+def _cache_path(filepath, cache_directory):
+    if cache_directory is None:
+        cache_directory = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'fermentation')
+
+    # the name only spreads configurations over files, the full path is checked when reading
+    return os.path.join(cache_directory, f'configuration-{zlib.crc32(os.fsencode(os.path.abspath(filepath))):08x}.json')
+
+
+def _read_cache(cache_path, signature):
+    """
+    Returns the cached document of the file with the given signature, or None
+    """
+    try:
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(cache, dict) or cache.get('format') != CACHE_FORMAT or cache.get('signature') != signature:
+        return None
+
+    return cache.get('document')
+
+
+def _write_cache(cache_path, signature, document):
+    """
+    Replaces the cache atomically, errors are only logged as the cache is just an optimisation
+    """
+    temporary = f'{cache_path}.{os.getpid()}.tmp'
+
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+        with open(temporary, 'w') as cache_file:
+            json.dump({'format': CACHE_FORMAT, 'signature': signature, 'document': document}, cache_file,
+                      default=_json_default)
+
+        os.replace(temporary, cache_path)
+
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug(f'configuration not cached in {cache_path}, {e}')
+
+        try:
+            os.remove(temporary)
+
+        except OSError:
+            pass
+
+
+def _json_default(value):
+    # YAML timestamps, which are compiled from their ISO format as well
+    if isinstance(value, date):
+        return value.isoformat()
+
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def compile_configuration(config):
+    """
+    Validates a configuration document, e.g. as loaded from YAML, and returns it as an ApplicationConfiguration.
+    Raises a ConfigurationError naming the offending key.
+    """
+    if not isinstance(config, dict):
+        raise ConfigurationError('configuration must be a mapping')
+
+    if not isinstance(config.get('chambers', []), list):
+        raise ConfigurationError(f'chambers has an invalid value {config["chambers"]!r}')
+
+    chambers = []
+
+    for index, chamber in enumerate(chamber_configurations(config)):
+        path = f'chambers[{index}]' if 'chambers' in config else 'configuration'
+        chamber = _compile(ChamberConfiguration, chamber, path)
+
+        if any(other.name == chamber.name for other in chambers):
+            raise ConfigurationError(f'{path}.name {chamber.name!r} is used by more than one chamber')
+
+        chambers.append(chamber)
+
+    # the Tilts share a scanner, and so its kernel filter
+    sensors = [sensor for chamber in chambers for sensor in (chamber.beer_temperature, chamber.fridge_temperature)]
+    kernel_filters = {sensor.kernel_filter for sensor in sensors
+                      if isinstance(sensor, TiltConfiguration) and sensor.kernel_filter is not None}
+
+    if len(kernel_filters) > 1:
+        raise ConfigurationError(f'kernel_filter of the Tilt sensors must be the same, '
+                                 f'not {" and ".join(sorted(kernel_filters))}')
+
+    return _compile(ApplicationConfiguration, config, '', chambers=tuple(chambers))
+
+
+def _compile(cls, section, path, **values):
+    """
+    Returns an instance of the configuration class cls from the section, values given are taken as they are
+    """
+    if not isinstance(section, dict):
+        raise ConfigurationError(f'{path} must be a mapping')
+
+    names = set()
+
+    for item in fields(cls):
+        names.add(item.name)
+
+        if item.name in values or item.name == 'options':
+            continue
+
+        key_path = f'{path}.{item.name}' if path else item.name
+
+        if item.name not in section:
+            if item.default is MISSING and item.default_factory is MISSING:
+                raise ConfigurationError(f'{key_path} is missing')
+            continue
+
+        values[item.name] = _compile_value(item, section[item.name], key_path)
+
+    if 'options' in names:
+        values['options'] = MappingProxyType({key: value for key, value in section.items() if key not in names})
+
+    return cls(**values)
+
+
+def _compile_value(item, value, path):
+    if item.metadata.get('compile'):
+        return item.metadata['compile'](value, path)
+
+    if is_dataclass(item.type):
+        return _compile(item.type, value, path)
+
+    # bool is a subclass of int, but true isn't a number, while an integer is a fine float
+    types = (int, float) if item.type is float else item.type
+
+    if not isinstance(value, types) or (isinstance(value, bool) and item.type is not bool):
+        raise ConfigurationError(f'{path} has an invalid value {value!r}')
+
+    error = item.metadata['check'](value) if item.metadata.get('check') else None
+
+    if error:
+        raise ConfigurationError(f'{path} {error}, not {value!r}')
+
+    return float(value) if item.type is float else value
+
+
+def chamber_configurations(config):
+    """
+    Returns the list of chamber configuration documents.
+    Configurations without a chambers list describe a single chamber at the top level, which is named 'default'.
+    """
+    if 'chambers' in config:
+        return config['chambers']
+
+    chamber = {key: value for key, value in config.items() if key != 'gpio'}
+    chamber.setdefault('name', 'default')
+    return [chamber]
+
+
 def default_configuration():
     """
-    Return a dictionary containing the default configuration.
+    Return the default configuration.
     """
     logger.info('loading default configuration')
-    return deepcopy(_default_config)
+    return compile_configuration(_default_config)
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import signal
+from Drivers.Clock import system_clock
+from Drivers.Metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class TickStatistics:
+    """
+    Timing statistics of a periodic task.
+    Jitter is how late a tick started compared to its deadline, an overrun is a tick that ran past the next deadline.
+    """
+
+    def __init__(self):
+        self.ticks = 0
+        self.overruns = 0
+        self.missed_ticks = 0
+        self.last_jitter = 0.0
+        self.max_jitter = 0.0
+        self.total_jitter = 0.0
+        self.last_duration = 0.0
+        self.max_duration = 0.0
+
+
+    def record_tick(self, jitter, duration):
+        self.ticks += 1
+        self.last_jitter = jitter
+        self.max_jitter = max(self.max_jitter, jitter)
+        self.total_jitter += jitter
+        self.last_duration = duration
+        self.max_duration = max(self.max_duration, duration)
+
+
+    def record_overrun(self, missed_ticks):
+        self.overruns += 1
+        self.missed_ticks += missed_ticks
+
+
+    def mean_jitter(self):
+        return self.total_jitter / self.ticks if self.ticks else 0.0
+
+
+    def __str__(self):
+        return (f"{self.ticks} ticks, jitter mean {self.mean_jitter() * 1000:.2f}ms max {self.max_jitter * 1000:.2f}ms, "
+                f"duration max {self.max_duration * 1000:.2f}ms, {self.overruns} overruns, {self.missed_ticks} missed ticks")
+
+
+class ControlScheduler:
+    """
+    Runs the control loop on an asyncio event loop, ticking on fixed monotonic deadlines so the period doesn't
+    drift with the time spent in each tick. Sensors are sampled concurrently on the same loop through the
+    SamplingScheduler.
+
+    SIGINT and SIGTERM stop the scheduler, after which run() returns and the caller can clean up. A background
+    task failing, e.g. the sampler, stops the scheduler as well rather than leaving the sensors to go stale.
+    """
+
+    def __init__(self, tick, period=1.0, sampler=None, clock=None, tasks=()):
+        """
+        :param tick: function called every period seconds
+        :param sampler: optional SamplingScheduler sampling the sensors while running
+        :param clock: clock to schedule the deadlines by, defaults to the system clock. Waiting is done in real time.
+        :param tasks: coroutine functions run on the same loop while ticking, e.g. ConfigWatcher.run
+        """
+        self._tick = tick
+        self._period = period
+        self._sampler = sampler
+        self._tasks = tuple(tasks)
+        self._clock = (clock if clock is not None else system_clock).monotonic
+        self._stop_event = None
+        self._stop_requested = False
+        self._failure = None
+        self.stats = TickStatistics()
+        self._jitter = registry.histogram('control_tick_jitter_seconds', 'Delay of control ticks past their deadline')
+        self._duration = registry.histogram('control_tick_seconds', 'Duration of control ticks')
+        self._overruns = registry.counter('control_tick_overruns', 'Control ticks which ran past the next deadline')
+
+
+    def stop(self):
+        """
+        Stops the scheduler. Must be called from the event loop thread, e.g. from a signal handler.
+        """
+        self._stop_requested = True
+
+        if self._stop_event:
+            self._stop_event.set()
+
+
+    async def run(self):
+        """
+        Ticks until stopped. Exceptions raised by the tick function or a background task stop the scheduler and
+        are propagated.
+        """
+        loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        self._failure = None
+
+        if self._stop_requested:
+            self._stop_event.set()
+
+        signals = self._add_signal_handlers(loop)
+        background = [self._start_background(task) for task in self._tasks]
+
+        if self._sampler:
+            background.append(self._start_background(self._sampler.run_async))
+
+        logger.info(f"control loop started, period {self._period}s")
+
+        try:
+            await self._run_ticks()
+
+        finally:
+            for signum in signals:
+                loop.remove_signal_handler(signum)
+
+            for task in background:
+                task.cancel()
+
+            await asyncio.gather(*background, return_exceptions=True)
+
+            logger.info(f"control loop stopped, {self.stats}")
+
+        if self._failure is not None:
+            raise self._failure
+
+
+    def _start_background(self, function):
+        task = asyncio.create_task(function(), name=function.__qualname__)
+        task.add_done_callback(self._on_background_done)
+        return task
+
+
+    def _on_background_done(self, task):
+        """
+        Logs a failed background task and stops the scheduler, which then raises the exception from run()
+        """
+        if task.cancelled() or task.exception() is None:
+            return
+
+        logger.error(f"{task.get_name()} failed, stopping: {task.exception()!r}")
+
+        if self._failure is None:
+            self._failure = task.exception()
+
+        self.stop()
+
+
+    async def _run_ticks(self):
+        deadline = self._clock() + self._period
+
+        while not self._stop_event.is_set():
+            try:
+                await asyncio.wait_for(self._stop_event.wait(), timeout=max(0.0, deadline - self._clock()))
+                break
+
+            except asyncio.TimeoutError:
+                pass
+
+            start = self._clock()
+            self._tick()
+            end = self._clock()
+
+            self.stats.record_tick(start - deadline, end - start)
+            self._jitter.observe(start - deadline)
+            self._duration.observe(end - start)
+            deadline += self._period
+
+            if end > deadline:
+                # skip the deadlines which have already passed rather than trying to catch up
+                missed = int((end - deadline) // self._period) + 1
+                deadline += missed * self._period
+                self.stats.record_overrun(missed)
+                self._overruns.inc()
+                logger.warning(f"control loop overrun, tick took {(end - start) * 1000:.0f}ms, {missed} ticks missed")
+
+
+    def _add_signal_handlers(self, loop):
+        """
+        Adds stop handlers for SIGINT and SIGTERM. Returns the signals handled, which is none when not
+        running in the main thread.
+        """
+        signals = []
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(signum, self._on_signal, signum)
+                signals.append(signum)
+
+            except (RuntimeError, ValueError):
+                logger.debug(f"unable to handle {signal.Signals(signum).name} outside the main thread")
+
+        return signals
+
+
+    def _on_signal(self, signum):
+        logger.warning(f"{signal.Signals(signum).name} received, stopping")
+        self.stop()
@@ -0,0 +1,59 @@
+import time
+
+
+class SystemClock:
+    """
+    Clock backed by the time module. Drivers and controllers use a clock object rather than the time
+    module directly, so a SimulatedClock can be injected to run faster than real time.
+    """
+
+    def monotonic(self):
+        return time.monotonic()
+
+
+    def time(self):
+        return time.time()
+
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class SimulatedClock:
+    """
+    Clock which only moves when advanced. Sleeping advances the clock instantly.
+    """
+
+    def __init__(self, start=0.0, epoch=0.0):
+        """
+        :param start: initial monotonic time in seconds
+        :param epoch: wall clock time at the initial monotonic time
+        """
+        self._now = start
+        self._epoch = epoch - start
+
+
+    def monotonic(self):
+        return self._now
+
+
+    def time(self):
+        return self._epoch + self._now
+
+
+    def sleep(self, seconds):
+        self.advance(seconds)
+
+
+    def advance(self, seconds):
+        """
+        Moves the clock forward by the given number of seconds
+        """
+        if seconds < 0:
+            raise ValueError('Simulated time can not go backwards')
+
+        self._now += seconds
+
+
+system_clock = SystemClock()
+"""Clock used when none is given"""
@@ -1,65 +1,183 @@
 import logging
-from Drivers.SolidStateRelay import SolidStateRelay
-from Drivers.MAX31865 import MAX31865
-from Drivers.Tilt.Tilt import Tilt
+
+
+TEMPERATURE_SENSOR_ENTRY_POINTS = 'fermentation.temperature_sensors'
+RELAY_ENTRY_POINTS = 'fermentation.relays'
+"""
+Entry point groups through which installed packages provide additional driver types. The entry point name is
+the type used in the configuration, and it must refer to a factory(config, gpio) returning the driver. The config
+is a SensorConfiguration or RelayConfiguration, with the keys specific to the type in config.options. Relay
+factories are called as factory(config, gpio, initial_state), and must create the relay in that output state, e.g.:
+
+[project.entry-points."fermentation.temperature_sensors"]
+ds18b20 = "fermentation_ds18b20:create_sensor"
+"""
 
 
 logger = logging.getLogger(__name__)
 
 
-def temperature_factory(config):
+def gpio_factory(config):
     """
-    Factory method to create a temperature sensor given a configuration containing type and
-    necessary configuration variables for that type
+    Factory method to create the GPIO backend shared by all drivers, given a GpioConfiguration.
+    RPi.GPIO is only imported when used.
     """
-    sensor = None
+    from Drivers.GpioBackend import RPiGpioBackend, MemoryMappedGpioBackend
+
+    backend = config.backend
 
-    if config['type'] == 'max31865':
-        pins = config['pins']
-        sensor = MAX31865(cs_pin=pins['cs'], miso_pin=pins['miso'], mosi_pin=pins['mosi'], clk_pin=pins['clk'])
-        sensor.offset(config['offset'])
-        logger.info('MAX31865 temperature sensor created')
+    if backend == 'rpi':
+        import RPi.GPIO as GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        gpio = RPiGpioBackend(GPIO)
+        logger.info('RPi.GPIO backend created')
 
-    elif config['type'] == 'tilt':
-        sensor = Tilt(tilt_colour=config['colour'])
-        logger.info('Tilt temperature sensor created')
+    elif backend == 'gpiomem':
+        gpio = MemoryMappedGpioBackend(path=config.path)
+        logger.info('memory mapped GPIO backend created')
 
     else:
-        raise Exception(f'Unknown temperature sensor type, {config["type"]}')
+        raise Exception(f'Unknown GPIO backend, {backend}')
+
+    return gpio
+
+
+def _create_max31865(config, gpio):
+    from Drivers.MAX31865 import MAX31865
 
+    sensor = MAX31865(spi=spi_factory(config, gpio), conversion_mode=config.conversion_mode,
+                      lookup_table=config.lookup_table)
+    sensor.offset(config.offset)
+    logger.info('MAX31865 temperature sensor created')
     return sensor
 
 
-def relay_factory(config):
+def _create_tilt(config, gpio):
+    from Drivers.Tilt.Tilt import Tilt
+
+    sensor = Tilt(tilt_colour=config.colour, kernel_filter=config.kernel_filter)
+    logger.info('Tilt temperature sensor created')
+    return sensor
+
+
+def _create_ssr(config, gpio, initial_state=False):
+    from Drivers.SolidStateRelay import SolidStateRelay
+
+    relay = SolidStateRelay(pin=config.pin, active_high=config.active_high, initial_state=initial_state, gpio=gpio)
+    logger.info('Solid state relay created')
+    return relay
+
+
+_temperature_sensors = {
+    'max31865': _create_max31865,
+    'tilt': _create_tilt,
+}
+
+_relays = {
+    'ssr': _create_ssr,
+}
+
+
+def register_temperature_sensor(sensor_type, factory):
+    """
+    Registers a factory(config, gpio) creating temperature sensors of the given configuration type
+    """
+    _temperature_sensors[sensor_type] = factory
+
+
+def register_relay(relay_type, factory):
+    """
+    Registers a factory(config, gpio, initial_state) creating relays of the given configuration type
+    """
+    _relays[relay_type] = factory
+
+
+def temperature_factory(config, gpio=None):
+    """
+    Factory method to create a temperature sensor given its SensorConfiguration.
+    Driver modules are only imported when a sensor of their type is created.
+    """
+    return _factory(_temperature_sensors, TEMPERATURE_SENSOR_ENTRY_POINTS, config.type, 'temperature sensor')(config, gpio)
+
+
+def spi_factory(config, gpio=None):
     """
-    Factory method to create a relay given a configuration containing relay type and necessary
-    configuration variables for that type
+    Factory method to create an SPI transport given a Max31865Configuration, either software SPI on the
+    configured pins or the hardware SPI controller.
     """
-    relay = None
+    from Drivers.SPI import BitBangSPI, HardwareSPI
+
+    transport = config.transport
+
+    if transport == 'bitbang':
+        pins = config.pins
+        spi = BitBangSPI(cs_pin=pins.cs, miso_pin=pins.miso, mosi_pin=pins.mosi, clk_pin=pins.clk, gpio=gpio)
+        logger.info('software SPI transport created')
 
-    if config['type'] == 'ssr':
-        relay = SolidStateRelay(pin=config['pin'], active_high=config['active_high'], initial_state=False)
-        logger.info('Solid state relay created')
+    elif transport == 'spidev':
+        spidev = config.spidev
+        spi = HardwareSPI(bus=spidev.bus, device=spidev.device, max_speed_hz=spidev.max_speed_hz)
+        logger.info(f'hardware SPI transport created for /dev/spidev{spidev.bus}.{spidev.device}')
 
     else:
-        raise Exception(f'Unknown relay type, {config["type"]}')
+        raise Exception(f'Unknown SPI transport, {transport}')
 
-    return relay
+    return spi
+
+
+def relay_factory(config, gpio=None, initial_state=False):
+    """
+    Factory method to create a relay given its RelayConfiguration, switched on or off as given by initial_state
+    """
+    return _factory(_relays, RELAY_ENTRY_POINTS, config.type, 'relay')(config, gpio, initial_state)
 
 
 def cleanup_drivers(drivers):
     """
-    Cleans up drivers depending on their object type.
+    Cleans up drivers depending on the interface they implement: drivers with a destroy() method, e.g. Tilt and
+    MAX31865, are destroyed, and relays are switched off.
     Expects a dictionary of drivers
     """
     for name, driver in drivers.items():
-        if isinstance(driver, SolidStateRelay):
-            logger.debug(f"cleaning {name}: setting to off")
-            driver.off()
-
-        elif isinstance(driver, Tilt):
+        if hasattr(driver, 'destroy'):
             logger.debug(f"cleaning {name}: destroying")
             driver.destroy()
 
+        elif hasattr(driver, 'off'):
+            logger.debug(f"cleaning {name}: setting to off")
+            driver.off()
+
         else:
             logger.debug(f"cleaning {name}: nothing to do")
+
+
+def _factory(factories, group, driver_type, kind):
+    """
+    Returns the registered factory of driver_type, falling back to the installed entry points of group
+    """
+    factory = factories.get(driver_type)
+
+    if factory is None:
+        factory = _load_entry_point(group, driver_type)
+
+        if factory is None:
+            raise Exception(f'Unknown {kind} type, {driver_type}')
+
+        factories[driver_type] = factory
+        logger.info(f'{kind} type {driver_type} loaded from {factory.__module__}')
+
+    return factory
+
+
+def _load_entry_point(group, name):
+    from importlib.metadata import entry_points
+
+    points = entry_points()
+    points = points.select(group=group) if hasattr(points, 'select') else points.get(group, ())
+
+    for entry_point in points:
+        if entry_point.name == name:
+            return entry_point.load()
+
+    return None
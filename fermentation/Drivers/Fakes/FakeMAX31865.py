@@ -0,0 +1,241 @@
+"""
+In-memory emulation of the MAX31865 RTD-to-digital converter, so the driver and its SPI transports
+can be tested and benchmarked on a plain Linux box.
+
+FakeMAX31865 emulates the register map, address auto increment, one-shot and auto conversion and
+fault status. It can be attached through FakeSpiDev, standing in for spidev.SpiDev, or through
+FakeGPIO, standing in for the RPi.GPIO module and decoding the bit banged pin changes.
+"""
+
+RTD_A = 3.9083e-3
+RTD_B = -5.775e-7
+RTD_C = -4.183e-12
+
+CONFIG_VBIAS = 0x80
+CONFIG_AUTO = 0x40
+CONFIG_ONE_SHOT = 0x20
+CONFIG_FAULT_CLEAR = 0x02
+
+
+def celsius_to_resistance(temperature, rtd_nominal=100.0):
+    """
+    Callendar-Van Dusen equation, the inverse of resistance_to_celsius
+    """
+    resistance = 1.0 + RTD_A * temperature + RTD_B * temperature * temperature
+
+    if temperature < 0:
+        resistance += RTD_C * (temperature - 100.0) * temperature ** 3
+
+    return rtd_nominal * resistance
+
+
+class FakeMAX31865:
+    """
+    Emulated MAX31865 register map
+    """
+
+    def __init__(self, temperature=20.0, ref_resistor=430.0, rtd_nominal=100.0):
+        self.registers = [0x00, 0x00, 0x00, 0xff, 0xff, 0x00, 0x00, 0x00]
+        self.conversions = 0
+        self.transactions = 0
+        self.fault_status = 0x00
+        self._ref_resistor = ref_resistor
+        self._rtd_nominal = rtd_nominal
+        self._address = None
+        self._write = False
+        self.set_temperature(temperature)
+
+
+    def set_temperature(self, temperature):
+        """
+        Sets the temperature measured on the next conversion
+        """
+        resistance = celsius_to_resistance(temperature, self._rtd_nominal)
+        self.rtd = min(int(round(resistance / self._ref_resistor * 32768)), 0x7fff)
+
+
+    def begin(self):
+        """
+        Chip select asserted, starts a transaction
+        """
+        self.transactions += 1
+        self._address = None
+        self._write = False
+
+        if self.registers[0] & CONFIG_AUTO and self.registers[0] & CONFIG_VBIAS:
+            self._convert()
+
+
+    def next_out(self):
+        """
+        Returns the byte shifted out on the next byte of the transaction
+        """
+        if self._address is None or self._write:
+            return 0x00
+
+        return self.registers[self._address & 0x07]
+
+
+    def receive(self, byte):
+        """
+        Handles a byte shifted in. The first byte of a transaction is the address.
+        """
+        if self._address is None:
+            self._write = bool(byte & 0x80)
+            self._address = byte & 0x7f
+            return
+
+        if self._write:
+            self._write_register(self._address & 0x07, byte)
+
+        self._address += 1
+
+
+    def transaction(self, data):
+        """
+        Complete full duplex transaction
+        """
+        self.begin()
+        received = []
+
+        for byte in data:
+            received.append(self.next_out())
+            self.receive(byte)
+
+        return received
+
+
+    def _write_register(self, register, byte):
+        # only configuration and fault thresholds are writable
+        if register not in (0, 3, 4, 5, 6):
+            return
+
+        if register == 0:
+            if byte & CONFIG_FAULT_CLEAR:
+                self.fault_status = 0x00
+
+            # 1-shot and fault clear bits are self clearing
+            self.registers[0] = byte & ~(CONFIG_ONE_SHOT | CONFIG_FAULT_CLEAR)
+
+            if byte & CONFIG_ONE_SHOT and byte & CONFIG_VBIAS:
+                self._convert()
+
+        else:
+            self.registers[register] = byte
+
+
+    def _convert(self):
+        self.conversions += 1
+        fault = 0x01 if self.fault_status else 0x00
+        self.registers[1] = (self.rtd >> 7) & 0xff
+        self.registers[2] = ((self.rtd << 1) & 0xff) | fault
+        self.registers[7] = self.fault_status
+
+
+class FakeSpiDev:
+    """
+    Stand-in for spidev.SpiDev with a FakeMAX31865 attached
+    """
+
+    def __init__(self, chip):
+        self.chip = chip
+        self.mode = 0
+        self.max_speed_hz = 0
+        self.opened = None
+
+
+    def open(self, bus, device):
+        self.opened = (bus, device)
+
+
+    def close(self):
+        self.opened = None
+
+
+    def xfer2(self, data):
+        return self.chip.transaction(data)
+
+
+class FakeGPIO:
+    """
+    Stand-in for the RPi.GPIO module with a FakeMAX31865 attached to the given pins.
+    The chip shifts out data on the rising clock edge and samples on the falling edge.
+    """
+
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self, chip, cs_pin, miso_pin, mosi_pin, clk_pin):
+        self.chip = chip
+        self.pins = dict()
+        self.calls = 0
+        self._cs_pin = cs_pin
+        self._miso_pin = miso_pin
+        self._mosi_pin = mosi_pin
+        self._clk_pin = clk_pin
+        self._selected = False
+        self._bit = 0
+        self._byte_out = 0
+        self._byte_in = 0
+
+
+    def setmode(self, mode):
+        pass
+
+
+    def setwarnings(self, flag):
+        pass
+
+
+    def setup(self, pin, direction):
+        self.pins.setdefault(pin, self.LOW)
+
+
+    def cleanup(self):
+        self.pins.clear()
+
+
+    def input(self, pin):
+        self.calls += 1
+        return self.pins.get(pin, self.LOW)
+
+
+    def output(self, pin, value):
+        self.calls += 1
+        previous = self.pins.get(pin, self.LOW)
+        self.pins[pin] = value
+
+        if pin == self._cs_pin and value != previous:
+            self._chip_select(value == self.LOW)
+
+        elif pin == self._clk_pin and self._selected and value != previous:
+            self._rising_edge() if value == self.HIGH else self._falling_edge()
+
+
+    def _chip_select(self, selected):
+        self._selected = selected
+        self._bit = 0
+        self._byte_in = 0
+
+        if selected:
+            self.chip.begin()
+
+
+    def _rising_edge(self):
+        if self._bit == 0:
+            self._byte_out = self.chip.next_out()
+
+        self.pins[self._miso_pin] = self.HIGH if self._byte_out & (0x80 >> self._bit) else self.LOW
+
+
+    def _falling_edge(self):
+        self._byte_in = (self._byte_in << 1) | (1 if self.pins.get(self._mosi_pin) == self.HIGH else 0)
+        self._bit += 1
+
+        if self._bit == 8:
+            self.chip.receive(self._byte_in)
+            self._bit = 0
+            self._byte_in = 0
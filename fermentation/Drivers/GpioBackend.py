@@ -0,0 +1,137 @@
+import mmap
+import os
+from functools import lru_cache
+
+
+class RPiGpioBackend:
+    """
+    GPIO backend using the RPi.GPIO module, one library call per pin change.
+    """
+
+    def __init__(self, gpio=None):
+        """
+        :param gpio: RPi.GPIO compatible module, RPi.GPIO is imported when not given
+        """
+        if gpio is None:
+            import RPi.GPIO as gpio
+
+        self._gpio = gpio
+
+
+    def setup_output(self, pin):
+        self._gpio.setup(pin, self._gpio.OUT)
+
+
+    def setup_input(self, pin):
+        self._gpio.setup(pin, self._gpio.IN)
+
+
+    def write(self, pin, value):
+        self._gpio.output(pin, self._gpio.HIGH if value else self._gpio.LOW)
+
+
+    def read(self, pin):
+        return self._gpio.input(pin)
+
+
+    def write_pins(self, set_mask, clear_mask=0):
+        """
+        Sets the pins in set_mask high and the pins in clear_mask low
+        """
+        for pin in _pins(set_mask):
+            self._gpio.output(pin, self._gpio.HIGH)
+
+        for pin in _pins(clear_mask):
+            self._gpio.output(pin, self._gpio.LOW)
+
+
+    def cleanup(self):
+        self._gpio.cleanup()
+
+
+class MemoryMappedGpioBackend:
+    """
+    GPIO backend accessing the BCM2835 GPIO registers directly through a memory map of /dev/gpiomem.
+    Several pins on the first bank (GPIO 0-31) are set or cleared with a single register write.
+    https://www.raspberrypi.org/app/uploads/2012/02/BCM2835-ARM-Peripherals.pdf, chapter 6
+    """
+
+    BLOCK_SIZE = 4096
+
+    GPFSEL0 = 0x00
+    """Function select registers, 3 bits per pin, 10 pins per register"""
+
+    GPSET0 = 0x1c
+    """Output set register, writing 1 sets the pin high"""
+
+    GPCLR0 = 0x28
+    """Output clear register, writing 1 sets the pin low"""
+
+    GPLEV0 = 0x34
+    """Pin level register"""
+
+    FUNCTION_INPUT = 0b000
+    FUNCTION_OUTPUT = 0b001
+
+    def __init__(self, path='/dev/gpiomem'):
+        fd = os.open(path, os.O_RDWR | os.O_SYNC)
+
+        try:
+            self._mmap = mmap.mmap(fd, MemoryMappedGpioBackend.BLOCK_SIZE, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+        finally:
+            os.close(fd)
+
+        # registers are accessed as aligned 32 bit words
+        self._registers = memoryview(self._mmap).cast('I')
+        self._set = MemoryMappedGpioBackend.GPSET0 // 4
+        self._clear = MemoryMappedGpioBackend.GPCLR0 // 4
+        self._level = MemoryMappedGpioBackend.GPLEV0 // 4
+
+
+    def setup_output(self, pin):
+        self._select_function(pin, MemoryMappedGpioBackend.FUNCTION_OUTPUT)
+
+
+    def setup_input(self, pin):
+        self._select_function(pin, MemoryMappedGpioBackend.FUNCTION_INPUT)
+
+
+    def write(self, pin, value):
+        self._registers[self._set if value else self._clear] = 1 << pin
+
+
+    def read(self, pin):
+        return 1 if self._registers[self._level] & (1 << pin) else 0
+
+
+    def write_pins(self, set_mask, clear_mask=0):
+        """
+        Sets the pins in set_mask high and the pins in clear_mask low
+        """
+        if set_mask:
+            self._registers[self._set] = set_mask
+
+        if clear_mask:
+            self._registers[self._clear] = clear_mask
+
+
+    def cleanup(self):
+        self._registers.release()
+        self._mmap.close()
+
+
+    def _select_function(self, pin, function):
+        assert(0 <= pin < 32)
+        register = MemoryMappedGpioBackend.GPFSEL0 // 4 + pin // 10
+        shift = (pin % 10) * 3
+        self._registers[register] = (self._registers[register] & ~(0b111 << shift)) | (function << shift)
+
+
+@lru_cache(maxsize=256)
+def _pins(mask):
+    """
+    Returns the pin numbers of the bits set in mask.
+    Cached, as the same few masks are used over and over when bit banging.
+    """
+    return tuple(pin for pin in range(mask.bit_length()) if mask & (1 << pin))
@@ -23,9 +23,23 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import time
 import math
-import RPi.GPIO as GPIO
+import time
+from array import array
+from functools import lru_cache
+from Drivers.SPI import BitBangSPI
+from Drivers.Reading import Reading
+from Drivers.Clock import system_clock
+from Drivers.Metrics import registry
+
+_NOT_IMPORTED = object()
+
+numpy = _NOT_IMPORTED
+"""NumPy, imported on first use by _numpy() as it is slow to import and only needed by the lookup table"""
+
+
+RTD_CODES = 32768
+"""Number of distinct 15 bit RTD codes"""
 
 
 def resistance_to_celsius(resistance, rtd_nominal=100.0):
@@ -61,10 +75,86 @@ def resistance_to_celsius(resistance, rtd_nominal=100.0):
     return temp
 
 
+def _numpy():
+    """
+    Returns the numpy module, importing it on first use, or None when it is not installed
+    """
+    global numpy
+
+    if numpy is _NOT_IMPORTED:
+        try:
+            import numpy as module
+        except ImportError:
+            module = None
+
+        numpy = module
+
+    return numpy
+
+
+def _resistances_to_celsius(resistance, rtd_nominal):
+    """
+    Vectorized resistance_to_celsius on a NumPy array of resistances, using the exact same arithmetic
+    """
+    RTD_A = 3.9083e-3
+    RTD_B = -5.775e-7
+
+    Z1 = -RTD_A
+    Z2 = RTD_A * RTD_A - (4 * RTD_B)
+    Z3 = (4 * RTD_B) / rtd_nominal
+    Z4 = 2 * RTD_B
+    temp = Z2 + (Z3 * resistance)
+    with numpy.errstate(invalid='ignore'):
+        temp = (numpy.sqrt(temp) + Z1) / Z4
+
+    rpoly = resistance.copy()
+    poly = -242.02
+    poly += 2.2228 * rpoly
+    rpoly *= resistance  # square
+    poly += 2.5859e-3 * rpoly
+    rpoly *= resistance  # ^3
+    poly -= 4.8260e-6 * rpoly
+    rpoly *= resistance  # ^4
+    poly -= 2.8183e-8 * rpoly
+    rpoly *= resistance  # ^5
+    poly += 1.5243e-10 * rpoly
+
+    return numpy.where(temp >= 0, temp, poly)
+
+
+@lru_cache(maxsize=None)
+def rtd_lookup_table(ref_resistor=430.0, rtd_nominal=100.0):
+    """
+    Returns a read only table of the temperature in celsius for every 15 bit RTD code.
+    The table is built on first use and cached per (ref_resistor, rtd_nominal) pair. It is a NumPy array
+    when NumPy is available, otherwise an array of doubles.
+    """
+    if _numpy() is None:
+        return array('d', (resistance_to_celsius(code / RTD_CODES * ref_resistor, rtd_nominal) for code in range(RTD_CODES)))
+
+    table = _resistances_to_celsius(numpy.arange(RTD_CODES) / RTD_CODES * ref_resistor, rtd_nominal)
+    table.flags.writeable = False
+    return table
+
+
+def codes_to_celsius(codes, ref_resistor=430.0, rtd_nominal=100.0):
+    """
+    Converts a sequence of raw 15 bit RTD codes, e.g. a recorded history, to temperatures in celsius.
+    Returns a NumPy array when NumPy is available, otherwise a list.
+    """
+    table = rtd_lookup_table(ref_resistor, rtd_nominal)
+
+    if _numpy() is None:
+        return [table[code] for code in codes]
+
+    return table[numpy.asarray(codes, dtype=numpy.intp)]
+
+
 class MAX31865:
     """
     Reading Temperature from the MAX31865 with GPIO using the Raspberry Pi.
-    Any 4 pins can be used to establish software based SPI to MAX31865.
+    Any 4 pins can be used to establish software based SPI to MAX31865, alternatively any other SPI
+    transport providing transfer(data) can be used, e.g. HardwareSPI.
 
     Adapted from: https://github.com/hackenbergstefan/MAX31865
     """
@@ -108,46 +198,56 @@ class MAX31865:
     bit 0: 50/60 Hz filter select -> 0 (60Hz)
     """
 
-    REGISTER_CONFIGURATION_ONE_SHOT_3_WIRE = REGISTER_CONFIGURATION_ONE_SHOT | 0b00010000
+    REGISTER_CONFIGURATION_CONTINUOUS = 0b11000010
     """
-    Configuration 0b10110010 == 0xB2:
+    Configuration 0b11000010 == 0xC2:
     bit 7: Vbias -> 1 (ON)
-    bit 6: Conversion Mode -> 0 (MANUAL)
-    bit 5: 1-shot -> 1 (ON)
-    bit 4: 3-wire select -> 1 (3 wire config)
+    bit 6: Conversion Mode -> 1 (AUTO)
+    bit 5: 1-shot -> 0 (OFF)
+    bit 4: 3-wire select -> 0 (2 or 4 wire config)
     bit 3-2: fault detection cycle -> 0 (none)
     bit 1: fault status clear -> 1 (clear any fault)
     bit 0: 50/60 Hz filter select -> 0 (60Hz)
     """
 
-    def __init__(self, cs_pin, miso_pin, mosi_pin, clk_pin, ref_resistor=430.0, rtd_nominal=100.0, number_of_wires=2):
+    REGISTER_CONFIGURATION_3_WIRE = 0b00010000
+    """Mask to be ORed to the configuration when using a 3 wire RTD."""
+
+    ONE_SHOT_CONVERSION_TIME_SEC = 0.1
+    """Time to wait for a one-shot conversion (Conversion time is less than 100ms)"""
+
+    CONTINUOUS_STARTUP_TIME_SEC = 0.07
+    """Time before the first conversion is ready after entering auto conversion mode"""
+
+    CONVERSION_MODES = ('one_shot', 'continuous')
+    """
+    one_shot: a conversion is triggered on every read, which blocks for the conversion time.
+    continuous: the chip converts on its own (~60 conversions/s) and a read is a single transaction,
+    at the expense of keeping the bias voltage on, causing slight self heating of the RTD.
+    """
+
+    def __init__(self, cs_pin=None, miso_pin=None, mosi_pin=None, clk_pin=None, ref_resistor=430.0, rtd_nominal=100.0,
+                 number_of_wires=2, conversion_mode='one_shot', spi=None, lookup_table=False, clock=None):
+        """
+        Either the pins for software based SPI or an SPI transport must be provided.
+        With lookup_table set, readings are converted using the precomputed rtd_lookup_table().
+        The clock, defaulting to the system clock, is used for conversion waits and reading timestamps.
+        """
         assert(number_of_wires >= 2 and number_of_wires <= 4)
+        assert(conversion_mode in MAX31865.CONVERSION_MODES)
         self._offset = 0.0
-        self._cs_pin = cs_pin
-        self._miso_pin = miso_pin
-        self._mosi_pin = mosi_pin
-        self._clk_pin = clk_pin
+        self._clock = clock if clock is not None else system_clock
+        self._reading = Reading(None)
+        self._spi = spi if spi is not None else BitBangSPI(cs_pin, miso_pin, mosi_pin, clk_pin)
         self._ref_resistor = ref_resistor
         self._rtd_nominal = rtd_nominal
         self._number_of_wires = number_of_wires
-        self._setup_GPIO()
+        self._conversion_mode = conversion_mode
+        self._lookup_table = lookup_table
+        self._read_duration = registry.histogram('max31865_read_seconds', 'Duration of MAX31865 temperature reads')
 
-
-    def _setup_GPIO(self):
-        """
-        Setup GPIOs for SPI connection:
-        CS: Chip Select (also called SS)
-        CLK: Serial Clock
-        MISO: Master In Slave Out (SDO at slave)
-        MOSI: Master Out Slave In (SDI at slave)
-        """
-        GPIO.setup(self._cs_pin, GPIO.OUT)
-        GPIO.setup(self._miso_pin, GPIO.IN)
-        GPIO.setup(self._mosi_pin, GPIO.OUT)
-        GPIO.setup(self._clk_pin, GPIO.OUT)
-        GPIO.output(self._cs_pin, GPIO.HIGH)
-        GPIO.output(self._clk_pin, GPIO.LOW)
-        GPIO.output(self._mosi_pin, GPIO.LOW)
+        if self._conversion_mode == 'continuous':
+            self._start_continuous_conversion()
 
 
     def __enter__(self):
@@ -155,7 +255,14 @@ class MAX31865:
 
 
     def __exit__(self, *k):
-        pass
+        self.destroy()
+
+
+    def destroy(self):
+        """
+        Closes the SPI transport, e.g. releasing /dev/spidevX.Y
+        """
+        self._spi.close()
 
 
     def offset(self, offset):
@@ -170,9 +277,26 @@ class MAX31865:
         """
         Read out temperature. Conversion to °C included.
         """
+        start = time.perf_counter()
         rtd = self._read_rtd()
-        resistance = self._read_resistance(rtd)
-        return resistance_to_celsius(resistance, rtd_nominal=self._rtd_nominal) + self._offset
+
+        if self._lookup_table:
+            temperature = float(rtd_lookup_table(self._ref_resistor, self._rtd_nominal)[rtd]) + self._offset
+
+        else:
+            resistance = self._read_resistance(rtd)
+            temperature = resistance_to_celsius(resistance, rtd_nominal=self._rtd_nominal) + self._offset
+
+        self._reading = Reading(temperature, timestamp=self._clock.monotonic(), sequence=self._reading.sequence + 1)
+        self._read_duration.observe(time.perf_counter() - start)
+        return temperature
+
+
+    def reading(self):
+        """
+        Returns the Reading published by the latest successful temperature() call, without talking to the chip
+        """
+        return self._reading
 
 
     def _write_register(self, register, data):
@@ -182,17 +306,10 @@ class MAX31865:
         :param register: Either name or address of register.
         :param data: Single byte to be written.
         """
-        GPIO.output(self._cs_pin, GPIO.LOW)
-
         if isinstance(register, str):
             register = self.REGISTERS[register]
 
-        register |= self.REGISTERS_WRITE_MASK
-
-        self._send(register)
-        self._send(data)
-
-        GPIO.output(self._cs_pin, GPIO.HIGH)
+        self._spi.transfer([register | self.REGISTERS_WRITE_MASK, data])
 
 
     def _read_register(self, register):
@@ -202,15 +319,21 @@ class MAX31865:
         :param register: Either name or address of register.
         :return: One byte of data.
         """
-        GPIO.output(self._cs_pin, GPIO.LOW)
+        return self._read_register_burst(register, 1)[0]
+
+
+    def _read_register_burst(self, register, count):
+        """
+        Read consecutive registers in a single transaction, using the address auto increment of the MAX31865.
 
+        :param register: Either name or address of the first register.
+        :param count: Number of registers to read.
+        :return: List of count bytes data.
+        """
         if isinstance(register, str):
             register = self.REGISTERS[register]
 
-        self._send(register)
-        data = self._recv()
-        GPIO.output(self._cs_pin, GPIO.HIGH)
-        return data
+        return self._spi.transfer([register] + [0x00] * count)[1:]
 
 
     def _read_registers(self):
@@ -219,71 +342,61 @@ class MAX31865:
 
         :return: List of 8 bytes data.
         """
-        # NOTE: Reusage of self.read_register is slower but more clean.
-        data = [self._read_register(r) for r in range(len(self.REGISTERS))]
-        return data
+        return self._read_register_burst(0, len(self.REGISTERS))
 
 
-    def _read_rtd(self):
+    def _configuration(self, configuration):
         """
-        Read RTD from sensor board
+        Returns the configuration adjusted for the number of wires
         """
         if self._number_of_wires == 3:
-            self._write_register('config', MAX31865.REGISTER_CONFIGURATION_ONE_SHOT_3_WIRE)
-
-        else:
-            self._write_register('config', MAX31865.REGISTER_CONFIGURATION_ONE_SHOT)
+            return configuration | MAX31865.REGISTER_CONFIGURATION_3_WIRE
 
-        # Sleep to wait for conversion (Conversion time is less than 100ms)
-        time.sleep(0.1)
+        return configuration
 
-        temp = self._read_register('rtd_msb')
-        temp = (temp << 8) | self._read_register('rtd_lsb')
-
-        # Check if error bit was set
-        if temp & 0x01:
-            raise MAX31865FaultError(self)
 
-        return temp >> 1
-
-
-    def _read_resistance(self, rtd):
-        resistance = rtd / 32768
-        return resistance * self._ref_resistor
+    def _start_continuous_conversion(self):
+        """
+        Puts the chip in auto conversion mode. The first conversion is ready after CONTINUOUS_STARTUP_TIME_SEC
+        """
+        self._write_register('config', self._configuration(MAX31865.REGISTER_CONFIGURATION_CONTINUOUS))
+        self._ready_time = self._clock.monotonic() + MAX31865.CONTINUOUS_STARTUP_TIME_SEC
 
 
-    def _send(self, byte):
+    def _read_rtd(self):
         """
-        Send one byte via configured SPI.
+        Read RTD from sensor board
         """
-        for bit in range(8):
-            GPIO.output(self._clk_pin, GPIO.HIGH)
+        if self._conversion_mode == 'continuous':
+            # only the very first read has to wait for a conversion
+            delay = self._ready_time - self._clock.monotonic()
 
-            if (byte & 0x80):
-                GPIO.output(self._mosi_pin, GPIO.HIGH)
+            if delay > 0:
+                self._clock.sleep(delay)
 
-            else:
-                GPIO.output(self._mosi_pin, GPIO.LOW)
+        else:
+            self._write_register('config', self._configuration(MAX31865.REGISTER_CONFIGURATION_ONE_SHOT))
+            self._clock.sleep(MAX31865.ONE_SHOT_CONVERSION_TIME_SEC)
+
+        msb, lsb = self._read_register_burst('rtd_msb', 2)
+        temp = (msb << 8) | lsb
 
-            byte <<= 1
-            GPIO.output(self._clk_pin, GPIO.LOW)
+        # Check if error bit was set
+        if temp & 0x01:
+            error = MAX31865FaultError(self)
 
+            # the fault status is only cleared when writing the configuration
+            if self._conversion_mode == 'continuous':
+                self._start_continuous_conversion()
 
-    def _recv(self):
-        """
-        Receive one byte via configured SPI.
-        """
-        byte = 0x00
-        for bit in range(8):
-            GPIO.output(self._clk_pin, GPIO.HIGH)
-            byte <<= 1
+            raise error
 
-            if GPIO.input(self._miso_pin):
-                byte |= 0x1
+        return temp >> 1
 
-            GPIO.output(self._clk_pin, GPIO.LOW)
 
-        return byte
+    def _read_resistance(self, rtd):
+        resistance = rtd / RTD_CODES
+        return resistance * self._ref_resistor
 
 
 class MAX31865FaultError(Exception):
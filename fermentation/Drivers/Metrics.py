@@ -0,0 +1,148 @@
+from bisect import bisect_left
+from threading import Lock
+
+
+DURATION_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5)
+"""Histogram bucket upper bounds in seconds for durations, from 10us to 2.5s"""
+
+INTERVAL_BUCKETS = (1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 45.0, 60.0, 90.0, 120.0, 300.0, 600.0)
+"""Histogram bucket upper bounds in seconds for intervals between events, e.g. Tilt beacons"""
+
+
+class Counter:
+    """
+    Monotonically increasing count of events
+    """
+
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0
+
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+    def samples(self, name, labels):
+        yield name + '_total', labels, self.value
+
+
+class Histogram:
+    """
+    Counts observations in fixed buckets and keeps their sum.
+    Observing is a binary search over the bucket bounds plus two additions, so it is cheap enough for hot paths.
+    Buckets are only made cumulative when rendered.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self._bounds = tuple(buckets)
+        self._counts = [0] * (len(self._bounds) + 1)
+        self.sum = 0.0
+
+
+    def observe(self, value):
+        self._counts[bisect_left(self._bounds, value)] += 1
+        self.sum += value
+
+
+    def count(self):
+        return sum(self._counts)
+
+
+    def samples(self, name, labels):
+        cumulative = 0
+
+        for bound, count in zip(self._bounds + (float('inf'),), self._counts):
+            cumulative += count
+            yield name + '_bucket', labels + (('le', _format_value(bound)),), cumulative
+
+        yield name + '_sum', labels, self.sum
+        yield name + '_count', labels, cumulative
+
+
+class MetricsRegistry:
+    """
+    Holds the counters and histograms of the application, keyed by name and labels, and renders them in the
+    Prometheus text exposition format.
+
+    Metrics are created once, typically when the instrumented object is created, and then updated without any
+    lookup or locking. Updates from different threads may very rarely lose an increment, which is acceptable for
+    monitoring and keeps the hot paths at a microsecond or so.
+    """
+
+    def __init__(self):
+        self._families = dict()
+        self._lock = Lock()
+
+
+    def counter(self, name, help, **labels):
+        """
+        Returns the counter with the given name and labels, creating it if needed.
+        The name is given without the _total suffix.
+        """
+        return self._get(Counter, name, help, labels, Counter)
+
+
+    def histogram(self, name, help, buckets=DURATION_BUCKETS, **labels):
+        """
+        Returns the histogram with the given name and labels, creating it if needed
+        """
+        return self._get(Histogram, name, help, labels, lambda: Histogram(buckets))
+
+
+    def render(self):
+        """
+        Returns all metrics in the Prometheus text exposition format
+        """
+        lines = []
+
+        with self._lock:
+            families = [(name, kind, help, list(metrics.items())) for name, (kind, help, metrics) in self._families.items()]
+
+        for name, kind, help, metrics in sorted(families):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+
+            for labels, metric in metrics:
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    lines.append(f'{sample}{_format_labels(sample_labels)} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def _get(self, cls, name, help, labels, factory):
+        key = tuple(sorted((label, str(value)) for label, value in labels.items()))
+
+        with self._lock:
+            kind, _, metrics = self._families.setdefault(name, (cls.kind, help, dict()))
+
+            if kind != cls.kind:
+                raise Exception(f'Metric {name} already registered as a {kind}')
+
+            if key not in metrics:
+                metrics[key] = factory()
+
+            return metrics[key]
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for label, value in labels)
+    return '{' + ','.join(f'{label}="{value}"' for (label, _), value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+registry = MetricsRegistry()
+"""Registry used by the drivers and controllers"""
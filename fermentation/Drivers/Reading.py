@@ -0,0 +1,53 @@
+import time
+
+
+class Reading:
+    """
+    Immutable snapshot of a sensor reading.
+
+    Drivers publish a new Reading by assigning it to a single attribute, so readers in other threads
+    always see a consistent value, gravity and timestamp without taking any locks.
+    """
+
+    __slots__ = ('value', 'gravity', 'timestamp', 'sequence')
+
+    def __init__(self, value, gravity=None, timestamp=None, sequence=0):
+        """
+        :param value: temperature in celsius
+        :param gravity: specific gravity, for sensors measuring it
+        :param timestamp: time.monotonic() time the reading was received, None if nothing has been received yet
+        :param sequence: number of readings received by the driver, incremented for each new reading
+        """
+        object.__setattr__(self, 'value', value)
+        object.__setattr__(self, 'gravity', gravity)
+        object.__setattr__(self, 'timestamp', timestamp)
+        object.__setattr__(self, 'sequence', sequence)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+
+    def __repr__(self):
+        return f'Reading(value={self.value}, gravity={self.gravity}, timestamp={self.timestamp}, sequence={self.sequence})'
+
+
+    def age(self, now=None):
+        """
+        Returns the age of the reading in seconds, infinite if nothing has been received yet
+        """
+        if self.timestamp is None:
+            return float('inf')
+
+        return (time.monotonic() if now is None else now) - self.timestamp
+
+
+    def is_stale(self, max_age, now=None):
+        """
+        Returns true if the reading is older than max_age seconds
+        """
+        return self.age(now) > max_age
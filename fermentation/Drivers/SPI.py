@@ -0,0 +1,129 @@
+from threading import Lock
+from Drivers.GpioBackend import RPiGpioBackend
+
+
+class BitBangSPI:
+    """
+    Software based SPI transport. Any 4 GPIO pins can be used.
+    Data is shifted out on the rising clock edge and sampled on the falling edge (SPI mode 1).
+    The clock and data out pins are changed together, which is a single register write with the
+    memory mapped GPIO backend.
+
+    Transfers are serialized by a lock shared by all instances, as several chips may share the
+    clock and data pins while being read from different threads.
+    """
+
+    _bus_lock = Lock()
+
+    def __init__(self, cs_pin, miso_pin, mosi_pin, clk_pin, gpio=None):
+        """
+        :param gpio: GPIO backend to use, defaults to RPiGpioBackend.
+        """
+        self._cs_pin = cs_pin
+        self._miso_pin = miso_pin
+        self._mosi_pin = mosi_pin
+        self._clk_pin = clk_pin
+        self._clk_mask = 1 << clk_pin
+        self._mosi_mask = 1 << mosi_pin
+        self._gpio = gpio if gpio is not None else RPiGpioBackend()
+        self._setup_GPIO()
+
+
+    def _setup_GPIO(self):
+        """
+        Setup GPIOs for SPI connection:
+        CS: Chip Select (also called SS)
+        CLK: Serial Clock
+        MISO: Master In Slave Out (SDO at slave)
+        MOSI: Master Out Slave In (SDI at slave)
+        """
+        self._gpio.setup_output(self._cs_pin)
+        self._gpio.setup_input(self._miso_pin)
+        self._gpio.setup_output(self._mosi_pin)
+        self._gpio.setup_output(self._clk_pin)
+        self._gpio.write(self._cs_pin, True)
+        self._gpio.write(self._clk_pin, False)
+        self._gpio.write(self._mosi_pin, False)
+
+
+    def transfer(self, data):
+        """
+        Full duplex transfer of the given bytes within a single chip select frame.
+
+        :param data: Bytes to send.
+        :return: List of the bytes received while sending.
+        """
+        with BitBangSPI._bus_lock:
+            self._gpio.write(self._cs_pin, False)
+            received = [self._transfer_byte(byte) for byte in data]
+            self._gpio.write(self._cs_pin, True)
+
+        return received
+
+
+    def close(self):
+        pass
+
+
+    def _transfer_byte(self, byte):
+        """
+        Send and receive one byte
+        """
+        write_pins = self._gpio.write_pins
+        read = self._gpio.read
+        clk = self._clk_mask
+        mosi = self._mosi_mask
+        miso_pin = self._miso_pin
+        received = 0x00
+
+        for bit in range(8):
+            # raise the clock and present the data bit at the same time
+            if byte & 0x80:
+                write_pins(clk | mosi)
+
+            else:
+                write_pins(clk, mosi)
+
+            byte <<= 1
+            received <<= 1
+
+            if read(miso_pin):
+                received |= 0x1
+
+            write_pins(0, clk)
+
+        return received
+
+
+class HardwareSPI:
+    """
+    SPI transport using the hardware SPI controller through spidev (/dev/spidevX.Y).
+    The chip select is driven by the controller, e.g. CE0 (GPIO 8) for device 0.
+    """
+
+    def __init__(self, bus=0, device=0, max_speed_hz=500000, mode=1, spi_device=None):
+        """
+        :param spi_device: optional spidev.SpiDev compatible object to use instead of opening /dev/spidev<bus>.<device>
+        """
+        if spi_device is None:
+            import spidev
+            spi_device = spidev.SpiDev()
+
+        self._spi = spi_device
+        self._spi.open(bus, device)
+        self._spi.mode = mode
+        self._spi.max_speed_hz = max_speed_hz
+
+
+    def transfer(self, data):
+        """
+        Full duplex transfer of the given bytes within a single chip select frame.
+
+        :param data: Bytes to send.
+        :return: List of the bytes received while sending.
+        """
+        return self._spi.xfer2(list(data))
+
+
+    def close(self):
+        self._spi.close()
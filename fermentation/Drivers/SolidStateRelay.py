@@ -1,5 +1,6 @@
-import time
-import RPi.GPIO as GPIO
+from Drivers.GpioBackend import RPiGpioBackend
+from Drivers.Clock import system_clock
+from Drivers.Metrics import registry
 
 
 class SolidStateRelay:
@@ -7,10 +8,18 @@ class SolidStateRelay:
     Simple class representing a solid state relay output.
     """
 
-    def __init__(self, pin, active_high=True, initial_state=False):
+    def __init__(self, pin, active_high=True, initial_state=False, gpio=None, clock=None):
+        """
+        :param gpio: GPIO backend to use, defaults to RPiGpioBackend.
+        :param clock: clock used to time the relay state, defaults to the system clock.
+        """
+        self._clock = clock if clock is not None else system_clock
         self._pin = pin
         self._active_high = active_high
-        GPIO.setup(self._pin, GPIO.OUT)
+        self._gpio = gpio if gpio is not None else RPiGpioBackend()
+        self._gpio.setup_output(self._pin)
+        self._state = None
+        self._switches = registry.counter('relay_switches', 'Relay output changes', pin=pin)
         self.set_state(initial_state)
 
 
@@ -33,20 +42,20 @@ class SolidStateRelay:
         Sets the output state of the relay to active or inactive.
         :param state: True => active, False = inactive
         """
-        if state:
-            GPIO.output(self._pin, GPIO.HIGH if self._active_high else GPIO.LOW)
+        self._gpio.write(self._pin, state if self._active_high else not state)
 
-        else:
-            GPIO.output(self._pin, GPIO.LOW if self._active_high else GPIO.HIGH)
+        if self._state is not None and bool(state) != self._state:
+            self._switches.inc()
 
-        self._timestamp = time.time()
+        self._state = bool(state)
+        self._timestamp = self._clock.monotonic()
 
 
     def state(self):
         """
         Return the output state of the relay given the active low/high setting
         """
-        state = GPIO.input(self._pin)
+        state = self._gpio.read(self._pin)
         return state if self._active_high else not state
 
 
@@ -54,11 +63,19 @@ class SolidStateRelay:
         """
         Toggle the output relay
         """
-        self.set_state(not GPIO.input(self._pin))
+        self.set_state(not self._gpio.read(self._pin))
+
+
+    def restore(self, state, elapsed):
+        """
+        Sets the output state as if it was set elapsed seconds ago, e.g. to restore the relay timing after a restart
+        """
+        self.set_state(state)
+        self._timestamp = self._clock.monotonic() - elapsed
 
 
     def elapsed_time(self):
         """
         Returns the time in seconds the relay has been in it's current state.
         """
-        return time.time() - self._timestamp
+        return self._clock.monotonic() - self._timestamp
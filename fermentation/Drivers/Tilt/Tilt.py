@@ -1,25 +1,14 @@
-
 import logging
-import time
-from threading import Thread, Event
-from Drivers.Tilt.blescan import create_blescan_socket, parse_events
+from Drivers.Reading import Reading
+from Drivers.Clock import system_clock
+from Drivers.Metrics import registry, INTERVAL_BUCKETS
+from Drivers.Tilt.TiltScanner import acquire_scanner, release_scanner
+from Drivers.Tilt.colours import TILTS
 
 
 logger = logging.getLogger(__name__)
 
 
-TILTS = {
-    'red':    'a495bb10c5b14b44b5121370f02d74de',
-    'green':  'a495bb20c5b14b44b5121370f02d74de',
-    'black':  'a495bb30c5b14b44b5121370f02d74de',
-    'purple': 'a495bb40c5b14b44b5121370f02d74de',
-    'orange': 'a495bb50c5b14b44b5121370f02d74de',
-    'blue':   'a495bb60c5b14b44b5121370f02d74de',
-    'yellow': 'a495bb70c5b14b44b5121370f02d74de',
-    'pink':   'a495bb80c5b14b44b5121370f02d74de',
-}
-
-
 def _fahrenheit_to_celsius(temperature):
     """
     Converts a fahrenheit temperature to celsius
@@ -34,72 +23,85 @@ class Tilt:
 
     Inspired by on https://github.com/JustinFuhrmeister-Clarke/pytilt
 
-    Notes:
-    if more than one Tilt should be supported, blescan must be implemented in a single separate
-    thread, otherwise each tilt object will have it's own blescan which probably wont work
+    Beacons are received through the shared TiltScanner, so any number of Tilt devices can be used
+    at the same time.
     """
 
-    def __init__(self, tilt_colour, timeout=120):
+    def __init__(self, tilt_colour, timeout=120, kernel_filter=None, clock=None):
         """
-        Initializes resources used by Tilt driver.
-        The thread is started as a daemon because we don't want it to keep the program alive
-        after the main thread is killed. A graceful shutdown is attempted in destroy()
+        Initializes the Tilt driver and subscribes it to beacons from the shared scanner.
+        Set kernel_filter to 'ibeacon' or 'tilt' to drop unrelated bluetooth traffic in the kernel. The filter is
+        shared by all Tilts, so it must be the same for every Tilt setting one.
         """
+        self._clock = clock if clock is not None else system_clock
         logger.info(f"creating {tilt_colour} tilt device")
         self._colour = tilt_colour
+        self._uuid = bytes.fromhex(TILTS[tilt_colour])
         self._timeout = timeout
-        self._temperature = 0.0
-        self._gravity = 0.0
-        self._stop_flag = Event()
-        self._thread = Thread(target=self._loop, daemon=True)
-        self._thread.start()
+        self._reading = Reading(0.0, gravity=0.0)
+        self._created = self._clock.monotonic()
+        self._interval = registry.histogram('tilt_beacon_interval_seconds', 'Time between received Tilt beacons',
+                                            buckets=INTERVAL_BUCKETS, colour=tilt_colour)
+        self._scanner = acquire_scanner(kernel_filter=kernel_filter)
+        self._scanner.subscribe(self._uuid, self)
 
 
     def temperature(self):
         """
         Returns the latest received Tilt temperature reading in celsius
         """
-        return self._temperature
+        return self._reading.value
 
 
     def gravity(self):
         """
         Returns the latest received Tilt gravity reading
         """
-        return self._gravity
+        return self._reading.gravity
+
+
+    def reading(self):
+        """
+        Returns the latest received Reading, holding temperature and gravity from the same beacon
+        """
+        return self._reading
 
 
     def destroy(self):
         """
-        Stops the beacon sc an thread safely
+        Unsubscribes from the shared scanner, which is stopped when the last Tilt is destroyed
         """
-        self._stop_flag.set()
-        self._thread.join(timeout=10)
+        if self._scanner:
+            self._scanner.unsubscribe(self._uuid, self)
+            self._scanner = None
+            release_scanner()
 
 
-    def _loop(self):
+    def beacon(self, major, minor):
         """
-        Internal beacon scan loop that continuously scans for tilt beacons.
+        Called by the scanner when a beacon from this Tilt is received.
         Beacons are sent roughly every 30 seconds from the Tilt.
+        The new reading is published with a single assignment, so readers never see a torn temperature/gravity pair.
+        """
+        previous = self._reading.timestamp
+        self._reading = Reading(_fahrenheit_to_celsius(major), gravity=minor, timestamp=self._clock.monotonic(),
+                                sequence=self._reading.sequence + 1)
+
+        if previous is not None:
+            self._interval.observe(self._reading.timestamp - previous)
+
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"{self._colour} beacon received, {major} {minor}")
+
+
+    def check_timeout(self):
+        """
+        Called by the scanner after each scan.
         If time interval between beacons gets too big, a warning is issued.
         """
-        last_beacon_time = time.time()
-        socket = create_blescan_socket()
-
-        while not self._stop_flag.is_set():
-            beacons = parse_events(socket, 10)
-
-            for beacon in beacons:
-                if beacon['uuid'] == TILTS[self._colour]:
-                    self._temperature = _fahrenheit_to_celsius(beacon['major'])
-                    self._gravity = beacon['minor']
-                    last_beacon_time = time.time()
-                    logger.debug(f"beacon received, {beacon['major']} {beacon['minor']}")
-
-            if time.time() - last_beacon_time > self._timeout:
-                logger.warning(f"tilt beacon not received in {time.time() - last_beacon_time}s")
-
-            # don't block too long when stopping
-            for i in range(10):
-                if not self._stop_flag.is_set():
-                    time.sleep(1)
+        reading = self._reading
+        now = self._clock.monotonic()
+        elapsed = reading.age(now) if reading.timestamp is not None else now - self._created
+
+        if elapsed > self._timeout:
+            logger.warning(f"{self._colour} tilt beacon not received in {elapsed}s")
@@ -0,0 +1,260 @@
+import asyncio
+import logging
+from threading import Thread, Lock
+from Drivers.Tilt.aioscan import BeaconScanner
+from Drivers.Tilt.blescan import create_blescan_socket, hci_disable_le_scan
+from Drivers.Tilt.bpf import ibeacon_filter, attach_filter, detach_filter
+
+
+logger = logging.getLogger(__name__)
+
+
+class TiltScanner:
+    """
+    Shared bluetooth scanner service which owns the HCI socket and dispatches decoded beacons to
+    subscribers based on the beacon uuid. A single scanner serves any number of Tilt devices, so
+    each advertising report is only received and decoded once.
+
+    Scanning is event driven, beacons are dispatched as soon as they are received.
+    Use acquire_scanner() and release_scanner() to get hold of the shared instance.
+    """
+
+    KERNEL_FILTERS = (None, 'ibeacon', 'tilt')
+    """
+    Kernel side socket filter modes:
+    None: all HCI events are passed to the scanner
+    'ibeacon': only iBeacon advertising reports are passed
+    'tilt': only iBeacon advertising reports from subscribed uuids are passed
+    """
+
+    def __init__(self, dev_id=0, socket_factory=create_blescan_socket, timeout_check_interval=10):
+        self._dev_id = dev_id
+        self._kernel_filter = None
+        self._socket = None
+        self._socket_factory = socket_factory
+        self._timeout_check_interval = timeout_check_interval
+        self._subscribers = dict()
+        self._lock = Lock()
+        self._loop = None
+        self._task = None
+        self._timer = None
+        self._thread = None
+
+
+    def subscribe(self, uuid, subscriber):
+        """
+        Registers a subscriber for beacons with the given raw 16 byte uuid.
+        The subscriber must implement beacon(major, minor) and check_timeout()
+        """
+        with self._lock:
+            subscribers = list(self._subscribers.get(uuid, []))
+            subscribers.append(subscriber)
+            self._subscribers = {**self._subscribers, uuid: subscribers}
+            self._attach_kernel_filter()
+
+
+    def unsubscribe(self, uuid, subscriber):
+        """
+        Removes a subscriber previously registered with subscribe()
+        """
+        with self._lock:
+            subscribers = [s for s in self._subscribers.get(uuid, []) if s is not subscriber]
+            self._subscribers = {k: v for k, v in self._subscribers.items() if k != uuid}
+
+            if subscribers:
+                self._subscribers[uuid] = subscribers
+
+            self._attach_kernel_filter()
+
+
+    def set_kernel_filter(self, mode):
+        """
+        Sets the kernel side socket filter mode, see KERNEL_FILTERS
+        """
+        if mode not in TiltScanner.KERNEL_FILTERS:
+            raise Exception(f'Unknown kernel filter mode, {mode}')
+
+        with self._lock:
+            if mode is None and self._kernel_filter is not None and self._socket is not None:
+                detach_filter(self._socket)
+
+            self._kernel_filter = mode
+            self._attach_kernel_filter()
+
+
+    def kernel_filter(self):
+        """
+        Returns the kernel side socket filter mode, see KERNEL_FILTERS
+        """
+        return self._kernel_filter
+
+
+    def start(self):
+        """
+        Starts scanning in a separate thread running its own event loop.
+        The thread is started as a daemon because we don't want it to keep the program alive
+        after the main thread is killed. A graceful shutdown is attempted in stop()
+        """
+        self._loop = asyncio.new_event_loop()
+        self._task = self._loop.create_task(self.run())
+        self._thread = Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        """
+        Stops the scan thread safely. Scanning is cancelled immediately.
+        The scan may already have ended, e.g. when no bluetooth adapter is present, in which case its loop is closed.
+        """
+        if not self._thread:
+            return
+
+        try:
+            if self._thread.is_alive() and not self._loop.is_closed():
+                self._loop.call_soon_threadsafe(self._task.cancel)
+
+        except RuntimeError:
+            # the loop closed between the check and scheduling the cancel
+            pass
+
+        finally:
+            self._thread.join(timeout=10)
+            self._thread = None
+
+
+    def dispatch(self, beacons):
+        """
+        Sends each beacon to the subscribers of its uuid.
+        The subscriber dictionary is replaced rather than mutated on (un)subscribe, so it can be
+        read here without holding the lock.
+        """
+        subscribers = self._subscribers
+
+        for beacon in beacons:
+            for subscriber in subscribers.get(beacon.uuid, ()):
+                subscriber.beacon(beacon.major, beacon.minor)
+
+
+    def check_timeouts(self):
+        """
+        Lets every subscriber check how long ago its last beacon was received
+        """
+        for subscribers in self._subscribers.values():
+            for subscriber in subscribers:
+                subscriber.check_timeout()
+
+
+    async def run(self):
+        """
+        Scans for beacons and dispatches them until cancelled
+        """
+        loop = asyncio.get_running_loop()
+        socket = self._socket_factory(self._dev_id)
+
+        with self._lock:
+            self._socket = socket
+            self._attach_kernel_filter()
+
+        self._timer = loop.call_later(self._timeout_check_interval, self._check_timeouts_periodically)
+
+        try:
+            await BeaconScanner(socket, self.dispatch).run()
+
+        finally:
+            with self._lock:
+                self._socket = None
+
+            self._timer.cancel()
+            hci_disable_le_scan(socket)
+            socket.close()
+            logger.info(f"blescan stopped for device {self._dev_id}")
+
+
+    def _attach_kernel_filter(self):
+        """
+        Attaches the socket filter matching the current mode and subscribers.
+        Must be called with the lock held.
+        """
+        if self._kernel_filter is None or self._socket is None:
+            return
+
+        uuids = self._subscribers.keys() if self._kernel_filter == 'tilt' else None
+        attach_filter(self._socket, ibeacon_filter(uuids))
+        logger.debug(f"kernel filter attached, {self._kernel_filter}")
+
+
+    def _check_timeouts_periodically(self):
+        self.check_timeouts()
+        loop = asyncio.get_running_loop()
+        self._timer = loop.call_later(self._timeout_check_interval, self._check_timeouts_periodically)
+
+
+    def _run(self):
+        """
+        Scan thread entry point
+        """
+        asyncio.set_event_loop(self._loop)
+
+        try:
+            self._loop.run_until_complete(self._task)
+
+        except asyncio.CancelledError:
+            pass
+
+        except Exception:
+            logger.error('blescan failed', exc_info=True)
+
+        finally:
+            self._loop.close()
+
+
+_scanner = None
+_references = 0
+_scanner_lock = Lock()
+
+
+def acquire_scanner(dev_id=0, kernel_filter=None):
+    """
+    Returns the shared scanner, creating and starting it on first use.
+    Every call must be paired with a call to release_scanner()
+
+    :param kernel_filter: optional kernel filter mode to set on the scanner, see TiltScanner.KERNEL_FILTERS.
+        The mode applies to all Tilts, so a mode other than the one already set on the scanner is rejected.
+    """
+    global _scanner, _references
+
+    with _scanner_lock:
+        if _scanner is None:
+            _scanner = TiltScanner(dev_id)
+            _scanner.start()
+
+        elif kernel_filter and _scanner.kernel_filter() not in (None, kernel_filter):
+            raise Exception(f'Kernel filter {kernel_filter} conflicts with {_scanner.kernel_filter()} of the scanner '
+                            f'shared by all Tilts')
+
+        if kernel_filter:
+            _scanner.set_kernel_filter(kernel_filter)
+
+        _references += 1
+        return _scanner
+
+
+def release_scanner():
+    """
+    Releases a reference to the shared scanner. The scanner is stopped when the last reference
+    is released.
+    """
+    global _scanner, _references
+
+    with _scanner_lock:
+        if _references == 0:
+            return
+
+        _references -= 1
+
+        if _references == 0:
+            try:
+                _scanner.stop()
+
+            finally:
+                _scanner = None
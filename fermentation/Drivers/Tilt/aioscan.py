@@ -0,0 +1,98 @@
+import asyncio
+import errno
+import logging
+import time
+from Drivers.Tilt.decoder import decode_packet
+from Drivers.Metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+HCI_MAX_EVENT_SIZE = 260
+MAX_PACKETS_PER_WAKEUP = 64
+
+
+class BeaconScanner:
+    """
+    Event driven beacon scanner for asyncio.
+    The socket is registered with the event loop using add_reader(), and each packet is decoded as
+    soon as it arrives and pushed to the consumer callback. There is no polling or sleeping, and
+    the scanner stops as soon as run() is cancelled.
+
+    Any socket-like object with fileno(), setblocking() and recv() can be used, e.g. a bluez HCI
+    socket or one end of a socketpair replaying recorded HCI frames.
+    """
+
+    def __init__(self, sock, on_beacons, uuids=None):
+        """
+        :param sock: socket delivering one HCI event packet per recv().
+        :param on_beacons: callback called with the list of beacons decoded from each packet.
+        :param uuids: optional container of raw 16 byte uuids to filter beacons on.
+        """
+        self._sock = sock
+        self._on_beacons = on_beacons
+        self._uuids = uuids
+        self._done = None
+        self.packets = 0
+        self._packet_count = registry.counter('hci_packets', 'HCI event packets received by the beacon scanner')
+        self._decode_duration = registry.histogram('hci_decode_seconds', 'Time to decode an HCI event packet')
+
+
+    async def run(self):
+        """
+        Scans for beacons until cancelled, or until the socket is closed by the other end
+        """
+        loop = asyncio.get_running_loop()
+        fd = self._sock.fileno()
+        self._done = loop.create_future()
+        self._sock.setblocking(False)
+        loop.add_reader(fd, self._on_readable)
+
+        try:
+            await self._done
+
+        finally:
+            loop.remove_reader(fd)
+
+
+    def _on_readable(self):
+        """
+        Drains the packets waiting on the socket, bounded so a flood of advertisements can't starve
+        the other tasks on the event loop.
+        """
+        for i in range(MAX_PACKETS_PER_WAKEUP):
+            try:
+                pkt = self._sock.recv(HCI_MAX_EVENT_SIZE)
+
+            except (BlockingIOError, InterruptedError):
+                return
+
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    return
+
+                # a persistent error, e.g. ENETDOWN when the adapter goes down, would wake the loop up forever
+                asyncio.get_running_loop().remove_reader(self._sock.fileno())
+
+                if not self._done.done():
+                    self._done.set_exception(e)
+                return
+
+            if not pkt:
+                if not self._done.done():
+                    self._done.set_result(None)
+                return
+
+            self.packets += 1
+            self._packet_count.inc()
+            start = time.perf_counter()
+            beacons = decode_packet(pkt, self._uuids)
+            self._decode_duration.observe(time.perf_counter() - start)
+
+            if beacons:
+                try:
+                    self._on_beacons(beacons)
+
+                except Exception:
+                    logger.error('beacon consumer failed', exc_info=True)
@@ -26,11 +26,17 @@
 
 import logging
 import struct
+import time
 import bluetooth._bluetooth as bluez
+from Drivers.Tilt.decoder import decode_packet
+from Drivers.Metrics import registry
 
 
 logger = logging.getLogger(__name__)
 
+_packet_count = registry.counter('hci_packets', 'HCI event packets received by the beacon scanner')
+_decode_duration = registry.histogram('hci_decode_seconds', 'Time to decode an HCI event packet')
+
 
 LE_META_EVENT = 0x3e
 LE_PUBLIC_ADDRESS = 0x00
@@ -58,26 +64,6 @@ ADV_NONCONN_IND = 0x03
 ADV_SCAN_RSP = 0x04
 
 
-def _return_number_packet(pkt):
-    integer = 0
-    multiple = 256
-
-    for c in pkt:
-        integer += c * multiple
-        multiple = 1
-
-    return integer
-
-
-def _return_string_packet(pkt):
-    string = ''
-
-    for c in pkt:
-        string += '%02x' % c
-
-    return string
-
-
 def _hci_toggle_le_scan(sock, enable):
     cmd_pkt = struct.pack("<BB", enable, 0x00)
     bluez.hci_send_cmd(sock, OGF_LE_CTL, OCF_LE_SET_SCAN_ENABLE, cmd_pkt)
@@ -91,10 +77,20 @@ def hci_disable_le_scan(sock):
     _hci_toggle_le_scan(sock, 0x00)
 
 
+def hci_set_event_filter(sock):
+    """
+    Installs an HCI filter passing all HCI event packets to the socket
+    """
+    flt = bluez.hci_filter_new()
+    bluez.hci_filter_all_events(flt)
+    bluez.hci_filter_set_ptype(flt, bluez.HCI_EVENT_PKT)
+    sock.setsockopt(bluez.SOL_HCI, bluez.HCI_FILTER, flt)
+
+
 def create_blescan_socket(dev_id=0):
     try:
         sock = bluez.hci_open_dev(dev_id)
-        old_filter = sock.getsockopt(bluez.SOL_HCI, bluez.HCI_FILTER, 14)
+        hci_set_event_filter(sock)
         hci_enable_le_scan(sock)
         logger.info(f"blescan started for device {dev_id}")
         return sock
@@ -104,40 +100,24 @@ def create_blescan_socket(dev_id=0):
         raise
 
 
-def parse_events(sock, loop_count=100):
+def parse_events(sock, loop_count=100, uuids=None):
     """
     perform a device inquiry on bluetooth device #0
     The inquiry should last 8 * 1.28 = 10.24 seconds before the inquiry is performed, bluez should flush its cache of
     previously discovered devices.
+
+    Returns the decoded iBeacon records, optionally only those matching one of the given raw uuids.
     """
     old_filter = sock.getsockopt(bluez.SOL_HCI, bluez.HCI_FILTER, 14)
-    flt = bluez.hci_filter_new()
-    bluez.hci_filter_all_events(flt)
-    bluez.hci_filter_set_ptype(flt, bluez.HCI_EVENT_PKT)
-    sock.setsockopt(bluez.SOL_HCI, bluez.HCI_FILTER, flt)
+    hci_set_event_filter(sock)
     beacons = []
 
     for i in range(0, loop_count):
         pkt = sock.recv(255)
-        ptype, event, plen = struct.unpack('BBB', pkt[:3])
-
-        if event == LE_META_EVENT:
-            subevent = pkt[3]
-            pkt = pkt[4:]
-
-            if subevent == EVT_LE_CONN_COMPLETE:
-                le_handle_connection_complete(pkt)
-
-            elif subevent == EVT_LE_ADVERTISING_REPORT:
-                num_reports = pkt[0]
-                report_pkt_offset = 0
-
-                for i in range(0, num_reports):
-                    beacons.append({
-                        'uuid': _return_string_packet(pkt[report_pkt_offset - 22: report_pkt_offset - 6]),
-                        'minor': _return_number_packet(pkt[report_pkt_offset - 4: report_pkt_offset - 2]),
-                        'major': _return_number_packet(pkt[report_pkt_offset - 6: report_pkt_offset - 4])
-                    })
+        _packet_count.inc()
+        start = time.perf_counter()
+        beacons += decode_packet(pkt, uuids)
+        _decode_duration.observe(time.perf_counter() - start)
 
     sock.setsockopt(bluez.SOL_HCI, bluez.HCI_FILTER, old_filter)
     return beacons
@@ -0,0 +1,175 @@
+"""
+Classic BPF socket filter passing only iBeacon advertising reports to the scanner socket.
+
+Without a filter every LE advertisement in range wakes up the scanner, phones, watches and all
+sorts of gadgets included. The filter runs in the kernel on each HCI event packet, so anything
+that isn't an iBeacon (optionally with one of the given uuids) is dropped before it reaches us.
+
+Packet offsets as seen by the filter, which includes the HCI packet type byte:
+
+    0 ptype, 1 event, 2 plen, 3 subevent, 4 num_reports, 5 event_type, 6 address_type,
+    7-12 address, 13 data_length, 14- data
+
+The iBeacon AD structure is checked right after the flags AD structure (offset 17) and at the
+start of the data (offset 14). Events containing more than one report are always passed, since
+the reports are not at fixed offsets, and left for the decoder to handle.
+"""
+
+import ctypes
+import socket
+import struct
+
+
+SO_ATTACH_FILTER = 26
+SO_DETACH_FILTER = 27
+
+# instruction classes and fields from linux/filter.h
+BPF_LD = 0x00
+BPF_JMP = 0x05
+BPF_RET = 0x06
+BPF_W = 0x00
+BPF_H = 0x08
+BPF_B = 0x10
+BPF_ABS = 0x20
+BPF_JEQ = 0x10
+BPF_K = 0x00
+
+ACCEPT = 0xffffffff
+DROP = 0
+
+HCI_EVENT_OFFSET = 1
+HCI_SUBEVENT_OFFSET = 3
+HCI_NUM_REPORTS_OFFSET = 4
+HCI_DATA_OFFSET = 14
+FLAGS_AD_LENGTH = 3
+
+LE_META_EVENT = 0x3e
+EVT_LE_ADVERTISING_REPORT = 0x02
+IBEACON_HEADER = 0x1aff4c00
+"""AD length 0x1A, manufacturer specific type 0xFF and the Apple company id 0x004C"""
+IBEACON_TYPE = 0x0215
+"""iBeacon type 0x02 and remaining length 0x15"""
+IBEACON_UUID_OFFSET = 6
+
+
+_SOCK_FILTER = struct.Struct('HBBI')
+_SOCK_FPROG = struct.Struct('HL')
+
+
+class _Assembler:
+    """
+    Minimal assembler resolving symbolic jump targets into the relative offsets used by classic BPF
+    """
+
+    def __init__(self):
+        self._instructions = []
+        self._labels = dict()
+
+
+    def label(self, name):
+        self._labels[name] = len(self._instructions)
+
+
+    def load(self, size, offset):
+        self._instructions.append((BPF_LD | size | BPF_ABS, None, None, offset))
+
+
+    def jump_equal(self, value, true_label, false_label):
+        self._instructions.append((BPF_JMP | BPF_JEQ | BPF_K, true_label, false_label, value))
+
+
+    def ret(self, value):
+        self._instructions.append((BPF_RET | BPF_K, None, None, value))
+
+
+    def assemble(self):
+        program = []
+
+        for index, (code, true_label, false_label, k) in enumerate(self._instructions):
+            program.append((code, self._offset(index, true_label), self._offset(index, false_label), k))
+
+        return program
+
+
+    def _offset(self, index, label):
+        if label is None:
+            return 0
+
+        # jumps are relative to the next instruction and can only go forward
+        offset = (index + 1 if label == 'next' else self._labels[label]) - index - 1
+
+        if not 0 <= offset <= 255:
+            raise ValueError(f'BPF jump to {label} out of range')
+
+        return offset
+
+
+def ibeacon_filter(uuids=None):
+    """
+    Builds a BPF program passing only iBeacon advertising reports.
+    If uuids are given, only iBeacons with one of those raw 16 byte uuids are passed.
+    Returns the program as a list of (code, jt, jf, k) instructions.
+    """
+    uuids = list(uuids) if uuids is not None else None
+    asm = _Assembler()
+
+    asm.load(BPF_B, HCI_EVENT_OFFSET)
+    asm.jump_equal(LE_META_EVENT, 'next', 'drop')
+    asm.load(BPF_B, HCI_SUBEVENT_OFFSET)
+    asm.jump_equal(EVT_LE_ADVERTISING_REPORT, 'next', 'drop')
+    asm.load(BPF_B, HCI_NUM_REPORTS_OFFSET)
+    asm.jump_equal(1, 'next', 'accept')
+
+    positions = [HCI_DATA_OFFSET + FLAGS_AD_LENGTH, HCI_DATA_OFFSET]
+
+    for i, position in enumerate(positions):
+        asm.label(f'position{i}')
+        miss = f'position{i + 1}' if i + 1 < len(positions) else 'drop'
+        asm.load(BPF_W, position)
+        asm.jump_equal(IBEACON_HEADER, 'next', miss)
+        asm.load(BPF_H, position + 4)
+        asm.jump_equal(IBEACON_TYPE, f'uuids{i}', miss)
+
+    for i, position in enumerate(positions):
+        asm.label(f'uuids{i}')
+
+        if uuids is None:
+            asm.ret(ACCEPT)
+            continue
+
+        if not uuids:
+            asm.ret(DROP)
+            continue
+
+        for j, uuid in enumerate(uuids):
+            asm.label(f'uuids{i}_{j}')
+            miss = f'uuids{i}_{j + 1}' if j + 1 < len(uuids) else 'drop'
+
+            for offset in range(0, 16, 4):
+                asm.load(BPF_W, position + IBEACON_UUID_OFFSET + offset)
+                asm.jump_equal(int.from_bytes(uuid[offset:offset + 4], 'big'), 'next', miss)
+
+            asm.ret(ACCEPT)
+
+    asm.label('accept')
+    asm.ret(ACCEPT)
+    asm.label('drop')
+    asm.ret(DROP)
+
+    return asm.assemble()
+
+
+def attach_filter(sock, program):
+    """
+    Attaches a BPF program to the socket, replacing any previously attached program.
+    The kernel copies the program, so the buffer only has to live for the duration of the call.
+    """
+    buffer = ctypes.create_string_buffer(b''.join(_SOCK_FILTER.pack(*instruction) for instruction in program))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, _SOCK_FPROG.pack(len(program), ctypes.addressof(buffer)))
+
+
+def detach_filter(sock):
+    """
+    Removes the BPF program attached to the socket
+    """
+    sock.setsockopt(socket.SOL_SOCKET, SO_DETACH_FILTER, 0)
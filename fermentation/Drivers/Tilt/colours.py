@@ -0,0 +1,15 @@
+"""
+iBeacon uuids of the Tilt colours. Kept apart from the Tilt driver, so the configuration can be checked
+without importing the bluetooth modules.
+"""
+
+TILTS = {
+    'red':    'a495bb10c5b14b44b5121370f02d74de',
+    'green':  'a495bb20c5b14b44b5121370f02d74de',
+    'black':  'a495bb30c5b14b44b5121370f02d74de',
+    'purple': 'a495bb40c5b14b44b5121370f02d74de',
+    'orange': 'a495bb50c5b14b44b5121370f02d74de',
+    'blue':   'a495bb60c5b14b44b5121370f02d74de',
+    'yellow': 'a495bb70c5b14b44b5121370f02d74de',
+    'pink':   'a495bb80c5b14b44b5121370f02d74de',
+}
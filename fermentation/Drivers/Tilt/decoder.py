@@ -0,0 +1,115 @@
+"""
+Decoding of HCI LE advertising report events into iBeacon records.
+
+The decoder works directly on the received packet through a memoryview and precompiled struct
+objects, so no intermediate slices, strings or dictionaries are created while walking a packet.
+Reports are walked by their real offsets, so every report in a multi-report event is decoded.
+
+HCI event packet layout as received on a raw HCI socket:
+
+    ptype(1) event(1) plen(1) subevent(1) num_reports(1) report[num_reports]
+
+with each advertising report laid out as:
+
+    event_type(1) address_type(1) address(6) data_length(1) data(data_length) rssi(1)
+
+The data is a sequence of AD structures, length(1) type(1) payload(length - 1), where an iBeacon is
+a manufacturer specific structure (type 0xFF) with the Apple company id and iBeacon type:
+
+    0x1A 0xFF 0x4C 0x00 0x02 0x15 uuid(16) major(2) minor(2) tx_power(1)
+"""
+
+import struct
+from collections import namedtuple
+
+
+HCI_EVENT_PKT = 0x04
+LE_META_EVENT = 0x3e
+EVT_LE_ADVERTISING_REPORT = 0x02
+
+AD_TYPE_MANUFACTURER_SPECIFIC = 0xff
+IBEACON_AD_LENGTH = 0x1a
+IBEACON_PREFIX = 0x4c000215
+"""Apple company id 0x004C (little endian) followed by iBeacon type 0x02 and length 0x15"""
+
+
+Beacon = namedtuple('Beacon', ['uuid', 'major', 'minor', 'tx_power', 'rssi'])
+"""Decoded iBeacon record. The uuid is kept as the raw 16 bytes."""
+
+
+_EVENT_HEADER = struct.Struct('BBBBB')
+_AD_HEADER = struct.Struct('>BBI')
+_IBEACON = struct.Struct('>16sHHb')
+_RSSI = struct.Struct('b')
+
+_REPORT_HEADER_SIZE = 8
+_EVENT_HEADER_SIZE = _EVENT_HEADER.size
+_IBEACON_OFFSET = _AD_HEADER.size
+_IBEACON_SIZE = _AD_HEADER.size + _IBEACON.size
+
+
+def decode_packet(pkt, uuids=None):
+    """
+    Decodes all iBeacon advertising reports from a single HCI event packet.
+    Returns a list of Beacon records, empty if the packet is not an advertising report.
+
+    :param pkt: bytes-like HCI event packet including the packet type byte.
+    :param uuids: optional container of raw 16 byte uuids. If given, only matching beacons are returned.
+    """
+    buf = memoryview(pkt)
+    end = len(buf)
+    beacons = []
+
+    if end < _EVENT_HEADER_SIZE:
+        return beacons
+
+    ptype, event, plen, subevent, num_reports = _EVENT_HEADER.unpack_from(buf)
+
+    if event != LE_META_EVENT or subevent != EVT_LE_ADVERTISING_REPORT:
+        return beacons
+
+    offset = _EVENT_HEADER_SIZE
+
+    for i in range(num_reports):
+        data_length_offset = offset + _REPORT_HEADER_SIZE
+
+        if data_length_offset >= end:
+            break
+
+        data_start = data_length_offset + 1
+        data_end = data_start + buf[data_length_offset]
+
+        # the rssi byte follows the data
+        if data_end >= end:
+            break
+
+        ad_offset = _find_ibeacon(buf, data_start, data_end)
+
+        if ad_offset >= 0:
+            uuid, major, minor, tx_power = _IBEACON.unpack_from(buf, ad_offset + _IBEACON_OFFSET)
+
+            if uuids is None or uuid in uuids:
+                beacons.append(Beacon(uuid, major, minor, tx_power, _RSSI.unpack_from(buf, data_end)[0]))
+
+        offset = data_end + 1
+
+    return beacons
+
+
+def _find_ibeacon(buf, start, end):
+    """
+    Walks the AD structures between start and end.
+    Returns the offset of the iBeacon AD structure, or -1 if there is none.
+    """
+    while start + _IBEACON_SIZE <= end:
+        length, ad_type, prefix = _AD_HEADER.unpack_from(buf, start)
+
+        if length == 0:
+            break
+
+        if length == IBEACON_AD_LENGTH and ad_type == AD_TYPE_MANUFACTURER_SPECIFIC and prefix == IBEACON_PREFIX:
+            return start
+
+        start += length + 1
+
+    return -1
@@ -0,0 +1,97 @@
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+
+
+COLUMNS = (
+    ('timestamp', 'd'),
+    ('beer_temperature', 'f'),
+    ('fridge_temperature', 'f'),
+    ('fridge_setpoint', 'f'),
+    ('state', 'B'),
+    ('relay', 'B'),
+)
+"""Column names and array typecodes of the controller history"""
+
+
+HistoryView = namedtuple('HistoryView', [name for name, typecode in COLUMNS])
+
+
+class History:
+    """
+    Fixed capacity ring buffer of controller history, stored column wise in typed arrays.
+
+    Each column is an array of twice the capacity, and every value is written both at its slot and at its slot
+    plus the capacity. The latest n entries are thereby always contiguous, so queries are memoryview slices
+    which don't copy anything, and the memory used is fixed when the history is created.
+
+    Views returned by last() and since() are live: entries are overwritten as new ones are appended,
+    so copy the view (e.g. with tolist() or numpy.array()) to keep it around.
+    """
+
+    def __init__(self, capacity):
+        """
+        :param capacity: number of entries kept, e.g. 86400 for a day at one entry per second
+        """
+        if capacity < 1:
+            raise ValueError('History capacity must be at least 1')
+
+        self._capacity = capacity
+        self._index = 0
+        self._count = 0
+        self._arrays = tuple(array(typecode, bytes(array(typecode).itemsize * 2 * capacity)) for name, typecode in COLUMNS)
+        self._views = tuple(memoryview(column) for column in self._arrays)
+
+
+    def __len__(self):
+        return self._count
+
+
+    def capacity(self):
+        return self._capacity
+
+
+    def memory_usage(self):
+        """
+        Returns the number of bytes used by the column storage
+        """
+        return sum(column.itemsize * len(column) for column in self._arrays)
+
+
+    def append(self, timestamp, beer_temperature, fridge_temperature, fridge_setpoint, state, relay):
+        """
+        Appends an entry, overwriting the oldest one when full.
+        Temperatures may be None when not available, which is stored as NaN.
+        """
+        index = self._index
+        mirror = index + self._capacity
+        values = (timestamp, _float(beer_temperature), _float(fridge_temperature), _float(fridge_setpoint), state, 1 if relay else 0)
+
+        for column, value in zip(self._arrays, values):
+            column[index] = value
+            column[mirror] = value
+
+        self._index = index + 1 if index + 1 < self._capacity else 0
+        self._count = min(self._count + 1, self._capacity)
+
+
+    def last(self, n):
+        """
+        Returns a HistoryView of memoryviews of the latest n entries, oldest first
+        """
+        n = max(0, min(n, self._count))
+        end = self._index + self._capacity
+        return HistoryView(*(view[end - n:end] for view in self._views))
+
+
+    def since(self, timestamp):
+        """
+        Returns a HistoryView of the entries at or after the given timestamp, oldest first.
+        Found with a binary search, as timestamps are appended in increasing order.
+        """
+        timestamps = self.last(self._count).timestamp
+        return self.last(self._count - bisect_left(timestamps, timestamp))
+
+
+def _float(value):
+    return float('nan') if value is None else value
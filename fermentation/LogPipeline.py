@@ -0,0 +1,119 @@
+import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+LOG_DATE_FORMAT = '%d-%m-%y %H:%M:%S'
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    Queue handler which never blocks the logging thread. Records are dropped when the bounded queue is full,
+    and the number of dropped records is reported with the next record which fits in the queue.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+        self._unreported = 0
+
+
+    def enqueue(self, record):
+        try:
+            if self._unreported:
+                self.queue.put_nowait(self._dropped_record())
+                self._unreported = 0
+
+            self.queue.put_nowait(record)
+
+        except queue.Full:
+            self.dropped += 1
+            self._unreported += 1
+
+
+    def prepare(self, record):
+        # the record is formatted by the listener thread instead of the logging one, which is safe as the queue
+        # doesn't leave the process and records are logged with f-strings rather than mutable arguments
+        return record
+
+
+    def _dropped_record(self):
+        return logging.LogRecord(__name__, logging.WARNING, __file__, 0, f'{self._unreported} log records dropped, queue full',
+                                 None, None)
+
+
+class _Listener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # blocking, as the queue may be full when stopping; the listener thread keeps draining it
+        self.queue.put(self._sentinel)
+
+
+class LogPipeline:
+    """
+    Logging through a bounded queue: loggers only put records on the queue, while a background listener thread
+    formats them and writes them to the console and an optional size rotated log file. Slow SD card writes
+    thereby never block the control loop. Debug records are only logged at loglevel DEBUG.
+    """
+
+    def __init__(self, logpath=None, loglevel=logging.INFO, queue_size=10000, max_bytes=10 * 1024 * 1024, backup_count=5):
+        """
+        :param logpath: log file, rotated when it reaches max_bytes, keeping backup_count old files
+        :param queue_size: maximum number of records waiting to be written
+        """
+        formatter = logging.Formatter(LOG_FORMAT, datefmt=LOG_DATE_FORMAT)
+        handlers = [logging.StreamHandler()]
+
+        if logpath:
+            handlers.append(RotatingFileHandler(logpath, maxBytes=max_bytes, backupCount=backup_count))
+
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        self.handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        self._listener = _Listener(self.handler.queue, *handlers, respect_handler_level=True)
+        self._loglevel = loglevel
+        self._previous = None
+
+
+    def start(self):
+        """
+        Replaces the handlers of the root logger with the queue handler and starts the listener thread
+        """
+        root = logging.getLogger()
+        self._previous = (root.level, root.handlers[:])
+
+        for handler in self._previous[1]:
+            root.removeHandler(handler)
+
+        root.addHandler(self.handler)
+        root.setLevel(self._loglevel)
+        self._listener.start()
+
+
+    def stop(self):
+        """
+        Writes the records still queued, stops the listener thread and restores the root logger
+        """
+        self._listener.stop()
+
+        for handler in self._listener.handlers:
+            handler.close()
+
+        if self._previous:
+            root = logging.getLogger()
+            root.removeHandler(self.handler)
+            root.setLevel(self._previous[0])
+
+            for handler in self._previous[1]:
+                root.addHandler(handler)
+
+            self._previous = None
+
+
+    def dropped(self):
+        """
+        Returns the total number of records dropped because the queue was full
+        """
+        return self.handler.dropped
@@ -1,65 +1,334 @@
 """
 Todo:
     - integrate with tilt device (see: tiltpi implementation)
-    - async implementation using twisted/tornado
     - add web based ui
     - integrate with brewersfriend api
 """
+import asyncio
 import logging
-import time
+import os
 import click
-import RPi.GPIO as GPIO
-from Configuration import import_configuration, default_configuration
+from dataclasses import replace
+from Configuration import import_configuration, default_configuration, ConfigurationError
+from ConfigWatcher import ConfigWatcher
 from TemperatureControl import TemperatureControl
-from Drivers.Factories import relay_factory, temperature_factory, cleanup_drivers
+from TemperatureProfile import TemperatureProfile, SECONDS_PER_DAY, SECONDS_PER_HOUR
+from Sampling import SamplingScheduler
+from ControlScheduler import ControlScheduler
+from History import History
+from LogPipeline import LogPipeline
+from Profiler import Profiler
+from TimeSeries import TimeSeries
+from StateStore import StateStore
+from Drivers.Factories import gpio_factory, relay_factory, temperature_factory, cleanup_drivers
 
 
-def configure_logger(logpath, loglevel=logging.DEBUG):
+CONTROL_PERIOD_SEC = 1.0
+
+SENSORS = {'beer_temperature': 'beer_temp', 'fridge_temperature': 'fridge_temp'}
+"""Sensor fields of a chamber configuration and the names of their drivers"""
+
+SAMPLING_FIELDS = ('offset', 'sample_period', 'max_age')
+"""Sensor configuration fields which are applied to a running sensor, any other change rebuilds the driver"""
+
+
+def configure_logger(logpath, loglevel=logging.INFO):
     """
-    Configure the logging system.
-    If a logpath is provided, entries will also be written to that logfile.
+    Configure the logging system and return the started LogPipeline, which must be stopped at exit.
+    Records are written by a background thread, to the console and, if a logpath is provided, to a size rotated logfile.
     """
-    handlers = [logging.StreamHandler()]
+    log_pipeline = LogPipeline(logpath, loglevel)
+    log_pipeline.start()
+    return log_pipeline
 
-    if logpath:
-        handlers.append(logging.FileHandler(logpath))
 
-    logging.basicConfig(format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
-        datefmt='%d-%m-%y %H:%M:%S', level=loglevel, handlers=handlers)
+logger = logging.getLogger(__name__)
 
 
-logger = logging.getLogger(__name__)
+def add_sampled_sensor(sampler, name, sensor, config):
+    """
+    Adds a temperature sensor to the sampling scheduler using the sample period and max age from its configuration
+    """
+    return sampler.add(sensor, period=config.sample_period, max_age=config.max_age, name=name)
+
+
+def create_profile(config):
+    """
+    Creates the TemperatureProfile of a ProfileConfiguration, or returns None when there is none
+    """
+    if config is None:
+        return None
+
+    segments = [(segment.type, segment.temperature, segment.days * SECONDS_PER_DAY + segment.hours * SECONDS_PER_HOUR)
+                for segment in config.segments]
+    return TemperatureProfile(segments, start=config.start)
+
+
+def create_chamber(config, gpio, sampler, drivers, setpoint=None, storage=None, state_store=None):
+    """
+    Creates the drivers and temperature controller of a single chamber.
+    Drivers are added to the drivers dictionary keyed by '<chamber>.<driver>'.
+    If a storage configuration is given, the history is also stored in a time series in <path>/<chamber>.
+    If a state store is given, the last checkpoint of the chamber is restored, except for an overridden setpoint.
+    An overridden setpoint also replaces the temperature profile of the chamber, if any.
+    """
+    name = config.name
+    drivers[f'{name}.{SENSORS["beer_temperature"]}'] = temperature_factory(config.beer_temperature, gpio)
+    drivers[f'{name}.{SENSORS["fridge_temperature"]}'] = temperature_factory(config.fridge_temperature, gpio)
+    drivers[f'{name}.compressor_relay'] = relay_factory(config.compressor_relay, gpio)
+
+    beer_temp = add_sampled_sensor(sampler, f'{name}.beer_temp', drivers[f'{name}.beer_temp'], config.beer_temperature)
+    fridge_temp = add_sampled_sensor(sampler, f'{name}.fridge_temp', drivers[f'{name}.fridge_temp'], config.fridge_temperature)
+
+    history = History(capacity=config.history_capacity)
+    timeseries = None
+
+    if storage:
+        timeseries = TimeSeries(os.path.join(storage.path, name), batch_size=storage.batch_size,
+                                flush_interval=storage.flush_interval)
+
+    temp_control = TemperatureControl(fridge_temp, beer_temp, drivers[f'{name}.compressor_relay'], name=name,
+                                      history=history, timeseries=timeseries, state_store=state_store)
+    temp_control.set_temperature_setpoint(config.setpoint, configured=True)
+    temp_control.set_temperature_hysteresis(config.hysteresis)
+
+    if config.profile is not None and setpoint is None:
+        temp_control.set_temperature_profile(create_profile(config.profile))
+
+    temp_control.restore()
+
+    if setpoint is not None:
+        temp_control.set_temperature_setpoint(setpoint)
+
+    return temp_control
+
+
+def apply_configuration(current, new, controllers, drivers, sampler, gpio):
+    """
+    Applies the differences between the current and a new configuration to the running chambers, and returns
+    the new configuration. Setpoints, hysteresis and sensor offsets and sample rates are changed in place, while
+    sensors and relays are only rebuilt when their hardware settings changed. Changes to the GPIO backend,
+    storage, state store or the set of chambers only take effect after a restart.
+    """
+    for key in ('gpio', 'storage', 'state'):
+        if getattr(current, key) != getattr(new, key):
+            logger.warning(f'{key} configuration changed, restart to apply')
+
+    current_chambers = {chamber.name: chamber for chamber in current.chambers}
+    new_chambers = {chamber.name: chamber for chamber in new.chambers}
+
+    for name in sorted(current_chambers.keys() ^ new_chambers.keys()):
+        logger.warning(f'chamber {name} {"added" if name in new_chambers else "removed"}, restart to apply')
+
+    changed = [(current_chambers[name], chamber) for name, chamber in new_chambers.items()
+               if name in current_chambers and chamber != current_chambers[name]]
+    rebuilt = dict()
+
+    # drivers are created before any chamber is changed, so a driver failing to create leaves them all as they were
+    try:
+        for current_chamber, new_chamber in changed:
+            rebuilt.update(create_changed_drivers(current_chamber, new_chamber, drivers, gpio))
+
+    except Exception:
+        # relays are left alone, as they may drive the pin of a running relay
+        for driver in rebuilt.values():
+            if hasattr(driver, 'destroy'):
+                driver.destroy()
+
+        raise
+
+    for current_chamber, new_chamber in changed:
+        apply_chamber_configuration(current_chamber, new_chamber, controllers[new_chamber.name], drivers, rebuilt,
+                                    sampler)
+
+    return new
+
+
+def create_changed_drivers(current, new, drivers, gpio):
+    """
+    Creates the drivers of a chamber which need to be rebuilt for its new configuration, and returns them by name.
+    Sensors are rebuilt when a setting other than their offset and sample rate changed, or when their offset
+    changed and they can't set it. Relays are rebuilt when any of their settings changed, in the output state of
+    the running relay, so the compressor isn't switched when the relay stays on the same pin.
+    """
+    rebuilt = dict()
+
+    for key, driver_name in SENSORS.items():
+        current_sensor, new_sensor = getattr(current, key), getattr(new, key)
+        driver_name = f'{new.name}.{driver_name}'
+
+        # drivers without an offset setter only take it when created
+        if (_without_sampling(current_sensor) != _without_sampling(new_sensor)
+                or current_sensor.offset != new_sensor.offset and not hasattr(drivers[driver_name], 'offset')):
+            rebuilt[driver_name] = temperature_factory(new_sensor, gpio)
+
+    if current.compressor_relay != new.compressor_relay:
+        state = drivers[f'{new.name}.compressor_relay'].state()
+        rebuilt[f'{new.name}.compressor_relay'] = relay_factory(new.compressor_relay, gpio, initial_state=bool(state))
+
+    return rebuilt
+
+
+def apply_chamber_configuration(current, new, temp_control, drivers, rebuilt, sampler):
+    """
+    Applies the differences between the current and new configuration of a running chamber, replacing its drivers
+    by those rebuilt for the new configuration. Replaced sensors are destroyed, e.g. closing their SPI transport.
+    """
+    name = new.name
+
+    if current.setpoint != new.setpoint:
+        temp_control.set_temperature_setpoint(new.setpoint, configured=True)
+
+    if current.hysteresis != new.hysteresis:
+        temp_control.set_temperature_hysteresis(new.hysteresis)
+
+    if current.profile != new.profile:
+        temp_control.set_temperature_profile(create_profile(new.profile))
+
+        # without profile the configured setpoint applies again
+        if new.profile is None:
+            temp_control.set_temperature_setpoint(new.setpoint, configured=True)
+
+    if current.history_capacity != new.history_capacity:
+        logger.warning(f'{name} history capacity changed, restart to apply')
+
+    for key, driver_name in SENSORS.items():
+        current_sensor, new_sensor = getattr(current, key), getattr(new, key)
+
+        if current_sensor == new_sensor:
+            continue
+
+        driver_name = f'{name}.{driver_name}'
+        sampled = sampler.find(driver_name)
+
+        if driver_name in rebuilt:
+            old = drivers[driver_name]
+            drivers[driver_name] = sampled.sensor = rebuilt[driver_name]
+            cleanup_drivers({driver_name: old})
+            logger.info(f'{driver_name} rebuilt')
+
+        elif current_sensor.offset != new_sensor.offset:
+            drivers[driver_name].offset(new_sensor.offset)
+            logger.info(f'{driver_name} offset changed to {new_sensor.offset}')
+
+        sampled.period = new_sensor.sample_period
+        sampled.max_age = new_sensor.max_age
+
+    if f'{name}.compressor_relay' in rebuilt:
+        relay = rebuilt[f'{name}.compressor_relay']
+        # a relay on the same pin already drives the output, the old one must not switch it off
+        same_pin = getattr(current.compressor_relay, 'pin', None) == getattr(new.compressor_relay, 'pin', None)
+        temp_control.replace_compressor_relay(relay, switch_off=not same_pin)
+        drivers[f'{name}.compressor_relay'] = relay
+
+
+def reload_configuration(configpath, current, controllers, drivers, sampler, gpio):
+    """
+    Loads the configuration file and applies it to the running chambers. Returns the configuration in effect,
+    which is the current one when the file is invalid.
+    """
+    try:
+        new = import_configuration(configpath)
+
+    except (OSError, ConfigurationError) as e:
+        logger.error(f'configuration not reloaded, {e}')
+        return current
+
+    logger.info(f'configuration {configpath} changed, applying')
+    return apply_configuration(current, new, controllers, drivers, sampler, gpio)
+
+
+def _without_sampling(sensor):
+    return replace(sensor, **{name: None for name in SAMPLING_FIELDS})
+
+
+def control_loop(controllers):
+    """
+    Runs the control loop of every chamber
+    """
+    for temp_control in controllers.values():
+        temp_control.control_loop()
+
+
+def close_timeseries(controllers):
+    """
+    Flushes and closes the time series of every chamber
+    """
+    for temp_control in controllers.values():
+        if temp_control.timeseries() is not None:
+            temp_control.timeseries().close()
+
+
+def checkpoint(controllers):
+    """
+    Checkpoints every chamber, recording when the relays were switched off at shutdown
+    """
+    for temp_control in controllers.values():
+        temp_control.checkpoint()
 
 
 @click.command()
 @click.option('--configpath', type=click.Path(), help='configuration file location')
 @click.option('--logpath', type=click.Path(), help='log output file location')
-@click.option('--setpoint', default=18.0, show_default=True, help='temperature setpoint in °C')
-def main(configpath, logpath, setpoint):
+@click.option('--loglevel', type=click.Choice(['debug', 'info', 'warning', 'error'], case_sensitive=False),
+              default='info', help='lowest level logged, debug includes every control loop tick')
+@click.option('--setpoint', type=float, help='temperature setpoint in °C, overrides the setpoints of all chambers')
+@click.option('--metrics-port', type=int, help='serve prometheus metrics on this local port')
+@click.option('--profile', type=click.Path(file_okay=False),
+              help='profile into this directory, writing collapsed stacks for flamegraphs, toggled with SIGUSR1')
+def main(configpath, logpath, loglevel, setpoint, metrics_port, profile):
     """
     _tbd_
     """
-    configure_logger(logpath)
+    log_pipeline = configure_logger(logpath, getattr(logging, loglevel.upper()))
     logger.info('starting application')
+    drivers = dict()
+    controllers = dict()
+    sampler = SamplingScheduler()
+    gpio = None
+    metrics_server = None
+    profiler = None
 
     try:
-        GPIO.setwarnings(False)
-        GPIO.setmode(GPIO.BCM)
+        if metrics_port:
+            # imported here as http.server is slow to import, and only needed when serving metrics
+            from MetricsServer import MetricsServer
+            metrics_server = MetricsServer(metrics_port)
+            metrics_server.start()
 
         config = import_configuration(configpath) if configpath else default_configuration()
 
-        drivers = dict()
-        drivers['beer_temp'] = temperature_factory(config['beer_temperature'])
-        drivers['fridge_temp'] = temperature_factory(config['fridge_temperature'])
-        drivers['compressor_relay'] = relay_factory(config['compressor_relay'])
+        # all chambers share the GPIO backend, the sampler, the control scheduler and the bluetooth scanner
+        gpio = gpio_factory(config.gpio)
+        state_store = StateStore(config.state.path) if config.state else None
 
-        temp_control = TemperatureControl(drivers['fridge_temp'], drivers['beer_temp'], drivers['compressor_relay'])
-        temp_control.set_temperature_setpoint(setpoint)
-        temp_control.start()
+        # chamber names are unique, as checked when compiling the configuration
+        for chamber in config.chambers:
+            controllers[chamber.name] = create_chamber(chamber, gpio, sampler, drivers, setpoint, config.storage,
+                                                       state_store)
+
+        for temp_control in controllers.values():
+            temp_control.start()
+
+        logger.info(f'controlling {len(controllers)} chambers: {", ".join(controllers)}')
+
+        if profile:
+            profiler = Profiler(profile, controllers.values())
+            profiler.install_signal_handler()
+            profiler.start()
+
+        tasks = []
+
+        if configpath:
+            def reload():
+                nonlocal config
+                config = reload_configuration(configpath, config, controllers, drivers, sampler, gpio)
 
-        while True:
-            time.sleep(1.0)
-            temp_control.control_loop()
+            tasks.append(ConfigWatcher(configpath, reload).run)
+
+        scheduler = ControlScheduler(lambda: control_loop(controllers), period=CONTROL_PERIOD_SEC, sampler=sampler,
+                                     tasks=tasks)
+        asyncio.run(scheduler.run())
 
     except KeyboardInterrupt:
         logger.warning('CTRL+C detected, stopping')
@@ -67,8 +336,23 @@ def main(configpath, logpath, setpoint):
     except Exception:
         logger.error('Exception occured', exc_info=True)
 
+    if profiler and profiler.running():
+        profiler.stop()
+
+    if metrics_server:
+        metrics_server.stop()
+
+    close_timeseries(controllers)
     cleanup_drivers(drivers)
-    GPIO.cleanup()
+    checkpoint(controllers)
+
+    if gpio is not None:
+        gpio.cleanup()
+
+    if log_pipeline.dropped():
+        logger.warning(f'{log_pipeline.dropped()} log records were dropped')
+
+    log_pipeline.stop()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,68 @@
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from Drivers.Metrics import registry as default_registry
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+logger = logging.getLogger(__name__)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        logger.debug(f'{self.address_string()} {format % args}')
+
+
+class MetricsServer:
+    """
+    Small HTTP server exposing the metrics registry on /metrics in the Prometheus text format.
+    Requests are served from a daemon thread, so rendering never runs on the control loop.
+    Binds to localhost by default, use host='' to serve on all interfaces.
+    """
+
+    def __init__(self, port=9100, host='127.0.0.1', registry=None):
+        self._address = (host, port)
+        self._registry = registry if registry is not None else default_registry
+        self._server = None
+        self._thread = None
+
+
+    def start(self):
+        self._server = ThreadingHTTPServer(self._address, _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.registry = self._registry
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        logger.info(f'serving metrics on http://{self._address[0] or "0.0.0.0"}:{self.port()}/metrics')
+
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join(timeout=10)
+            self._server = None
+            self._thread = None
+
+
+    def port(self):
+        """
+        Returns the port listened on, which is only known after start() when created with port 0
+        """
+        return self._server.server_address[1] if self._server else self._address[1]
@@ -0,0 +1,217 @@
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from Drivers.Metrics import registry
+
+
+PHASES = ('read', 'setpoint', 'update', 'history', 'logging')
+"""Phases of the control loop timed by PhaseTimer"""
+
+
+logger = logging.getLogger(__name__)
+
+
+class PhaseTimer:
+    """
+    Times consecutive phases of a loop: start() marks the beginning of the loop, and lap(phase) records the time
+    since the previous mark in a control_loop_phase_seconds histogram of that phase.
+    The summary only covers the laps recorded by this timer.
+    """
+
+    def __init__(self, name=None):
+        self._histograms = {phase: registry.histogram('control_loop_phase_seconds', 'Duration of the phases of the control loop',
+                                                      chamber=name or '', phase=phase) for phase in PHASES}
+        self._baseline = {phase: (histogram.count(), histogram.sum) for phase, histogram in self._histograms.items()}
+        self._last = 0.0
+
+
+    def start(self):
+        self._last = time.perf_counter()
+
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self._histograms[phase].observe(now - self._last)
+        self._last = now
+
+
+    def summary(self):
+        """
+        Returns a dictionary of phase to (number of laps, mean duration in seconds)
+        """
+        summary = dict()
+
+        for phase, histogram in self._histograms.items():
+            count = histogram.count() - self._baseline[phase][0]
+            total = histogram.sum - self._baseline[phase][1]
+            summary[phase] = (count, total / count if count else 0.0)
+
+        return summary
+
+
+class NullPhaseTimer:
+    """
+    PhaseTimer standing in while phase timing is disabled, so the timed loop doesn't check whether it is enabled
+    """
+
+    def start(self):
+        pass
+
+
+    def lap(self, phase):
+        pass
+
+
+    def summary(self):
+        return dict()
+
+
+NULL_PHASE_TIMER = NullPhaseTimer()
+
+
+class StackSampler:
+    """
+    Statistical profiler sampling the stacks of all threads on SIGPROF, which the kernel sends every interval
+    seconds of CPU time used by the process. Nothing is traced between samples, so the overhead is the cost of
+    walking the stacks a few hundred times per CPU second, and zero while the process is idle.
+
+    Stacks are counted in the collapsed format used by flamegraph.pl and speedscope: frames from the thread
+    name down to the innermost function, separated by semicolons. Threads waiting while another one uses the CPU
+    are sampled in their wait function, e.g. select, so compare the flames of a thread rather than across threads.
+
+    Signal handlers run in the main thread, so the sampler can only be started and stopped from the main thread.
+    """
+
+    def __init__(self, interval=0.005):
+        self._interval = interval
+        self._labels = dict()
+        self._previous_handler = None
+        self.stacks = Counter()
+        self.samples = 0
+
+
+    def start(self):
+        self.stacks = Counter()
+        self.samples = 0
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self._interval, self._interval)
+
+
+    def stop(self):
+        """
+        Stops sampling and returns the stack counts
+        """
+        signal.setitimer(signal.ITIMER_PROF, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        return self.stacks
+
+
+    def write_collapsed(self, path):
+        """
+        Writes the stack counts in the collapsed stack format, one 'frame;frame;frame count' line per stack
+        """
+        with open(path, 'w') as collapsed:
+            for stack, count in sorted(self.stacks.items()):
+                collapsed.write(f'{stack} {count}\n')
+
+
+    def _sample(self, signum, frame):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        main = threading.main_thread().ident
+
+        for ident, thread_frame in sys._current_frames().items():
+            # the main thread is running this handler, sample the frame it interrupted instead
+            stack = self._stack(frame if ident == main else thread_frame)
+            stack.append(names.get(ident, str(ident)))
+            self.stacks[';'.join(reversed(stack))] += 1
+
+        self.samples += 1
+
+
+    def _stack(self, frame):
+        labels = self._labels
+        stack = []
+
+        while frame is not None:
+            code = frame.f_code
+            label = labels.get(code)
+
+            if label is None:
+                label = labels[code] = f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+            stack.append(label)
+            frame = frame.f_back
+
+        return stack
+
+
+class Profiler:
+    """
+    Profiling mode of the application: samples the stacks of the process with a StackSampler and times the phases
+    of the control loops of the given controllers. Each profiling session is written to a collapsed stack file
+    in the output directory when stopped, and the mean phase durations are logged.
+
+    Sessions can be toggled at runtime with a signal, SIGUSR1 by default, e.g. kill -USR1 <pid>.
+    """
+
+    def __init__(self, directory, controllers, interval=0.005):
+        """
+        :param controllers: TemperatureControl instances to time the control loop phases of
+        :param interval: seconds of CPU time between stack samples
+        """
+        self._directory = directory
+        self._controllers = list(controllers)
+        self._sampler = StackSampler(interval)
+        self._running = False
+
+
+    def running(self):
+        return self._running
+
+
+    def start(self):
+        os.makedirs(self._directory, exist_ok=True)
+
+        for temp_control in self._controllers:
+            temp_control.profile_phases(True)
+
+        self._sampler.start()
+        self._running = True
+        logger.info(f'profiling started, writing to {self._directory}')
+
+
+    def stop(self):
+        """
+        Stops the session and returns the path of the collapsed stack file written
+        """
+        self._sampler.stop()
+        self._running = False
+        path = os.path.join(self._directory, f'profile-{time.strftime("%Y%m%d-%H%M%S")}.collapsed')
+        self._sampler.write_collapsed(path)
+        logger.info(f'profiling stopped, {self._sampler.samples} samples written to {path}')
+
+        for temp_control in self._controllers:
+            phases = ', '.join(f'{phase} {mean * 1e6:.0f}us' for phase, (count, mean) in temp_control.phase_summary().items())
+            logger.info(f'{temp_control.name or "control"} loop phases: {phases}')
+            temp_control.profile_phases(False)
+
+        return path
+
+
+    def toggle(self):
+        if self._running:
+            self.stop()
+
+        else:
+            self.start()
+
+
+    def install_signal_handler(self, signum=signal.SIGUSR1):
+        """
+        Toggles profiling whenever signum is received
+        """
+        signal.signal(signum, lambda signum, frame: self.toggle())
@@ -0,0 +1,202 @@
+import asyncio
+import heapq
+import logging
+from threading import Lock
+from Drivers.Reading import Reading
+from Drivers.Clock import system_clock
+
+
+logger = logging.getLogger(__name__)
+
+
+class Sample:
+    """
+    A temperature reading together with its age and whether it is considered stale.
+    """
+
+    __slots__ = ('value', 'timestamp', 'age', 'stale')
+
+    def __init__(self, value, timestamp, age, stale):
+        self.value = value
+        self.timestamp = timestamp
+        self.age = age
+        self.stale = stale
+
+
+class SampledSensor:
+    """
+    Wraps a temperature sensor, which is sampled at its own rate by a SamplingScheduler.
+    Reading the temperature returns the cached value and never blocks on I/O.
+    """
+
+    def __init__(self, sensor, period, max_age, name=None, clock=None):
+        """
+        :param sensor: sensor providing temperature()
+        :param period: sample period in seconds
+        :param max_age: age in seconds after which the cached value is considered stale
+        :param clock: clock to age readings by, defaults to the system clock
+        """
+        self._clock = clock if clock is not None else system_clock
+        self.sensor = sensor
+        self.period = period
+        self.max_age = max_age
+        self.name = name or type(sensor).__name__
+        self._reading = Reading(None)
+
+
+    def temperature(self):
+        """
+        Returns the latest sampled temperature
+        """
+        return self._reading.value
+
+
+    def reading(self):
+        """
+        Returns the latest sampled Reading
+        """
+        return self._reading
+
+
+    def sample(self):
+        """
+        Returns the latest sampled temperature with its age and staleness
+        """
+        reading = self._reading
+        age = reading.age(self._clock.monotonic())
+        return Sample(reading.value, reading.timestamp, age, age > self.max_age)
+
+
+    def update(self):
+        """
+        Reads the sensor and caches its reading. Failed reads are logged and leave the cached reading untouched.
+        Drivers publishing Readings are asked for their latest one, so the age is that of the data rather than
+        of the sample, e.g. when a Tilt stops sending beacons.
+        """
+        try:
+            value = self.sensor.temperature()
+
+        except Exception:
+            logger.warning(f"{self.name} sample failed", exc_info=True)
+            return
+
+        if hasattr(self.sensor, 'reading'):
+            self._reading = self.sensor.reading()
+
+        else:
+            self._reading = Reading(value, timestamp=self._clock.monotonic(), sequence=self._reading.sequence + 1)
+
+
+def read_sample(sensor, clock=None):
+    """
+    Returns a Sample from any sensor. Sampled sensors return their cached sample, other sensors are read directly.
+    """
+    if isinstance(sensor, SampledSensor):
+        return sensor.sample()
+
+    return Sample(sensor.temperature(), (clock if clock is not None else system_clock).monotonic(), 0.0, False)
+
+
+class SamplingScheduler:
+    """
+    Samples any number of sensors, each at its own rate, keeping slow sensor reads off the control path.
+    While running, run_async() samples them on the control loop's event loop, and run_pending() samples
+    those which are due one step at a time, e.g. in the simulator.
+    """
+
+    def __init__(self, clock=None):
+        """
+        :param clock: clock to schedule samples by, defaults to the system clock
+        """
+        self._clock = clock if clock is not None else system_clock
+        self._queue = []
+        self._lock = Lock()
+        self._counter = 0
+
+
+    def add(self, sensor, period, max_age, name=None):
+        """
+        Adds a sensor to be sampled every period seconds. The sensor is sampled once right away, so a value
+        is available when this returns. Returns the SampledSensor to read the cached values from.
+        """
+        sampled = SampledSensor(sensor, period, max_age, name, self._clock)
+        sampled.update()
+
+        with self._lock:
+            self._counter += 1
+            heapq.heappush(self._queue, (self._clock.monotonic() + period, self._counter, sampled))
+
+        logger.info(f"sampling {sampled.name} every {period}s")
+        return sampled
+
+
+    def find(self, name):
+        """
+        Returns the SampledSensor with the given name, or None
+        """
+        with self._lock:
+            for next_due, counter, sampled in self._queue:
+                if sampled.name == name:
+                    return sampled
+
+        return None
+
+
+    def run_pending(self, now=None):
+        """
+        Samples every sensor which is due. Returns the time until the next sensor is due, or None if there are no sensors.
+        """
+        due, delay = self._pop_due(now)
+
+        for sampled in due:
+            sampled.update()
+
+        return delay
+
+
+    async def run_async(self, idle_delay=1.0):
+        """
+        Samples the sensors from an asyncio event loop.
+        Each read runs in the loop's default executor, so sensors are read concurrently and a slow sensor
+        doesn't delay the others. A sensor still being read when it is due again skips that sample.
+        Runs until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        reading = set()
+
+        while True:
+            due, delay = self._pop_due()
+
+            for sampled in due:
+                if sampled in reading:
+                    if logger.isEnabledFor(logging.DEBUG):
+                        logger.debug(f"{sampled.name} still being read, sample skipped")
+                    continue
+
+                reading.add(sampled)
+                future = loop.run_in_executor(None, sampled.update)
+                future.add_done_callback(lambda future, sampled=sampled: reading.discard(sampled))
+
+            await asyncio.sleep(delay if delay is not None else idle_delay)
+
+
+    def _pop_due(self, now=None):
+        """
+        Reschedules the sensors which are due and returns them, along with the time until the next sensor is due
+        """
+        now = self._clock.monotonic() if now is None else now
+        due = []
+
+        with self._lock:
+            while self._queue:
+                next_due, counter, sampled = self._queue[0]
+
+                if next_due > now:
+                    return due, next_due - now
+
+                # schedule on a fixed grid, skipping samples which were missed
+                next_due += sampled.period * max(1, int((now - next_due) // sampled.period) + 1)
+                heapq.heapreplace(self._queue, (next_due, counter, sampled))
+                due.append(sampled)
+
+        return due, None
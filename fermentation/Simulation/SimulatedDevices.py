@@ -0,0 +1,119 @@
+import random
+from Drivers.Reading import Reading
+
+
+class SimulatedSensor:
+    """
+    Temperature sensor reading the air or beer temperature of a ThermalModel, e.g. standing in for a MAX31865.
+    Readings are quantized to the given resolution, with optional gaussian noise.
+    """
+
+    def __init__(self, model, attribute, clock, resolution=0.03125, noise=0.0, offset=0.0, seed=None):
+        """
+        :param attribute: 'air_temperature' or 'beer_temperature'
+        """
+        self._model = model
+        self._attribute = attribute
+        self._clock = clock
+        self._resolution = resolution
+        self._noise = noise
+        self._offset = offset
+        self._random = random.Random(seed)
+        self._reading = Reading(None)
+
+
+    def temperature(self):
+        temperature = getattr(self._model, self._attribute) + self._offset
+
+        if self._noise:
+            temperature += self._random.gauss(0.0, self._noise)
+
+        if self._resolution:
+            temperature = round(temperature / self._resolution) * self._resolution
+
+        self._reading = Reading(temperature, timestamp=self._clock.monotonic(), sequence=self._reading.sequence + 1)
+        return temperature
+
+
+    def reading(self):
+        return self._reading
+
+
+class SimulatedTilt:
+    """
+    Tilt hydrometer floating in the beer of a ThermalModel.
+    Like the real device it reports whole degrees fahrenheit and only sends a beacon every interval seconds.
+    """
+
+    def __init__(self, model, clock, interval=30.0, gravity=1050):
+        self._model = model
+        self._clock = clock
+        self._interval = interval
+        self._gravity = gravity
+        self._reading = Reading(0.0, gravity=0.0)
+        self._next_beacon = clock.monotonic()
+
+
+    def temperature(self):
+        return self.reading().value
+
+
+    def gravity(self):
+        return self.reading().gravity
+
+
+    def reading(self):
+        now = self._clock.monotonic()
+
+        if now >= self._next_beacon:
+            fahrenheit = round(self._model.beer_temperature * 1.8 + 32.0)
+            celsius = round((fahrenheit - 32.0) / 1.8, ndigits=2)
+            self._reading = Reading(celsius, gravity=self._gravity, timestamp=now, sequence=self._reading.sequence + 1)
+            self._next_beacon += self._interval * max(1, int((now - self._next_beacon) // self._interval) + 1)
+
+        return self._reading
+
+
+class SimulatedRelay:
+    """
+    Relay with the SolidStateRelay interface, timed by the simulation clock
+    """
+
+    def __init__(self, clock, initial_state=False):
+        self._clock = clock
+        self._state = initial_state
+        self._timestamp = clock.monotonic()
+        self.switch_count = 0
+
+
+    def on(self):
+        self.set_state(True)
+
+
+    def off(self):
+        self.set_state(False)
+
+
+    def set_state(self, state):
+        if state and not self._state:
+            self.switch_count += 1
+
+        self._state = state
+        self._timestamp = self._clock.monotonic()
+
+
+    def state(self):
+        return self._state
+
+
+    def toggle(self):
+        self.set_state(not self._state)
+
+
+    def restore(self, state, elapsed):
+        self.set_state(state)
+        self._timestamp = self._clock.monotonic() - elapsed
+
+
+    def elapsed_time(self):
+        return self._clock.monotonic() - self._timestamp
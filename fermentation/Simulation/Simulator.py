@@ -0,0 +1,147 @@
+import logging
+from Drivers.Clock import SimulatedClock
+from Sampling import SamplingScheduler
+from TemperatureControl import TemperatureControl
+from Simulation.ThermalModel import ThermalModel
+from Simulation.SimulatedDevices import SimulatedSensor, SimulatedTilt, SimulatedRelay
+
+
+logger = logging.getLogger(__name__)
+
+
+class SimulationReport:
+    """
+    Summary of how well the beer temperature tracked the setpoint during a simulation.
+    Overshoot and undershoot are only counted once the beer has reached the band around the current setpoint,
+    so the initial pull down after a setpoint change doesn't count as overshoot.
+    """
+
+    def __init__(self, band):
+        self.band = band
+        self.duration = 0.0
+        self.overshoot = 0.0
+        self.undershoot = 0.0
+        self.time_in_band = 0.0
+        self.compressor_on_time = 0.0
+        self.compressor_cycles = 0
+        self.min_beer_temperature = float('inf')
+        self.max_beer_temperature = float('-inf')
+        self._absolute_error = 0.0
+        self._setpoint = None
+        self._settled = False
+
+
+    def record(self, dt, setpoint, beer_temperature, compressor_on):
+        error = beer_temperature - setpoint
+        self.duration += dt
+
+        if setpoint != self._setpoint:
+            self._setpoint = setpoint
+            self._settled = False
+
+        self._settled = self._settled or abs(error) <= self.band
+
+        if self._settled:
+            self.overshoot = max(self.overshoot, error)
+            self.undershoot = max(self.undershoot, -error)
+
+        self.min_beer_temperature = min(self.min_beer_temperature, beer_temperature)
+        self.max_beer_temperature = max(self.max_beer_temperature, beer_temperature)
+        self._absolute_error += abs(error) * dt
+
+        if abs(error) <= self.band:
+            self.time_in_band += dt
+
+        if compressor_on:
+            self.compressor_on_time += dt
+
+
+    def time_in_band_ratio(self):
+        return self.time_in_band / self.duration if self.duration else 0.0
+
+
+    def compressor_duty(self):
+        return self.compressor_on_time / self.duration if self.duration else 0.0
+
+
+    def mean_absolute_error(self):
+        return self._absolute_error / self.duration if self.duration else 0.0
+
+
+    def __str__(self):
+        return '\n'.join([
+            f'simulated time:      {self.duration / 86400:.2f} days',
+            f'beer temperature:    {self.min_beer_temperature:.2f}°C - {self.max_beer_temperature:.2f}°C',
+            f'overshoot:           {self.overshoot:.2f}°C above, {self.undershoot:.2f}°C below setpoint',
+            f'mean absolute error: {self.mean_absolute_error():.2f}°C',
+            f'time in band:        {self.time_in_band_ratio() * 100:.1f}% within ±{self.band:.2f}°C',
+            f'compressor:          {self.compressor_cycles} cycles, {self.compressor_duty() * 100:.1f}% duty',
+        ])
+
+
+class Simulator:
+    """
+    Runs TemperatureControl against a ThermalModel on a simulated clock, with a simulated MAX31865 in the fridge
+    air, a simulated Tilt in the beer and a simulated compressor relay. Sensors are sampled through the
+    SamplingScheduler like on the real system.
+    """
+
+    def __init__(self, model=None, setpoints=((0.0, 18.0),), control_period=10.0, hysteresis=0.5, band=0.5,
+                 fridge_sample_period=10.0, beer_sample_period=30.0, sensor_noise=0.0, seed=None):
+        """
+        :param setpoints: (time in seconds, setpoint) steps, sorted by time
+        :param control_period: simulated seconds between control loop ticks
+        :param band: distance from the setpoint in celsius counting as in band in the report
+        """
+        self.clock = SimulatedClock()
+        self.model = model if model is not None else ThermalModel()
+        self.relay = SimulatedRelay(self.clock)
+        self._setpoints = list(setpoints)
+        self._control_period = control_period
+        self._band = band
+
+        self.sampler = SamplingScheduler(clock=self.clock)
+        fridge_sensor = SimulatedSensor(self.model, 'air_temperature', self.clock, noise=sensor_noise, seed=seed)
+        beer_sensor = SimulatedTilt(self.model, self.clock)
+        fridge_temp = self.sampler.add(fridge_sensor, period=fridge_sample_period, max_age=10 * fridge_sample_period, name='fridge_temp')
+        beer_temp = self.sampler.add(beer_sensor, period=beer_sample_period, max_age=10 * beer_sample_period, name='beer_temp')
+
+        self.controller = TemperatureControl(fridge_temp, beer_temp, self.relay, name='simulation', clock=self.clock)
+        self.controller.set_temperature_hysteresis(hysteresis)
+
+
+    def run(self, duration):
+        """
+        Runs the simulation for duration simulated seconds and returns a SimulationReport
+        """
+        report = SimulationReport(self._band)
+        setpoints = self._setpoints
+        next_setpoint = 0
+        setpoint = None
+        start = self.clock.monotonic()
+        start_cycles = self.relay.switch_count
+        period = self._control_period
+
+        self.controller.start()
+
+        for tick in range(int(duration // period)):
+            elapsed = tick * period
+
+            while next_setpoint < len(setpoints) and setpoints[next_setpoint][0] <= elapsed:
+                setpoint = setpoints[next_setpoint][1]
+                self.controller.set_temperature_setpoint(setpoint)
+                next_setpoint += 1
+
+            self.sampler.run_pending()
+            self.controller.control_loop()
+
+            compressor_on = self.relay.state()
+            self.model.step(period, compressor_on)
+            self.clock.advance(period)
+            report.record(period, setpoint if setpoint is not None else self.controller.setpoint(),
+                          self.model.beer_temperature, compressor_on)
+
+        self.controller.stop()
+        report.compressor_cycles = self.relay.switch_count - start_cycles
+        logger.info(f'simulated {(self.clock.monotonic() - start) / 86400:.2f} days')
+        return report
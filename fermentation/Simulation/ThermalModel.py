@@ -0,0 +1,85 @@
+class ThermalModel:
+    """
+    Lumped capacitance thermal model of a fermentation chamber.
+
+    The fridge air (including shelves and walls) and the beer are each modelled as a single heat capacity.
+    Heat flows between air and beer through the fermenter wall, between air and ambient through the fridge
+    insulation, and is removed from the air by the compressor when it runs. Fermentation adds heat to the beer.
+
+        C_air  dT_air/dt  = UA_ambient (T_ambient - T_air) + UA_beer (T_beer - T_air) - P_compressor
+        C_beer dT_beer/dt = UA_beer (T_air - T_beer) + P_fermentation
+
+    Defaults roughly match 20 litres of beer in a household fridge.
+    """
+
+    def __init__(self, air_temperature=20.0, beer_temperature=20.0, ambient_temperature=22.0,
+                 air_capacity=8000.0, beer_capacity=83700.0, ambient_conductance=1.5, beer_conductance=5.0,
+                 compressor_power=80.0, fermentation_power=None):
+        """
+        :param air_capacity: heat capacity of the fridge air in J/K
+        :param beer_capacity: heat capacity of the beer in J/K
+        :param ambient_conductance: conductance between fridge air and ambient in W/K
+        :param beer_conductance: conductance between fridge air and beer in W/K
+        :param compressor_power: heat removed while the compressor runs in W
+        :param fermentation_power: heat produced by the fermentation in W, either a constant or a function of
+                                   the time in seconds since the start of the simulation
+        """
+        self.air_temperature = air_temperature
+        self.beer_temperature = beer_temperature
+        self.ambient_temperature = ambient_temperature
+        self.air_capacity = air_capacity
+        self.beer_capacity = beer_capacity
+        self.ambient_conductance = ambient_conductance
+        self.beer_conductance = beer_conductance
+        self.compressor_power = compressor_power
+        self.fermentation_power = fermentation_power
+        self.elapsed = 0.0
+
+
+    def step(self, dt, compressor_on, max_step=10.0):
+        """
+        Advances the model dt seconds with the compressor on or off.
+        Integrated with explicit Euler in steps of at most max_step seconds, far below the time constants of the model.
+        """
+        remaining = dt
+
+        while remaining > 0.0:
+            h = min(remaining, max_step)
+            flow = self.beer_conductance * (self.beer_temperature - self.air_temperature)
+            air_power = self.ambient_conductance * (self.ambient_temperature - self.air_temperature) + flow
+            beer_power = self._fermentation_power() - flow
+
+            if compressor_on:
+                air_power -= self.compressor_power
+
+            self.air_temperature += air_power * h / self.air_capacity
+            self.beer_temperature += beer_power * h / self.beer_capacity
+            self.elapsed += h
+            remaining -= h
+
+
+    def _fermentation_power(self):
+        if self.fermentation_power is None:
+            return 0.0
+
+        if callable(self.fermentation_power):
+            return self.fermentation_power(self.elapsed)
+
+        return self.fermentation_power
+
+
+def fermentation_curve(peak_power=15.0, peak_time=2 * 86400.0, duration=7 * 86400.0):
+    """
+    Returns a fermentation heat function rising linearly to peak_power at peak_time and falling back to zero
+    at duration seconds, for use as ThermalModel fermentation_power.
+    """
+    def power(elapsed):
+        if elapsed <= 0.0 or elapsed >= duration:
+            return 0.0
+
+        if elapsed <= peak_time:
+            return peak_power * elapsed / peak_time
+
+        return peak_power * (duration - elapsed) / (duration - peak_time)
+
+    return power
@@ -0,0 +1,35 @@
+"""
+Runs a simulated fermentation through TemperatureControl faster than real time and prints a report.
+
+Usage, from the fermentation directory: python -m Simulation --days 14 --setpoint 18 --ambient 22
+"""
+import logging
+import time
+import click
+from Simulation.Simulator import Simulator
+from Simulation.ThermalModel import ThermalModel, fermentation_curve
+
+
+@click.command()
+@click.option('--days', default=14.0, show_default=True, help='simulated duration in days')
+@click.option('--setpoint', default=18.0, show_default=True, help='beer temperature setpoint in °C')
+@click.option('--start-temperature', default=22.0, show_default=True, help='initial beer and fridge temperature in °C')
+@click.option('--ambient', default=22.0, show_default=True, help='ambient temperature in °C')
+@click.option('--fermentation-power', default=15.0, show_default=True, help='peak fermentation heat in W')
+@click.option('--control-period', default=10.0, show_default=True, help='simulated seconds between control loop ticks')
+@click.option('--noise', default=0.0, show_default=True, help='fridge sensor noise standard deviation in °C')
+def main(days, setpoint, start_temperature, ambient, fermentation_power, control_period, noise):
+    logging.basicConfig(format='%(levelname)s - %(name)s - %(message)s', level=logging.WARNING)
+
+    model = ThermalModel(air_temperature=start_temperature, beer_temperature=start_temperature, ambient_temperature=ambient,
+                         fermentation_power=fermentation_curve(peak_power=fermentation_power))
+    simulator = Simulator(model=model, setpoints=[(0.0, setpoint)], control_period=control_period, sensor_noise=noise, seed=1)
+
+    start = time.perf_counter()
+    report = simulator.run(days * 86400.0)
+    print(report)
+    print(f'wall time:           {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import logging
+from Drivers.Metrics import registry
+
+
+logger = logging.getLogger(__name__)
+
+
+class MachineError(Exception):
+    pass
+
+
+class _Transition:
+    """
+    Compiled transition: conditions, unless conditions and before callbacks as tuples of callables,
+    and the counter of times it was taken
+    """
+
+    __slots__ = ('dest', 'conditions', 'unless', 'before', 'taken')
+
+    def __init__(self, dest, conditions, unless, before, taken):
+        self.dest = dest
+        self.conditions = conditions
+        self.unless = unless
+        self.before = before
+        self.taken = taken
+
+
+class StateMachine:
+    """
+    Small table driven state machine, covering the subset of the transitions library used by the controllers.
+
+    Transitions are compiled into a table of trigger -> state -> transitions as they are added, with callbacks
+    resolved to bound methods once, so firing a trigger is a dictionary lookup and a few plain function calls.
+    The current state is kept in the state attribute of the model, and a method is added to the model for
+    each trigger. Arguments passed to a trigger are passed on to its conditions and callbacks.
+
+    Triggers which are invalid in the current state are ignored, like ignore_invalid_triggers in transitions.
+    Transitions taken are counted in the metrics registry, labelled with the machine name, trigger and destination.
+    """
+
+    WILDCARD = '*'
+
+    def __init__(self, model, states, initial, name=None, after_state_change=None):
+        """
+        :param name: name of the machine in the metrics, defaults to the class name of the model
+        :param after_state_change: callbacks called after every transition taken, like the before callbacks
+        """
+        if initial not in states:
+            raise MachineError(f'Unknown initial state, {initial}')
+
+        self._model = model
+        self._name = name if name is not None else type(model).__name__
+        self._after_state_change = self._resolve(after_state_change)
+        self._states = tuple(states)
+        self._table = dict()
+        model.state = initial
+
+
+    def add_transition(self, trigger, source, dest, conditions=None, unless=None, before=None):
+        """
+        Adds a transition from source, a state, a list of states or '*' for all states, to dest.
+        The transition is taken when all conditions are true and all unless conditions are false, in which case
+        the before callbacks are called before changing state. Conditions and callbacks are either callables or
+        names of model methods. Transitions are tried in the order they were added.
+        """
+        if dest not in self._states:
+            raise MachineError(f'Unknown destination state, {dest}')
+
+        sources = self._states if source == StateMachine.WILDCARD else _as_list(source)
+
+        for state in sources:
+            if state not in self._states:
+                raise MachineError(f'Unknown source state, {state}')
+
+        taken = registry.counter('state_machine_transitions', 'State machine transitions taken', machine=self._name,
+                                 trigger=trigger, dest=dest)
+        transition = _Transition(dest, self._resolve(conditions), self._resolve(unless), self._resolve(before), taken)
+
+        if trigger not in self._table:
+            self._table[trigger] = {state: () for state in self._states}
+            self._add_trigger(trigger)
+
+        states = self._table[trigger]
+
+        for state in sources:
+            states[state] += (transition,)
+
+
+    def trigger(self, trigger, *args, **kwargs):
+        """
+        Fires a trigger. Returns True if a transition was taken, False otherwise.
+        """
+        model = self._model
+
+        for transition in self._table[trigger][model.state]:
+            if self._allowed(transition, args, kwargs):
+                for callback in transition.before:
+                    callback(*args, **kwargs)
+
+                model.state = transition.dest
+                transition.taken.inc()
+
+                for callback in self._after_state_change:
+                    callback(*args, **kwargs)
+
+                return True
+
+        return False
+
+
+    def _allowed(self, transition, args, kwargs):
+        for condition in transition.conditions:
+            if not condition(*args, **kwargs):
+                return False
+
+        for condition in transition.unless:
+            if condition(*args, **kwargs):
+                return False
+
+        return True
+
+
+    def _add_trigger(self, trigger):
+        machine = self
+
+        def fire(*args, **kwargs):
+            return machine.trigger(trigger, *args, **kwargs)
+
+        setattr(self._model, trigger, fire)
+
+
+    def _resolve(self, callbacks):
+        """
+        Resolves callback names into bound methods of the model
+        """
+        resolved = []
+
+        for callback in _as_list(callbacks):
+            if isinstance(callback, str):
+                callback = getattr(self._model, callback)
+
+            if not callable(callback):
+                raise MachineError(f'Callback is not callable, {callback!r}')
+
+            resolved.append(callback)
+
+        return tuple(resolved)
+
+
+def _as_list(value):
+    if value is None:
+        return []
+
+    if isinstance(value, (list, tuple)):
+        return list(value)
+
+    return [value]
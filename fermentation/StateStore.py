@@ -0,0 +1,119 @@
+import json
+import logging
+import os
+from Drivers.Clock import system_clock
+
+
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+
+
+logger = logging.getLogger(__name__)
+
+
+def read_boot_id(path=BOOT_ID_PATH):
+    """
+    Returns the random id of the current boot of the kernel, or None when not available
+    """
+    try:
+        with open(path) as boot_id:
+            return boot_id.read().strip()
+
+    except OSError:
+        return None
+
+
+class StateStore:
+    """
+    Checkpoints of the controller state of each chamber, kept in a small JSON file which is replaced atomically,
+    so a crash or power loss while writing leaves either the previous or the new checkpoint, never a torn one.
+
+    Points in time are stored as stamps of both the monotonic and the wall clock. Within the same boot, e.g. after
+    the process was restarted, the monotonic clock is used, as it can't jump. After a reboot the wall clock is used,
+    and time which appears to have gone backwards, e.g. before NTP synchronised the clock, counts as no time at all.
+    """
+
+    def __init__(self, path, clock=None, boot_id=None):
+        """
+        :param boot_id: id of the current boot, read from the kernel when not given
+        """
+        self._path = path
+        self._clock = clock if clock is not None else system_clock
+        self._boot_id = boot_id if boot_id is not None else read_boot_id()
+        self._records = self._read()
+
+
+    def load(self, name):
+        """
+        Returns the last checkpoint saved for name, or None
+        """
+        return self._records.get(name)
+
+
+    def save(self, name, record):
+        """
+        Saves a checkpoint for name, a JSON serialisable dictionary. The save time and boot id are added to it.
+        Errors are logged rather than raised, so a failing disk doesn't stop temperature control.
+        """
+        self._records[name] = dict(record, saved=self.stamp(), boot_id=self._boot_id)
+        temporary = self._path + '.tmp'
+
+        try:
+            with open(temporary, 'w') as state_file:
+                json.dump(self._records, state_file)
+                state_file.flush()
+                os.fsync(state_file.fileno())
+
+            os.replace(temporary, self._path)
+            self._sync_directory()
+
+        except OSError as e:
+            logger.warning(f'saving state to {self._path} failed, {e}')
+
+
+    def stamp(self, seconds_ago=0.0):
+        """
+        Returns the stamp of the point in time the given number of seconds ago
+        """
+        return {'time': self._clock.time() - seconds_ago, 'monotonic': self._clock.monotonic() - seconds_ago}
+
+
+    def elapsed(self, stamp, record):
+        """
+        Returns the seconds elapsed since a stamp saved in record, never negative
+        """
+        if self._boot_id is not None and record.get('boot_id') == self._boot_id:
+            return max(0.0, self._clock.monotonic() - stamp['monotonic'])
+
+        return max(0.0, self._clock.time() - stamp['time'])
+
+
+    def _read(self):
+        try:
+            with open(self._path) as state_file:
+                records = json.load(state_file)
+
+        except FileNotFoundError:
+            return dict()
+
+        except (OSError, ValueError) as e:
+            logger.warning(f'ignoring unreadable state file {self._path}, {e}')
+            return dict()
+
+        if not isinstance(records, dict):
+            logger.warning(f'ignoring invalid state file {self._path}')
+            return dict()
+
+        return records
+
+
+    def _sync_directory(self):
+        """
+        Makes the rename durable by syncing the directory entry
+        """
+        directory = os.open(os.path.dirname(os.path.abspath(self._path)), os.O_RDONLY)
+
+        try:
+            os.fsync(directory)
+
+        finally:
+            os.close(directory)
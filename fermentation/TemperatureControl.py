@@ -1,14 +1,23 @@
 import logging
 import time
-from transitions import Machine
+from StateMachine import StateMachine
+from Sampling import read_sample
+from Drivers.Clock import system_clock
+from Drivers.Metrics import registry
+from Profiler import PhaseTimer, NULL_PHASE_TIMER
 
 
 COMPRESSOR_MIN_OFF_TIME_SEC = 300
 COMPRESSOR_MIN_ON_TIME_SEC = 180
+CHECKPOINT_INTERVAL_SEC = 60
+"""Seconds between checkpoints while the compressor is on, bounding how long it may have run before a crash"""
+STALE_WARNING_INTERVAL_SEC = 600
+"""Seconds between repeated warnings while readings stay stale"""
+PROFILE_RESOLUTION = 0.05
+"""Setpoint step in celsius when following a profile, so a ramp changes the setpoint every few minutes, not every tick"""
 
 
 logger = logging.getLogger(__name__)
-logging.getLogger('transitions').setLevel(logging.INFO)
 
 
 class TemperatureControl:
@@ -20,13 +29,30 @@ class TemperatureControl:
     """
 
     states = ['stop', 'neutral', 'cooling', 'heating']
+    state_codes = {state: code for code, state in enumerate(states)}
 
 
-    def __init__(self, fridge_temp, beer_temp, comp_relay, heater_relay=None):
+    def __init__(self, fridge_temp, beer_temp, comp_relay, heater_relay=None, name=None, clock=None, history=None,
+                 timeseries=None, state_store=None, profile=None):
         """
-        Initialises the state machine and sets a default setpoint and hysteresis value
+        Initialises the state machine and sets a default setpoint and hysteresis value.
+        The optional name identifies the chamber being controlled, and is appended to the logger name.
+        The clock, defaulting to the system clock, timestamps readings of sensors which aren't sampled.
+        If a History and/or a TimeSeries is given, an entry is appended to them on every control loop tick.
+        If a StateStore is given, the state is checkpointed to it on every transition, see restore().
+        If a TemperatureProfile is given, the setpoint follows it, see set_temperature_profile().
         """
-        self._machine = Machine(model=self, states=TemperatureControl.states, initial='stop', ignore_invalid_triggers=True)
+        self.name = name
+        self._clock = clock if clock is not None else system_clock
+        self._history = history
+        self._timeseries = timeseries
+        self._state_store = state_store
+        self._last_checkpoint = None
+        self._logger = logger.getChild(name) if name else logger
+        self._machine = StateMachine(model=self, states=TemperatureControl.states, initial='stop', name=name,
+                                     after_state_change='_state_changed')
+        self._loop_duration = registry.histogram('control_loop_seconds', 'Duration of the control loop of a chamber',
+                                                 chamber=name or '')
 
         # add transitions            trigger    source     dest       conditions, action, etc
         self._machine.add_transition('start',   'stop',    'neutral')
@@ -42,20 +68,45 @@ class TemperatureControl:
 
         self._fridge_setpoint = 20.0
         self._beer_setpoint = 20.0
+        self._configured_setpoint = None
         self._hysteresis = 0.5
+        self._readings_stale = False
+        self._stale_warned = None
+        self._phases = NULL_PHASE_TIMER
+        self._profile = None
+        self._profile_finished = False
 
         self.set_temperature_setpoint(self._beer_setpoint)
         self.set_temperature_hysteresis(self._hysteresis)
 
-        logger.info("initialized")
+        if profile is not None:
+            self.set_temperature_profile(profile)
 
+        self._logger.info("initialized")
 
-    def set_temperature_setpoint(self, setpoint):
+
+    def set_temperature_setpoint(self, setpoint, configured=False):
         """
-        Sets the temperature setpoint in celsius
+        Sets the temperature setpoint in celsius.
+        A configured setpoint is the one from the configuration, see restore().
         """
+        changed = setpoint != self._beer_setpoint
         self._beer_setpoint = setpoint
-        logger.info(f"temperature setpoint changed to {setpoint:.2f}°C")
+
+        if configured:
+            self._configured_setpoint = setpoint
+
+        self._logger.info(f"temperature setpoint changed to {setpoint:.2f}°C")
+
+        if changed and self.state != 'stop':
+            self.checkpoint()
+
+
+    def setpoint(self):
+        """
+        Returns the temperature setpoint in celsius, which follows the TemperatureProfile if any
+        """
+        return self._beer_setpoint
 
 
     def set_temperature_hysteresis(self, hysteresis):
@@ -64,23 +115,267 @@ class TemperatureControl:
         Hysteresis is the same going from neutral to cooling as going from cooling to neutral
         """
         self._hysteresis = hysteresis
-        logger.info(f"temperature hysteresis changed to {hysteresis:.2f}°C")
+        self._logger.info(f"temperature hysteresis changed to {hysteresis:.2f}°C")
+
+
+    def set_temperature_profile(self, profile):
+        """
+        Makes the setpoint follow a TemperatureProfile from the next tick, or stops following one when None.
+        Before the start of the profile the setpoint is left as is. A profile without start time starts on the next
+        tick, unless it replaces a started profile, in which case it keeps its start, so editing the segments of a
+        running profile doesn't start it over.
+        """
+        if profile is not None and profile.start is None and self._profile is not None:
+            profile.start = self._profile.start
+
+        self._profile = profile
+        self._profile_finished = False
+        self._logger.info(f"temperature profile {'set' if profile is not None else 'removed'}")
+
+
+    def profile(self):
+        """
+        Returns the TemperatureProfile the setpoint follows, or None
+        """
+        return self._profile
 
 
     def control_loop(self):
         """
         Control looped function which updates the temperature readings and updates the state machine.
-        Should be called at a fixed time interval
+        Should be called at a fixed time interval.
+
+        Sampled sensors return their cached readings, so this never blocks on sensor I/O. While a reading is
+        stale, the fridge setpoint is left as is and cooling is not considered needed, see _cooling_needed().
+        Stale readings are warned about when they become stale, every STALE_WARNING_INTERVAL_SEC while they
+        stay stale, and once they recover.
         """
-        relay_state = "on" if self._comp_relay.state() else "off"
-        fridge_temp = self._fridge_temp.temperature()
-        beer_temp = self._beer_temp.temperature()
+        start = time.perf_counter()
+        phases = self._phases
+        phases.start()
+
+        fridge = read_sample(self._fridge_temp, self._clock)
+        beer = read_sample(self._beer_temp, self._clock)
+        fridge_temp = fridge.value
+        beer_temp = beer.value
+
+        self._readings_stale = fridge.stale or beer.stale
+        self._log_stale_readings(fridge, beer)
+        phases.lap('read')
+
+        if self._profile is not None:
+            self._follow_profile()
+
+        if self._readings_stale:
+            self._update(fridge_temp, beer_temp)
+            self._append_history(fridge_temp, beer_temp)
+            self._checkpoint_while_cooling()
+            self._loop_duration.observe(time.perf_counter() - start)
+            return
 
         self._fridge_setpoint = self._update_fridge_setpoint(beer_temp)
+        phases.lap('setpoint')
+
         self._update(fridge_temp, beer_temp)
+        phases.lap('update')
+
+        self._append_history(fridge_temp, beer_temp)
+        self._checkpoint_while_cooling()
+        phases.lap('history')
 
-        logger.debug("{} - {:.1f} - {:.2f}°C / {:.2f}°C - {:.2f}°C / {:.2f}°C".format(self.state,
-            self._comp_relay.elapsed_time(), beer_temp, self._beer_setpoint, fridge_temp, self._fridge_setpoint))
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug("{} - {:.1f} - {:.2f}°C / {:.2f}°C - {:.2f}°C / {:.2f}°C".format(self.state,
+                self._comp_relay.elapsed_time(), beer_temp, self._beer_setpoint, fridge_temp, self._fridge_setpoint))
+
+        phases.lap('logging')
+        self._loop_duration.observe(time.perf_counter() - start)
+
+
+    def replace_compressor_relay(self, relay, switch_off=True):
+        """
+        Replaces the compressor relay, e.g. when it moved to another pin. The new relay takes over the output state
+        and timing of the old one, so the compressor minimum on and off times still hold.
+        :param switch_off: whether the old relay is switched off, which must not be done when both drive the same pin
+        """
+        old = self._comp_relay
+        state, elapsed = old.state(), old.elapsed_time()
+        relay.restore(state, elapsed)
+
+        if switch_off:
+            old.off()
+
+        self._comp_relay = relay
+        self._logger.info("compressor relay replaced")
+
+
+    def checkpoint(self):
+        """
+        Saves the state, setpoints and compressor relay timing to the state store, if any
+        """
+        if self._state_store is None:
+            return
+
+        store = self._state_store
+        store.save(self.name or 'default', {
+            'state': self.state,
+            'beer_setpoint': self._beer_setpoint,
+            'configured_setpoint': self._configured_setpoint,
+            'fridge_setpoint': self._fridge_setpoint,
+            'profile_start': self._profile.start if self._profile is not None else None,
+            'compressor': {'state': bool(self._comp_relay.state()), 'switched': store.stamp(self._comp_relay.elapsed_time())},
+        })
+        self._last_checkpoint = self._clock.monotonic()
+
+
+    def restore(self):
+        """
+        Restores the last checkpoint from the state store, so control resumes on the first tick rather than
+        waiting out a full compressor hold-off. Returns True if a checkpoint was restored.
+
+        The compressor is off after a restart, as the relay output is reset. If it was on at the last checkpoint,
+        it stopped at the latest CHECKPOINT_INTERVAL_SEC after it, as checkpoints are saved that often while cooling.
+        The relay is restored as off since then, and a running controller resumes in neutral, from where it
+        starts cooling again as soon as the compressor minimum off time allows.
+        The setpoint is only restored if the configured setpoint is the same as when it was saved, so a setpoint
+        changed in the configuration while not running takes effect. A profile without start time continues from
+        the start saved with the checkpoint.
+        """
+        store = self._state_store
+        record = store.load(self.name or 'default') if store is not None else None
+
+        if record is None:
+            return False
+
+        compressor = record['compressor']
+
+        if compressor['state']:
+            off_time = max(0.0, store.elapsed(record['saved'], record) - CHECKPOINT_INTERVAL_SEC)
+
+        else:
+            off_time = store.elapsed(compressor['switched'], record)
+
+        self._comp_relay.restore(False, off_time)
+        self.state = 'stop' if record['state'] == 'stop' else 'neutral'
+
+        if record.get('configured_setpoint') == self._configured_setpoint:
+            self._beer_setpoint = record['beer_setpoint']
+            self._fridge_setpoint = record['fridge_setpoint']
+
+        else:
+            self._logger.info(f"configured setpoint changed since the checkpoint, not restoring {record['beer_setpoint']:.2f}°C")
+
+        if self._profile is not None and self._profile.start is None:
+            self._profile.start = record.get('profile_start')
+
+        self._logger.info(f"restored {record['state']} state, setpoint {self._beer_setpoint:.2f}°C, "
+                          f"compressor off for {off_time:.0f}s")
+        self.checkpoint()
+        return True
+
+
+    def profile_phases(self, enabled):
+        """
+        Enables or disables timing of the control loop phases: sensor read, setpoint calculation, state update,
+        history and logging. Phases of ticks with stale readings are not timed past the read.
+        """
+        self._phases = PhaseTimer(self.name) if enabled else NULL_PHASE_TIMER
+
+
+    def phase_summary(self):
+        """
+        Returns the (number of ticks, mean duration) of each phase since phase timing was enabled, or an empty
+        dictionary when it is disabled
+        """
+        return self._phases.summary()
+
+
+    def history(self):
+        """
+        Returns the History appended to on every tick, or None
+        """
+        return self._history
+
+
+    def timeseries(self):
+        """
+        Returns the TimeSeries appended to on every tick, or None
+        """
+        return self._timeseries
+
+
+    def _append_history(self, fridge_temp, beer_temp):
+        """
+        Appends the readings, setpoint and state of this tick to the history and time series, if any
+        """
+        if self._history is None and self._timeseries is None:
+            return
+
+        entry = (self._clock.time(), beer_temp, fridge_temp, self._fridge_setpoint,
+                 TemperatureControl.state_codes[self.state], self._comp_relay.state())
+
+        if self._history is not None:
+            self._history.append(*entry)
+
+        if self._timeseries is not None:
+            self._timeseries.append(*entry)
+
+
+    def _state_changed(self, *args, **kwargs):
+        self.checkpoint()
+
+
+    def _follow_profile(self):
+        """
+        Sets the setpoint of the profile at this tick, rounded to PROFILE_RESOLUTION. A profile without start time
+        starts now, which is checkpointed so a restart continues rather than restarts it.
+        """
+        profile = self._profile
+        now = self._clock.time()
+
+        if profile.start is None:
+            profile.start = now
+            self._logger.info(f"temperature profile started, {profile.duration() / 86400:.1f} days")
+            self.checkpoint()
+
+        setpoint = profile.setpoint(now)
+
+        if setpoint is None:
+            return
+
+        setpoint = round(round(setpoint / PROFILE_RESOLUTION) * PROFILE_RESOLUTION, 2)
+
+        if setpoint != self._beer_setpoint:
+            self.set_temperature_setpoint(setpoint)
+
+        if not self._profile_finished and profile.finished(now):
+            self._profile_finished = True
+            self._logger.info(f"temperature profile finished, holding {setpoint:.2f}°C")
+
+
+    def _log_stale_readings(self, fridge, beer):
+        """
+        Warns when readings become stale and, rate limited, while they stay stale, and logs when they recover
+        """
+        if not self._readings_stale:
+            if self._stale_warned is not None:
+                self._stale_warned = None
+                self._logger.info("temperature readings recovered")
+            return
+
+        now = self._clock.monotonic()
+
+        if self._stale_warned is None or now - self._stale_warned >= STALE_WARNING_INTERVAL_SEC:
+            self._stale_warned = now
+            self._logger.warning(f"stale temperature readings, fridge {fridge.age:.0f}s old, beer {beer.age:.0f}s old")
+
+
+    def _checkpoint_while_cooling(self):
+        """
+        Checkpoints every CHECKPOINT_INTERVAL_SEC while the compressor is on, see restore()
+        """
+        if self._state_store is not None and self.state == 'cooling' and \
+                self._clock.monotonic() - self._last_checkpoint >= CHECKPOINT_INTERVAL_SEC:
+            self.checkpoint()
 
 
     def _update_fridge_setpoint(self, beer_temp):
@@ -102,7 +397,15 @@ class TemperatureControl:
     def _cooling_needed(self, fridge_temp, beer_temp, *args, **kwargs):
         """
         Return true if cooling is needed, false if not.
+
+        Cooling is never needed while a reading is stale, e.g. until the first Tilt beacon arrived or when a sensor
+        died: the compressor isn't started, and a running compressor is stopped once its minimum on time allows.
+        Cooling on old readings could keep the compressor running indefinitely and freeze the beer, so control
+        fails safe, leaving the beer to drift towards the room temperature until the readings recover.
         """
+        if self._readings_stale:
+            return False
+
         return fridge_temp > (self._fridge_setpoint + self._hysteresis) if self.state == 'neutral' else \
                fridge_temp > (self._fridge_setpoint - self._hysteresis) if self.state == 'cooling' else False
 
@@ -126,7 +429,7 @@ class TemperatureControl:
         Turn on the cooling compressor
         """
         self._comp_relay.on()
-        logger.info("starting cooling")
+        self._logger.info("starting cooling")
 
 
     def _stop_cooling(self, *args, **kwargs):
@@ -134,7 +437,7 @@ class TemperatureControl:
         Turn of the cooling compressor
         """
         self._comp_relay.off()
-        logger.info("stopping cooling")
+        self._logger.info("stopping cooling")
 
 
     def _heating_needed(self, *args, **kwargs):
@@ -162,7 +465,7 @@ class TemperatureControl:
         """
         _tbd_
         """
-        logger.info("starting heating")
+        self._logger.info("starting heating")
         pass # not implemented
 
 
@@ -170,5 +473,5 @@ class TemperatureControl:
         """
         _tbd_
         """
-        logger.info("stopping heating")
+        self._logger.info("stopping heating")
         pass # not implemented
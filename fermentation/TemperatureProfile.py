@@ -0,0 +1,94 @@
+from bisect import bisect_right
+
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+
+
+class TemperatureProfile:
+    """
+    Setpoint schedule of a fermentation, e.g. 18°C for 5 days, ramp to 21°C over 2 days, then cold crash to 2°C.
+
+    The hold and ramp segments are compiled into breakpoints once, a point in time and temperature at the start and
+    end of each segment, between which the setpoint is linearly interpolated. Looking up the setpoint is a binary
+    search of the breakpoint times, and going from one hold straight into another steps to the new temperature.
+
+    The profile is anchored to an absolute start time rather than to when the process started, so a restart
+    resumes where the profile was. After the last segment the profile holds its last temperature.
+    """
+
+    def __init__(self, segments, start=None):
+        """
+        :param segments: (kind, temperature, duration in seconds) of each segment, kind being hold or ramp.
+            A ramp goes from the temperature at the end of the previous segment, so the first segment must be a hold.
+        :param start: wall clock time the profile starts at, or None when it is yet to be started
+        """
+        times = []
+        temperatures = []
+        elapsed = 0.0
+
+        for kind, temperature, duration in segments:
+            if duration <= 0:
+                raise ValueError(f'Profile segment duration must be positive, not {duration}')
+
+            if kind == 'hold':
+                times.append(elapsed)
+                temperatures.append(temperature)
+
+            elif kind != 'ramp':
+                raise ValueError(f'Unknown profile segment, {kind}')
+
+            elif not times:
+                raise ValueError('A profile can not start with a ramp')
+
+            elapsed += duration
+            times.append(elapsed)
+            temperatures.append(temperature)
+
+        if not times:
+            raise ValueError('A profile needs at least one segment')
+
+        self._times = tuple(times)
+        self._temperatures = tuple(temperatures)
+        self.start = start
+
+
+    def setpoint(self, now):
+        """
+        Returns the setpoint at wall clock time now, or None before the profile started
+        """
+        if self.start is None or now < self.start:
+            return None
+
+        elapsed = now - self.start
+        times = self._times
+        index = bisect_right(times, elapsed)
+
+        if index == len(times):
+            return self._temperatures[-1]
+
+        # times[index - 1] <= elapsed < times[index], so the segment has a duration
+        start_time, end_time = times[index - 1], times[index]
+        start_temperature, end_temperature = self._temperatures[index - 1], self._temperatures[index]
+        return start_temperature + (end_temperature - start_temperature) * (elapsed - start_time) / (end_time - start_time)
+
+
+    def finished(self, now):
+        """
+        Returns True once the last segment has ended
+        """
+        return self.start is not None and now - self.start >= self._times[-1]
+
+
+    def duration(self):
+        """
+        Returns the duration of all segments in seconds
+        """
+        return self._times[-1]
+
+
+    def breakpoints(self):
+        """
+        Returns the (seconds since start, temperature) breakpoints the setpoint is interpolated between
+        """
+        return list(zip(self._times, self._temperatures))
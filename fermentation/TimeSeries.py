@@ -0,0 +1,415 @@
+"""
+Persistent time series of the controller history.
+
+Each resolution is stored in its own append-only file of fixed width binary records, accessed through a
+memory map. The raw file holds one record per control loop tick, the rollup files hold min/max/mean per
+1 minute, 15 minutes and 1 hour. Rollups are maintained incrementally: each level accumulates the records
+of the level below it and emits a rollup record when its bucket closes, so nothing is ever rescanned.
+
+Appended records are kept in memory and written to the files in batches, to limit SD card wear.
+
+File layout: a 64 byte header (magic, version, record size, record count) followed by the records.
+The record count is only updated after the records are written, so a crash never exposes a partial record.
+"""
+
+import logging
+import math
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b'FTS1'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+HEADER_SIZE = 64
+
+RAW = struct.Struct('<dfffBBxx')
+"""timestamp, beer temperature, fridge temperature, fridge setpoint, state code, relay state"""
+
+ROLLUP = struct.Struct('<dIII8fxxxx')
+"""bucket start, ticks, beer readings, fridge readings, beer min/max/mean, fridge min/max/mean, mean fridge setpoint, relay duty"""
+
+RawRecord = namedtuple('RawRecord', ['timestamp', 'beer_temperature', 'fridge_temperature', 'fridge_setpoint', 'state', 'relay'])
+Rollup = namedtuple('Rollup', ['timestamp', 'count', 'beer_count', 'fridge_count', 'beer_min', 'beer_max', 'beer_mean',
+                               'fridge_min', 'fridge_max', 'fridge_mean', 'fridge_setpoint', 'relay_duty'])
+
+LEVELS = (('raw', 0), ('1m', 60), ('15m', 900), ('1h', 3600))
+"""Level names and bucket widths in seconds, finest first"""
+
+
+class RecordFile:
+    """
+    Append-only file of fixed width records, sorted by the timestamp in their first field, accessed through a memory map.
+    The file is grown in chunks of growth records.
+    """
+
+    def __init__(self, path, record, growth=4096):
+        self._path = path
+        self._record = record
+        self._growth = growth
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+        try:
+            size = os.fstat(self._fd).st_size
+
+            if size == 0:
+                size = HEADER_SIZE + growth * record.size
+                os.ftruncate(self._fd, size)
+                self._map(size)
+                HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, record.size, 0)
+                self._count = 0
+
+            else:
+                self._map(size)
+                magic, version, record_size, self._count = HEADER.unpack_from(self._mmap, 0)
+
+                if magic != MAGIC or version != VERSION or record_size != record.size:
+                    raise ValueError(f'{path} is not a version {VERSION} time series file of {record.size} byte records')
+
+        except Exception:
+            self.close()
+            raise
+
+
+    def __len__(self):
+        return self._count
+
+
+    def append(self, records):
+        """
+        Writes the given records, each a tuple of field values, and then updates the record count
+        """
+        needed = HEADER_SIZE + (self._count + len(records)) * self._record.size
+
+        if needed > len(self._mmap):
+            chunk = self._growth * self._record.size
+            self._remap(HEADER_SIZE + -(-(needed - HEADER_SIZE) // chunk) * chunk)
+
+        offset = HEADER_SIZE + self._count * self._record.size
+
+        for values in records:
+            self._record.pack_into(self._mmap, offset, *values)
+            offset += self._record.size
+
+        self._count += len(records)
+        HEADER.pack_into(self._mmap, 0, MAGIC, VERSION, self._record.size, self._count)
+
+
+    def flush(self):
+        self._mmap.flush()
+
+
+    def read(self, index):
+        return self._record.unpack_from(self._mmap, HEADER_SIZE + index * self._record.size)
+
+
+    def timestamp(self, index):
+        return struct.unpack_from('<d', self._mmap, HEADER_SIZE + index * self._record.size)[0]
+
+
+    def bisect(self, timestamp):
+        """
+        Returns the index of the first record with a timestamp at or after the given timestamp
+        """
+        lo, hi = 0, self._count
+
+        while lo < hi:
+            mid = (lo + hi) // 2
+
+            if self.timestamp(mid) < timestamp:
+                lo = mid + 1
+
+            else:
+                hi = mid
+
+        return lo
+
+
+    def close(self):
+        if getattr(self, '_mmap', None) is not None:
+            self._mmap.close()
+            self._mmap = None
+
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+    def _map(self, size):
+        self._mmap = mmap.mmap(self._fd, size, mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+
+
+    def _remap(self, size):
+        self._mmap.flush()
+        self._mmap.close()
+        os.ftruncate(self._fd, size)
+        self._map(size)
+
+
+class _Accumulator:
+    """
+    Min/max/mean of the records falling in the current bucket of a rollup level
+    """
+
+    __slots__ = ('start', 'count', 'beer_count', 'beer_min', 'beer_max', 'beer_sum', 'fridge_count', 'fridge_min',
+                 'fridge_max', 'fridge_sum', 'setpoint_sum', 'relay_sum')
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.beer_count = 0
+        self.beer_min = math.inf
+        self.beer_max = -math.inf
+        self.beer_sum = 0.0
+        self.fridge_count = 0
+        self.fridge_min = math.inf
+        self.fridge_max = -math.inf
+        self.fridge_sum = 0.0
+        self.setpoint_sum = 0.0
+        self.relay_sum = 0.0
+
+
+    def add_raw(self, record):
+        timestamp, beer, fridge, setpoint, state, relay = record
+        self.count += 1
+        self.setpoint_sum += setpoint
+        self.relay_sum += relay
+
+        if beer == beer:
+            self.beer_count += 1
+            self.beer_min = min(self.beer_min, beer)
+            self.beer_max = max(self.beer_max, beer)
+            self.beer_sum += beer
+
+        if fridge == fridge:
+            self.fridge_count += 1
+            self.fridge_min = min(self.fridge_min, fridge)
+            self.fridge_max = max(self.fridge_max, fridge)
+            self.fridge_sum += fridge
+
+
+    def add_rollup(self, rollup):
+        (timestamp, count, beer_count, fridge_count, beer_min, beer_max, beer_mean,
+         fridge_min, fridge_max, fridge_mean, setpoint, relay_duty) = rollup
+        self.count += count
+        self.setpoint_sum += setpoint * count
+        self.relay_sum += relay_duty * count
+
+        if beer_count:
+            self.beer_count += beer_count
+            self.beer_min = min(self.beer_min, beer_min)
+            self.beer_max = max(self.beer_max, beer_max)
+            self.beer_sum += beer_mean * beer_count
+
+        if fridge_count:
+            self.fridge_count += fridge_count
+            self.fridge_min = min(self.fridge_min, fridge_min)
+            self.fridge_max = max(self.fridge_max, fridge_max)
+            self.fridge_sum += fridge_mean * fridge_count
+
+
+    def rollup(self):
+        nan = math.nan
+        beer = (self.beer_min, self.beer_max, self.beer_sum / self.beer_count) if self.beer_count else (nan, nan, nan)
+        fridge = (self.fridge_min, self.fridge_max, self.fridge_sum / self.fridge_count) if self.fridge_count else (nan, nan, nan)
+        return (self.start, self.count, self.beer_count, self.fridge_count) + beer + fridge + \
+               (self.setpoint_sum / self.count, self.relay_sum / self.count)
+
+
+class _Level:
+
+    def __init__(self, name, width, file):
+        self.name = name
+        self.width = width
+        self.file = file
+        self.pending = []
+        self.accumulator = None
+        self.coarser = None
+        self.finer_is_raw = False
+
+
+class TimeSeries:
+    """
+    Persistent multi resolution time series of controller ticks, stored in a directory with a file per level.
+    The append() signature matches History.append(), so the controller can feed both.
+    """
+
+    def __init__(self, directory, batch_size=60, flush_interval=300.0, growth=4096):
+        """
+        :param batch_size: number of raw records kept in memory before they are written
+        :param flush_interval: maximum time span in seconds of the records kept in memory
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._levels = []
+
+        try:
+            for name, width in LEVELS:
+                record = RAW if width == 0 else ROLLUP
+                self._levels.append(_Level(name, width, RecordFile(os.path.join(directory, f'{name}.dat'), record, growth)))
+
+        except Exception:
+            self.close()
+            raise
+
+        for finer, coarser in zip(self._levels, self._levels[1:]):
+            finer.coarser = coarser
+            coarser.finer_is_raw = finer.width == 0
+
+        self._raw = self._levels[0]
+        self._last_timestamp = self._raw.file.timestamp(len(self._raw.file) - 1) if len(self._raw.file) else -math.inf
+        self._first_pending = None
+        self._recover()
+        logger.info(f'time series opened in {directory}, {len(self._raw.file)} records')
+
+
+    def append(self, timestamp, beer_temperature, fridge_temperature, fridge_setpoint, state, relay):
+        """
+        Appends a tick. Records are written to disk in batches, see flush().
+        Ticks with a timestamp before the previous one are dropped, as the files are sorted by time.
+        """
+        if timestamp < self._last_timestamp:
+            logger.warning(f'time series tick at {timestamp} is older than the previous tick, dropped')
+            return
+
+        record = (timestamp, _float(beer_temperature), _float(fridge_temperature), _float(fridge_setpoint),
+                  state, 1 if relay else 0)
+        self._last_timestamp = timestamp
+        self._raw.pending.append(record)
+        self._feed(self._raw.coarser, record)
+
+        if self._first_pending is None:
+            self._first_pending = timestamp
+
+        if len(self._raw.pending) >= self._batch_size or timestamp - self._first_pending >= self._flush_interval:
+            self.flush()
+
+
+    def flush(self):
+        """
+        Writes the records kept in memory to the files
+        """
+        for level in self._levels:
+            if level.pending:
+                level.file.append(level.pending)
+                level.file.flush()
+                level.pending = []
+
+        self._first_pending = None
+
+
+    def close(self):
+        """
+        Flushes and closes the files
+        """
+        if self._levels and len(self._levels) == len(LEVELS):
+            self.flush()
+
+        for level in self._levels:
+            level.file.close()
+
+        self._levels = []
+
+
+    def resolutions(self):
+        """
+        Returns the level names and bucket widths in seconds, finest first
+        """
+        return [(level.name, level.width) for level in self._levels]
+
+
+    def query(self, start, end, max_points=1000):
+        """
+        Returns (level name, records) for the time range [start, end), from the finest level returning at
+        most max_points records, or the coarsest level if none does. Counting the records of a level in the
+        range is a binary search, so raw data is only read when it is actually returned.
+        Rollups are only available for closed buckets.
+        """
+        for level in self._levels:
+            lo, hi = self._range(level, start, end)
+            count = hi - lo + sum(1 for record in level.pending if self._in_range(level, record[0], start, end))
+
+            if count <= max_points or level is self._levels[-1]:
+                return level.name, self._read(level, lo, hi, start, end)
+
+
+    def query_level(self, name, start, end):
+        """
+        Returns the records of the named level in the time range [start, end)
+        """
+        for level in self._levels:
+            if level.name == name:
+                lo, hi = self._range(level, start, end)
+                return self._read(level, lo, hi, start, end)
+
+        raise ValueError(f'Unknown time series level, {name}')
+
+
+    def _range(self, level, start, end):
+        """
+        Index range of the persisted records of a level overlapping [start, end).
+        Rollup buckets overlap the range if they end after its start.
+        """
+        return level.file.bisect(start - level.width + 1e-9 if level.width else start), level.file.bisect(end)
+
+
+    def _in_range(self, level, timestamp, start, end):
+        return timestamp + level.width > start and timestamp < end if level.width else start <= timestamp < end
+
+
+    def _read(self, level, lo, hi, start, end):
+        make = RawRecord if level.width == 0 else Rollup
+        records = [make(*level.file.read(index)) for index in range(lo, hi)]
+        records.extend(make(*record) for record in level.pending if self._in_range(level, record[0], start, end))
+        return records
+
+
+    def _feed(self, level, record):
+        """
+        Adds a record of the finer level to the accumulator of this level, emitting the rollup of the
+        current bucket when the record falls in a later one
+        """
+        if level is None:
+            return
+
+        bucket = math.floor(record[0] / level.width) * level.width
+        accumulator = level.accumulator
+
+        if accumulator is not None and bucket != accumulator.start:
+            rollup = accumulator.rollup()
+            level.pending.append(rollup)
+            self._feed(level.coarser, rollup)
+            accumulator = None
+
+        if accumulator is None:
+            accumulator = level.accumulator = _Accumulator(bucket)
+
+        if level.finer_is_raw:
+            accumulator.add_raw(record)
+
+        else:
+            accumulator.add_rollup(record)
+
+
+    def _recover(self):
+        """
+        Rebuilds the open buckets after reopening, from the records of the finer levels which haven't been
+        rolled up yet. Coarse levels are rebuilt first, so rollups emitted while rebuilding a finer level are
+        added after the records they follow.
+        """
+        for finer, level in reversed(list(zip(self._levels, self._levels[1:]))):
+            count = len(level.file)
+            resume = level.file.timestamp(count - 1) + level.width if count else -math.inf
+
+            for index in range(finer.file.bisect(resume), len(finer.file)):
+                self._feed(level, finer.file.read(index))
+
+
+def _float(value):
+    return math.nan if value is None else value
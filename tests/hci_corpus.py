@@ -0,0 +1,46 @@
+import os
+import struct
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'hci_adv_reports.txt')
+
+
+def load_corpus(path=CORPUS_PATH):
+    """
+    Loads the recorded HCI packets, one hex encoded packet per line
+    """
+    with open(path, 'r') as corpus:
+        return [bytes.fromhex(line) for line in corpus.read().splitlines() if line and not line.startswith('#')]
+
+
+def legacy_decode_packet(pkt):
+    """
+    The original parse_events decoding of a single packet, kept as reference for the tests and benchmarks
+    """
+    def number(pkt):
+        integer = 0
+        multiple = 256
+        for c in pkt:
+            integer += c * multiple
+            multiple = 1
+        return integer
+
+    def string(pkt):
+        string = ''
+        for c in pkt:
+            string += '%02x' % c
+        return string
+
+    beacons = []
+    ptype, event, plen = struct.unpack('BBB', pkt[:3])
+
+    if event == 0x3e and pkt[3] == 0x02:
+        pkt = pkt[4:]
+        for i in range(0, pkt[0]):
+            beacons.append({
+                'uuid': string(pkt[-22:-6]),
+                'minor': number(pkt[-4:-2]),
+                'major': number(pkt[-6:-4])
+            })
+
+    return beacons
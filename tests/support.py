@@ -0,0 +1,37 @@
+"""
+The application is started from within the fermentation directory (python Main.py), so the modules
+import each other as top level modules, e.g. `from Drivers.Tilt.blescan import ...`.
+Importing this module puts the same directory on the path, under pytest as well as unittest discovery, so test
+modules import it before the modules under test.
+"""
+import os
+import sys
+from unittest.mock import MagicMock
+
+
+FERMENTATION = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'fermentation'))
+
+if FERMENTATION not in sys.path:
+    sys.path.insert(0, FERMENTATION)
+
+
+def mock_rpi():
+    """
+    Installs a mock RPi.GPIO module when it can't be imported, i.e. when not running on a Raspberry Pi
+    """
+    try:
+        import RPi.GPIO
+    except (ImportError, RuntimeError):
+        sys.modules['RPi.GPIO'] = MagicMock()
+        sys.modules['RPi'] = MagicMock(GPIO=sys.modules['RPi.GPIO'])
+
+
+def mock_bluetooth():
+    """
+    Installs a mock bluetooth module when pybluez is not installed
+    """
+    try:
+        import bluetooth._bluetooth
+    except ImportError:
+        sys.modules['bluetooth'] = MagicMock()
+        sys.modules['bluetooth._bluetooth'] = MagicMock()
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import support
+from ConfigWatcher import ConfigWatcher
+
+
+class TestConfigWatcher(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'configuration.yaml')
+        self._write(self.path, 'setpoint: 18.0\n')
+        self.changes = 0
+
+
+    def _write(self, path, text):
+        with open(path, 'w') as config_file:
+            config_file.write(text)
+
+
+    def _on_change(self):
+        self.changes += 1
+
+
+    def _watch(self, change, use_inotify):
+        """
+        Runs the watcher, makes the change once it is watching, and returns once the change was reported
+        """
+        watcher = ConfigWatcher(self.path, self._on_change, poll_interval=0.01, settle_time=0.01)
+
+        async def run():
+            task = asyncio.ensure_future(watcher.run(use_inotify))
+            await asyncio.sleep(0.05)
+            change()
+
+            for i in range(200):
+                if self.changes:
+                    break
+
+                await asyncio.sleep(0.01)
+
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(run())
+
+
+    def test_check(self):
+        watcher = ConfigWatcher(self.path, self._on_change)
+        self.assertFalse(watcher.check())
+
+        self._write(self.path, 'setpoint: 12.0\n')
+        self.assertTrue(watcher.check())
+        self.assertFalse(watcher.check())
+        self.assertEqual(self.changes, 1)
+
+        # a missing file is reported once it is back
+        os.remove(self.path)
+        self.assertFalse(watcher.check())
+
+
+    def test_exception(self):
+        watcher = ConfigWatcher(self.path, lambda: 1 / 0)
+        self._write(self.path, 'setpoint: 12.0\n')
+
+        with self.assertLogs('ConfigWatcher', 'ERROR'):
+            self.assertTrue(watcher.check())
+
+
+    def test_poll(self):
+        self._watch(lambda: self._write(self.path, 'setpoint: 12.0\n'), use_inotify=False)
+        self.assertEqual(self.changes, 1)
+
+
+    def test_inotify_rename(self):
+        def replace():
+            self._write(self.path + '.tmp', 'setpoint: 12.0\n')
+            os.replace(self.path + '.tmp', self.path)
+
+        self._watch(replace, use_inotify=True)
+        self.assertEqual(self.changes, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
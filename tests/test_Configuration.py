@@ -0,0 +1,256 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+from unittest.mock import patch
+import support
+from Configuration import (default_configuration, chamber_configurations, compile_configuration, import_configuration,
+                           ConfigurationError, Max31865Configuration, TiltConfiguration, SensorConfiguration)
+
+
+REPOSITORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def document():
+    return {
+        'gpio': {'backend': 'rpi'},
+        'chambers': [{
+            'name': 'fermenter',
+            'setpoint': 18,
+            'fridge_temperature': {'type': 'max31865', 'offset': 0.0, 'pins': {'cs': 8, 'miso': 9, 'mosi': 10, 'clk': 11}},
+            'beer_temperature': {'type': 'tilt', 'colour': 'purple', 'sample_period': 15.0},
+            'compressor_relay': {'type': 'ssr', 'pin': 18, 'active_high': True},
+        }]
+    }
+
+
+class TestChamberConfigurations(unittest.TestCase):
+
+    def test_default(self):
+        chambers = default_configuration().chambers
+        self.assertEqual([chamber.name for chamber in chambers], ['fermenter'])
+        self.assertEqual(chambers[0].beer_temperature.type, 'tilt')
+
+
+    def test_single_chamber_layout(self):
+        config = {
+            'gpio': {'backend': 'rpi'},
+            'beer_temperature': {'type': 'tilt', 'colour': 'red'},
+            'fridge_temperature': {'type': 'max31865'},
+            'compressor_relay': {'type': 'ssr', 'pin': 18, 'active_high': True},
+        }
+
+        chambers = chamber_configurations(config)
+        self.assertEqual(len(chambers), 1)
+        self.assertEqual(chambers[0]['name'], 'default')
+        self.assertEqual(chambers[0]['beer_temperature']['colour'], 'red')
+        self.assertNotIn('gpio', chambers[0])
+
+
+    def test_chambers(self):
+        config = {'chambers': [{'name': 'ale'}, {'name': 'lager'}]}
+        self.assertEqual([chamber['name'] for chamber in chamber_configurations(config)], ['ale', 'lager'])
+
+
+class TestCompile(unittest.TestCase):
+
+    def _assert_invalid(self, config, message):
+        with self.assertRaises(ConfigurationError) as context:
+            compile_configuration(config)
+
+        self.assertIn(message, str(context.exception))
+
+
+    def test_model(self):
+        config = compile_configuration(document())
+        chamber = config.chambers[0]
+
+        # defaults are filled in, and numbers are floats where floats are expected
+        self.assertEqual((chamber.setpoint, chamber.hysteresis, chamber.heater_relay), (18.0, 0.5, None))
+        self.assertIsInstance(chamber.setpoint, float)
+        self.assertIsInstance(chamber.fridge_temperature, Max31865Configuration)
+        self.assertEqual((chamber.fridge_temperature.transport, chamber.fridge_temperature.pins.miso), ('bitbang', 9))
+        self.assertIsInstance(chamber.beer_temperature, TiltConfiguration)
+        self.assertEqual(chamber.beer_temperature.max_age, 150.0)
+
+        # the model is immutable and compares by value
+        with self.assertRaises(AttributeError):
+            chamber.setpoint = 12.0
+
+        self.assertEqual(config, compile_configuration(document()))
+        self.assertEqual(compile_configuration({'chambers': []}).chambers, ())
+
+
+    def test_plugin_types(self):
+        config = document()
+        config['chambers'][0]['beer_temperature'] = {'type': 'ds18b20', 'address': '28-0000', 'offset': -0.5}
+        sensor = compile_configuration(config).chambers[0].beer_temperature
+
+        self.assertIs(type(sensor), SensorConfiguration)
+        self.assertEqual((sensor.offset, dict(sensor.options)), (-0.5, {'address': '28-0000'}))
+
+
+    def test_profile(self):
+        config = document()
+        config['chambers'][0]['profile'] = {
+            'start': '2026-10-17T08:00:00+00:00',
+            'segments': [{'type': 'hold', 'temperature': 18, 'days': 5}, {'type': 'ramp', 'temperature': 21, 'hours': 36}],
+        }
+        profile = compile_configuration(config).chambers[0].profile
+
+        self.assertEqual(profile.start, datetime(2026, 10, 17, 8, tzinfo=timezone.utc).timestamp())
+        self.assertEqual([(segment.type, segment.temperature, segment.days, segment.hours) for segment in profile.segments],
+                         [('hold', 18.0, 5, 0.0), ('ramp', 21.0, 0.0, 36)])
+
+        config['chambers'][0]['profile'] = {'segments': [{'type': 'ramp', 'temperature': 21, 'days': 2}]}
+        self._assert_invalid(config, 'chambers[0].profile.segments[0] must be a hold')
+
+        config['chambers'][0]['profile'] = {'segments': [{'type': 'hold', 'temperature': 21}]}
+        self._assert_invalid(config, 'chambers[0].profile.segments[0] needs a duration')
+
+        config['chambers'][0]['profile'] = {'start': 'next week', 'segments': [{'type': 'hold', 'temperature': 21, 'days': 1}]}
+        self._assert_invalid(config, "chambers[0].profile.start has an invalid value 'next week'")
+
+
+    def test_chamber_values(self):
+        config = document()
+        config['chambers'][0]['hysteresis'] = -1
+        self._assert_invalid(config, 'chambers[0].hysteresis must not be negative, not -1')
+
+        config = document()
+        config['chambers'][0]['setpoint'] = 'cold'
+        self._assert_invalid(config, "chambers[0].setpoint has an invalid value 'cold'")
+
+        config = document()
+        del config['chambers'][0]['compressor_relay']
+        self._assert_invalid(config, 'chambers[0].compressor_relay is missing')
+
+
+    def test_driver_values(self):
+        config = document()
+        config['chambers'][0]['compressor_relay']['pin'] = True
+        self._assert_invalid(config, 'chambers[0].compressor_relay.pin has an invalid value True')
+
+        config = document()
+        config['chambers'][0]['fridge_temperature']['transport'] = 'i2c'
+        self._assert_invalid(config, "chambers[0].fridge_temperature.transport must be bitbang or spidev, not 'i2c'")
+
+        config = document()
+        del config['chambers'][0]['fridge_temperature']['pins']
+        self._assert_invalid(config, 'chambers[0].fridge_temperature.pins is missing')
+
+        config = document()
+        config['chambers'][0]['fridge_temperature']['pins']['clk'] = -1
+        self._assert_invalid(config, 'chambers[0].fridge_temperature.pins.clk must not be negative')
+
+        config = document()
+        config['chambers'][0]['beer_temperature']['colour'] = 'purpel'
+        self._assert_invalid(config, "chambers[0].beer_temperature.colour must be red or green")
+
+        config = document()
+        del config['chambers'][0]['beer_temperature']['type']
+        self._assert_invalid(config, 'chambers[0].beer_temperature.type is missing')
+
+
+    def test_sections(self):
+        self._assert_invalid({'gpio': {'backend': 'sysfs'}, 'chambers': []}, "gpio.backend must be rpi or gpiomem, not 'sysfs'")
+        self._assert_invalid({'state': {}, 'chambers': []}, 'state.path is missing')
+        self._assert_invalid({'chambers': {'name': 'ale'}}, 'chambers has an invalid value')
+        self._assert_invalid([], 'configuration must be a mapping')
+
+
+    def test_duplicate_names(self):
+        config = document()
+        config['chambers'].append(config['chambers'][0])
+        self._assert_invalid(config, "chambers[1].name 'fermenter' is used by more than one chamber")
+
+
+    def test_kernel_filters(self):
+        config = document()
+        config['chambers'].append(dict(config['chambers'][0], name='lager',
+                                       beer_temperature={'type': 'tilt', 'colour': 'red', 'kernel_filter': 'tilt'}))
+        compile_configuration(config)
+
+        config['chambers'][0]['beer_temperature']['kernel_filter'] = 'ibeacon'
+        self._assert_invalid(config, 'kernel_filter of the Tilt sensors must be the same, not ibeacon and tilt')
+
+
+class TestImport(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.cache_directory = os.path.join(self.directory, 'cache')
+
+
+    def _write(self, text):
+        path = os.path.join(self.directory, 'configuration.yaml')
+
+        with open(path, 'w') as yamlfile:
+            yamlfile.write(text)
+
+        return path
+
+
+    def test_repository_configuration(self):
+        config = import_configuration(os.path.join(REPOSITORY, 'configuration.yaml'), self.cache_directory)
+        self.assertEqual(config.chambers[0].fridge_temperature.conversion_mode, 'continuous')
+
+
+    def test_cache(self):
+        path = self._write('chambers: []\n')
+        self.assertEqual(import_configuration(path, self.cache_directory).chambers, ())
+
+        # unchanged files are loaded from the cache without parsing
+        with patch('Configuration._parse_yaml') as parse_yaml:
+            self.assertEqual(import_configuration(path, self.cache_directory).chambers, ())
+
+        parse_yaml.assert_not_called()
+
+        # a changed file is parsed again
+        path = self._write('gpio: {backend: gpiomem}\nchambers: []\n')
+        self.assertEqual(import_configuration(path, self.cache_directory).gpio.backend, 'gpiomem')
+
+
+    def test_cached_timestamp(self):
+        # YAML timestamps are loaded as datetimes, which are cached in their ISO format
+        path = self._write('chambers:\n'
+                           '  - name: ale\n'
+                           '    fridge_temperature: {type: tilt, colour: red}\n'
+                           '    beer_temperature: {type: tilt, colour: red}\n'
+                           '    compressor_relay: {type: ssr, pin: 18, active_high: true}\n'
+                           '    profile:\n'
+                           '      start: 2026-10-17 08:00:00\n'
+                           '      segments: [{type: hold, temperature: 18, days: 14}]\n')
+        parsed = import_configuration(path, self.cache_directory)
+
+        with patch('Configuration._parse_yaml') as parse_yaml:
+            self.assertEqual(import_configuration(path, self.cache_directory), parsed)
+
+        parse_yaml.assert_not_called()
+        self.assertEqual(parsed.chambers[0].profile.start, datetime(2026, 10, 17, 8).timestamp())
+
+
+    def test_unwritable_cache(self):
+        path = self._write('chambers: []\n')
+
+        # a file where the cache directory should be
+        open(self.cache_directory, 'w').close()
+        self.assertEqual(import_configuration(path, self.cache_directory).chambers, ())
+
+
+    def test_invalid_yaml(self):
+        path = self._write('chambers: [name: ale\n')
+
+        with self.assertRaisesRegex(ConfigurationError, 'is not valid YAML'):
+            import_configuration(path, self.cache_directory)
+
+        path = self._write('')
+
+        with self.assertRaisesRegex(ConfigurationError, 'configuration must be a mapping'):
+            import_configuration(path, self.cache_directory)
+
+
+if __name__ == '__main__':
+    unittest.main()
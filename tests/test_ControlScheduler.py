@@ -0,0 +1,117 @@
+import asyncio
+import os
+import signal
+import time
+import unittest
+from unittest.mock import Mock
+import support
+from ControlScheduler import ControlScheduler, TickStatistics
+
+
+class TestControlScheduler(unittest.TestCase):
+
+    def _run(self, scheduler):
+        asyncio.run(scheduler.run())
+
+
+    def test_drift_free(self):
+        ticks = []
+
+        def tick():
+            ticks.append(time.monotonic())
+            time.sleep(0.01)
+
+            if len(ticks) == 10:
+                scheduler.stop()
+
+        scheduler = ControlScheduler(tick, period=0.03)
+        start = time.monotonic()
+        self._run(scheduler)
+
+        # the time spent in each tick doesn't add to the period
+        self.assertLess(ticks[-1] - start, 10 * 0.03 + 0.05)
+        self.assertGreaterEqual(ticks[-1] - start, 10 * 0.03)
+        self.assertEqual(scheduler.stats.ticks, 10)
+        self.assertEqual(scheduler.stats.overruns, 0)
+        self.assertGreaterEqual(scheduler.stats.max_jitter, 0.0)
+
+
+    def test_overrun(self):
+        def tick():
+            time.sleep(0.05)
+
+            if scheduler.stats.ticks == 2:
+                scheduler.stop()
+
+        scheduler = ControlScheduler(tick, period=0.02)
+        self._run(scheduler)
+
+        self.assertEqual(scheduler.stats.ticks, 3)
+        self.assertEqual(scheduler.stats.overruns, 3)
+        self.assertGreaterEqual(scheduler.stats.missed_ticks, 6)
+
+
+    def test_exception(self):
+        def tick():
+            raise IOError('sensor gone')
+
+        with self.assertRaises(IOError):
+            self._run(ControlScheduler(tick, period=0.01))
+
+
+    def test_background_failure(self):
+        ticks = []
+
+        async def sample():
+            await asyncio.sleep(0.03)
+            raise IOError('sampler failed')
+
+        scheduler = ControlScheduler(lambda: ticks.append(None), period=0.01, sampler=Mock(run_async=sample))
+
+        # the failure is logged when it happens, stops ticking and is raised from run()
+        with self.assertLogs('ControlScheduler', 'ERROR') as logs:
+            with self.assertRaisesRegex(IOError, 'sampler failed'):
+                self._run(scheduler)
+
+        self.assertIn('sample failed, stopping', logs.output[0])
+        self.assertLess(len(ticks), 10)
+
+
+    def test_sigterm(self):
+        def tick():
+            os.kill(os.getpid(), signal.SIGTERM)
+
+        previous = signal.getsignal(signal.SIGTERM)
+        scheduler = ControlScheduler(tick, period=0.01)
+        self._run(scheduler)
+
+        self.assertEqual(scheduler.stats.ticks, 1)
+        self.assertEqual(signal.getsignal(signal.SIGTERM), previous)
+
+
+    def test_stopped_before_run(self):
+        scheduler = ControlScheduler(lambda: None, period=0.01)
+        scheduler.stop()
+        self._run(scheduler)
+        self.assertEqual(scheduler.stats.ticks, 0)
+
+
+class TestTickStatistics(unittest.TestCase):
+
+    def test_statistics(self):
+        stats = TickStatistics()
+        self.assertEqual(stats.mean_jitter(), 0.0)
+
+        stats.record_tick(0.001, 0.010)
+        stats.record_tick(0.003, 0.002)
+        stats.record_overrun(2)
+
+        self.assertAlmostEqual(stats.mean_jitter(), 0.002)
+        self.assertEqual(stats.max_jitter, 0.003)
+        self.assertEqual(stats.max_duration, 0.010)
+        self.assertEqual((stats.overruns, stats.missed_ticks), (1, 2))
+        self.assertIn('2 ticks', str(stats))
+
+
+if __name__ == '__main__':
+    unittest.main()
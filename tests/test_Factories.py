@@ -0,0 +1,75 @@
+import subprocess
+import sys
+import unittest
+from unittest.mock import Mock, patch
+from support import FERMENTATION
+from Configuration import SensorConfiguration, RelayConfiguration
+from Drivers import Factories
+from Drivers.Factories import temperature_factory, relay_factory, register_temperature_sensor, cleanup_drivers
+
+
+class TestFactories(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.dict(Factories._temperature_sensors)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_unknown_type(self):
+        with patch.object(Factories, '_load_entry_point', return_value=None):
+            with self.assertRaisesRegex(Exception, 'Unknown temperature sensor type, ds18b20'):
+                temperature_factory(SensorConfiguration(type='ds18b20'))
+
+            with self.assertRaisesRegex(Exception, 'Unknown relay type, mechanical'):
+                relay_factory(RelayConfiguration(type='mechanical'))
+
+
+    def test_register(self):
+        sensor = Mock()
+        factory = Mock(return_value=sensor)
+        gpio = Mock()
+        register_temperature_sensor('ds18b20', factory)
+
+        config = SensorConfiguration(type='ds18b20', options={'id': '28-01'})
+        self.assertIs(temperature_factory(config, gpio), sensor)
+        factory.assert_called_once_with(config, gpio)
+
+
+    def test_entry_point(self):
+        factory = Mock(return_value=Mock())
+        entry_point = Mock()
+        entry_point.name = 'ds18b20'
+        entry_point.load.return_value = factory
+        entry_points = Mock()
+        entry_points.select.return_value = [entry_point]
+
+        with patch('importlib.metadata.entry_points', return_value=entry_points):
+            temperature_factory(SensorConfiguration(type='ds18b20'))
+            temperature_factory(SensorConfiguration(type='ds18b20'))
+
+        entry_points.select.assert_called_once_with(group=Factories.TEMPERATURE_SENSOR_ENTRY_POINTS)
+        entry_point.load.assert_called_once()
+        self.assertEqual(factory.call_count, 2)
+
+
+    def test_cleanup(self):
+        tilt = Mock(spec=['temperature', 'destroy'])
+        relay = Mock(spec=['on', 'off'])
+        sensor = Mock(spec=['temperature'])
+
+        cleanup_drivers({'tilt': tilt, 'relay': relay, 'sensor': sensor})
+
+        tilt.destroy.assert_called_once()
+        relay.off.assert_called_once()
+
+
+    def test_lazy_imports(self):
+        statement = ('import sys; import Main; '
+                     'print(sorted(m for m in ("RPi", "bluetooth", "yaml", "numpy", "http.server", "Drivers.Tilt.Tilt") if m in sys.modules))')
+        output = subprocess.run([sys.executable, '-c', statement], cwd=FERMENTATION, capture_output=True, text=True, check=True)
+        self.assertEqual(output.stdout.strip(), '[]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import os
+import struct
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from support import mock_rpi
+
+mock_rpi()
+
+from Drivers.GpioBackend import MemoryMappedGpioBackend, RPiGpioBackend
+from Drivers.SPI import BitBangSPI
+from Drivers.SolidStateRelay import SolidStateRelay
+
+
+class TestMemoryMappedGpioBackend(unittest.TestCase):
+    """
+    Runs the backend against a fake register file mapped from a regular file
+    """
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        os.write(fd, bytes(MemoryMappedGpioBackend.BLOCK_SIZE))
+        os.close(fd)
+        self.addCleanup(os.remove, self.path)
+        self.gpio = MemoryMappedGpioBackend(path=self.path)
+        self.addCleanup(self.gpio.cleanup)
+
+
+    def _register(self, offset):
+        with open(self.path, 'rb') as registers:
+            registers.seek(offset)
+            return struct.unpack('I', registers.read(4))[0]
+
+
+    def test_setup(self):
+        self.gpio.setup_output(18)
+        self.gpio.setup_output(11)
+        self.gpio.setup_input(9)
+        self.assertEqual(self._register(0x04), (0b001 << 24) | (0b001 << 3))
+        self.gpio.setup_input(18)
+        self.assertEqual(self._register(0x04), 0b001 << 3)
+
+
+    def test_write(self):
+        self.gpio.write(18, True)
+        self.assertEqual(self._register(MemoryMappedGpioBackend.GPSET0), 1 << 18)
+        self.gpio.write(17, False)
+        self.assertEqual(self._register(MemoryMappedGpioBackend.GPCLR0), 1 << 17)
+
+
+    def test_write_pins(self):
+        self.gpio.write_pins((1 << 10) | (1 << 11), 1 << 8)
+        self.assertEqual(self._register(MemoryMappedGpioBackend.GPSET0), (1 << 10) | (1 << 11))
+        self.assertEqual(self._register(MemoryMappedGpioBackend.GPCLR0), 1 << 8)
+
+
+    def test_read(self):
+        with open(self.path, 'r+b') as registers:
+            registers.seek(MemoryMappedGpioBackend.GPLEV0)
+            registers.write(struct.pack('I', 1 << 9))
+
+        self.assertEqual(self.gpio.read(9), 1)
+        self.assertEqual(self.gpio.read(10), 0)
+
+
+    def test_relay(self):
+        relay = SolidStateRelay(18, active_high=False, gpio=self.gpio)
+        self.assertEqual(self._register(MemoryMappedGpioBackend.GPSET0), 1 << 18)
+        relay.on()
+        self.assertEqual(self._register(MemoryMappedGpioBackend.GPCLR0), 1 << 18)
+
+
+class TestRPiGpioBackend(unittest.TestCase):
+
+    def test_write_pins(self):
+        gpio = MagicMock()
+        RPiGpioBackend(gpio).write_pins((1 << 10) | (1 << 11), 1 << 8)
+        self.assertEqual(gpio.output.call_args_list, [((10, gpio.HIGH),), ((11, gpio.HIGH),), ((8, gpio.LOW),)])
+
+
+    def test_bitbang_clock_and_data_together(self):
+        gpio = MagicMock()
+        gpio.read.return_value = 1
+        spi = BitBangSPI(cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11, gpio=gpio)
+        gpio.reset_mock()
+
+        self.assertEqual(spi.transfer([0b10000000]), [0xff])
+
+        # clock rises together with the data bit, one call for each edge
+        self.assertEqual(gpio.write_pins.call_args_list[0], (((1 << 11) | (1 << 10),),))
+        self.assertEqual(gpio.write_pins.call_args_list[1], ((0, 1 << 11),))
+        self.assertEqual(gpio.write_pins.call_args_list[2], ((1 << 11, 1 << 10),))
+        self.assertEqual(gpio.write_pins.call_count, 16)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import math
+import unittest
+from unittest.mock import Mock
+import support
+from History import History
+from Drivers.Clock import SimulatedClock
+from TemperatureControl import TemperatureControl, COMPRESSOR_MIN_OFF_TIME_SEC
+
+
+class TestHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.history = History(capacity=4)
+
+
+    def _append(self, count, start=0):
+        for i in range(start, start + count):
+            self.history.append(float(i), 20.0 + i, 10.0 + i, 15.0, i % 4, i % 2)
+
+
+    def test_empty(self):
+        self.assertEqual(len(self.history), 0)
+        self.assertEqual(len(self.history.last(10).timestamp), 0)
+
+
+    def test_last(self):
+        self._append(3)
+        view = self.history.last(2)
+        self.assertEqual(view.timestamp.tolist(), [1.0, 2.0])
+        self.assertEqual(view.beer_temperature.tolist(), [21.0, 22.0])
+        self.assertEqual(view.state.tolist(), [1, 2])
+        self.assertEqual(view.relay.tolist(), [1, 0])
+        self.assertEqual(self.history.last(10).timestamp.tolist(), [0.0, 1.0, 2.0])
+
+
+    def test_wrap_around(self):
+        for count in range(1, 11):
+            self._append(1, start=count - 1)
+            expected = [float(i) for i in range(max(0, count - 4), count)]
+            self.assertEqual(self.history.last(4).timestamp.tolist(), expected)
+
+        self.assertEqual(len(self.history), 4)
+
+
+    def test_views_share_storage(self):
+        self._append(2)
+        view = self.history.last(2).fridge_temperature
+        self.assertIsInstance(view, memoryview)
+        self.assertIs(view.obj, self.history._arrays[2])
+
+
+    def test_since(self):
+        self._append(7)
+        self.assertEqual(self.history.since(4.5).timestamp.tolist(), [5.0, 6.0])
+        self.assertEqual(self.history.since(5.0).timestamp.tolist(), [5.0, 6.0])
+        self.assertEqual(self.history.since(0.0).timestamp.tolist(), [3.0, 4.0, 5.0, 6.0])
+        self.assertEqual(len(self.history.since(7.0).timestamp), 0)
+
+
+    def test_missing_temperature(self):
+        self.history.append(0.0, None, 4.0, 15.0, 1, False)
+        self.assertTrue(math.isnan(self.history.last(1).beer_temperature[0]))
+
+
+    def test_memory_usage(self):
+        history = History(capacity=1000)
+        self.assertEqual(history.memory_usage(), 2 * 1000 * (8 + 4 + 4 + 4 + 1 + 1))
+
+        with self.assertRaises(ValueError):
+            History(capacity=0)
+
+
+class TestControllerHistory(unittest.TestCase):
+
+    def test_appended_each_tick(self):
+        clock = SimulatedClock(epoch=1000.0)
+        fridge_temp = Mock()
+        fridge_temp.temperature.return_value = 25.0
+        beer_temp = Mock()
+        beer_temp.temperature.return_value = 20.0
+        relay = Mock()
+        relay.elapsed_time.return_value = COMPRESSOR_MIN_OFF_TIME_SEC + 1
+        relay.state.return_value = True
+
+        history = History(capacity=10)
+        temp_control = TemperatureControl(fridge_temp, beer_temp, relay, clock=clock, history=history)
+        temp_control.set_temperature_setpoint(20.0)
+        temp_control.start()
+
+        for i in range(3):
+            temp_control.control_loop()
+            clock.advance(1.0)
+
+        view = history.last(3)
+        self.assertIs(temp_control.history(), history)
+        self.assertEqual(view.timestamp.tolist(), [1000.0, 1001.0, 1002.0])
+        self.assertEqual(view.fridge_temperature.tolist(), [25.0] * 3)
+        self.assertEqual(view.fridge_setpoint.tolist(), [20.0] * 3)
+        self.assertEqual(view.state.tolist(), [TemperatureControl.state_codes['cooling']] * 3)
+        self.assertEqual(view.relay.tolist(), [1] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
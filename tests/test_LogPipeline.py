@@ -0,0 +1,108 @@
+import logging
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+import support
+from LogPipeline import LogPipeline, DroppingQueueHandler
+from TemperatureControl import TemperatureControl
+
+
+class TestDroppingQueueHandler(unittest.TestCase):
+
+    def _record(self, message):
+        return logging.LogRecord('test', logging.INFO, __file__, 0, message, None, None)
+
+
+    def test_drop_and_report(self):
+        import queue
+        handler = DroppingQueueHandler(queue.Queue(maxsize=2))
+
+        for i in range(5):
+            handler.handle(self._record(f'message {i}'))
+
+        self.assertEqual(handler.dropped, 3)
+        self.assertEqual([handler.queue.get_nowait().getMessage() for i in range(2)], ['message 0', 'message 1'])
+
+        handler.handle(self._record('message 5'))
+        self.assertEqual(handler.queue.get_nowait().getMessage(), '3 log records dropped, queue full')
+        self.assertEqual(handler.queue.get_nowait().getMessage(), 'message 5')
+        self.assertEqual(handler.dropped, 3)
+
+
+    def test_formatted_by_listener(self):
+        import queue
+        handler = DroppingQueueHandler(queue.Queue())
+        record = logging.LogRecord('test', logging.INFO, __file__, 0, 'tick %d', (1,), None)
+        handler.handle(record)
+
+        # queued as it is, leaving the message to be formatted by the listener thread
+        queued = handler.queue.get_nowait()
+        self.assertIs(queued, record)
+        self.assertEqual((queued.msg, queued.args), ('tick %d', (1,)))
+
+
+class TestLogPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.logpath = os.path.join(self.directory, 'fermentation.log')
+
+
+    def test_rotating_file(self):
+        root = logging.getLogger()
+        handlers = root.handlers[:]
+        pipeline = LogPipeline(self.logpath, loglevel=logging.INFO, max_bytes=500, backup_count=2)
+        pipeline.start()
+
+        try:
+            self.assertEqual(root.handlers, [pipeline.handler])
+            logger = logging.getLogger('pipeline')
+
+            for i in range(50):
+                logger.info(f'line {i}')
+
+            logger.debug('not written')
+
+        finally:
+            pipeline.stop()
+
+        self.assertEqual(root.handlers, handlers)
+        self.assertEqual(sorted(os.listdir(self.directory)), ['fermentation.log', 'fermentation.log.1', 'fermentation.log.2'])
+
+        with open(self.logpath) as logfile:
+            lines = logfile.read().splitlines()
+
+        self.assertTrue(lines[-1].endswith('INFO - pipeline - line 49'))
+        self.assertEqual(pipeline.dropped(), 0)
+
+
+class TestControlLoopLogging(unittest.TestCase):
+
+    def test_debug_line_skipped(self):
+        sensor = Mock()
+        sensor.temperature.return_value = 20.0
+        relay = Mock()
+        relay.elapsed_time.return_value = 0
+        temp_control = TemperatureControl(sensor, sensor, relay, name='guard')
+        temp_control.set_temperature_setpoint(20.0)
+        temp_control.start()
+        logger = logging.getLogger('TemperatureControl.guard')
+
+        logger.setLevel(logging.INFO)
+        self.addCleanup(logger.setLevel, logging.NOTSET)
+        temp_control.control_loop()
+        relay.elapsed_time.assert_not_called()
+
+        logger.setLevel(logging.DEBUG)
+
+        with self.assertLogs(logger, logging.DEBUG):
+            temp_control.control_loop()
+
+        relay.elapsed_time.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+import unittest
+from unittest.mock import patch
+from support import mock_rpi
+
+mock_rpi()
+
+import Drivers.MAX31865
+from Drivers.MAX31865 import MAX31865, MAX31865FaultError, resistance_to_celsius, rtd_lookup_table, codes_to_celsius
+from Drivers.SPI import BitBangSPI, HardwareSPI
+from Drivers.GpioBackend import RPiGpioBackend
+from Drivers.Fakes.FakeMAX31865 import FakeMAX31865, FakeSpiDev, FakeGPIO
+
+
+class MAX31865TestCase:
+    """
+    Tests run against each SPI transport
+    """
+
+    def setUp(self):
+        patcher = patch('time.sleep')
+        self.mock_sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.chip = FakeMAX31865(temperature=18.5)
+
+
+    def _sensor(self, **kwargs):
+        return MAX31865(spi=self._spi(), **kwargs)
+
+
+    def test_one_shot(self):
+        sensor = self._sensor()
+        self.assertAlmostEqual(sensor.temperature(), 18.5, places=1)
+
+        # config write and a single burst read of the rtd registers
+        self.assertEqual(self.chip.transactions, 2)
+        self.assertEqual(self.chip.conversions, 1)
+        self.mock_sleep.assert_called_once_with(MAX31865.ONE_SHOT_CONVERSION_TIME_SEC)
+
+
+    def test_continuous(self):
+        sensor = self._sensor(conversion_mode='continuous')
+        self.assertEqual(self.chip.registers[0], MAX31865.REGISTER_CONFIGURATION_CONTINUOUS & ~0x02)
+        self.chip.transactions = 0
+
+        self.assertAlmostEqual(sensor.temperature(), 18.5, places=1)
+        self.chip.set_temperature(-5.0)
+        self.assertAlmostEqual(sensor.temperature(), -5.0, places=1)
+
+        # a single transaction per read
+        self.assertEqual(self.chip.transactions, 2)
+
+
+    def test_3_wire(self):
+        self._sensor(conversion_mode='continuous', number_of_wires=3)
+        self.assertEqual(self.chip.registers[0], (MAX31865.REGISTER_CONFIGURATION_CONTINUOUS | 0b00010000) & ~0x02)
+
+
+    def test_offset(self):
+        sensor = self._sensor()
+        sensor.offset(-0.5)
+        self.assertAlmostEqual(sensor.temperature(), 18.0, places=1)
+
+
+    def test_reading(self):
+        sensor = self._sensor(conversion_mode='continuous')
+        self.assertIsNone(sensor.reading().value)
+
+        temperature = sensor.temperature()
+        reading = sensor.reading()
+        self.assertEqual(reading.value, temperature)
+        self.assertIsNone(reading.gravity)
+        self.assertEqual(reading.sequence, 1)
+
+        # a failed read doesn't publish a reading
+        self.chip.fault_status = 0x80
+
+        with self.assertRaises(MAX31865FaultError):
+            sensor.temperature()
+
+        self.assertIs(sensor.reading(), reading)
+
+
+    def test_read_registers(self):
+        sensor = self._sensor()
+        self.chip.registers[3:7] = [0x12, 0x34, 0x56, 0x78]
+        self.chip.transactions = 0
+
+        self.assertEqual(sensor._read_registers()[3:7], [0x12, 0x34, 0x56, 0x78])
+        self.assertEqual(self.chip.transactions, 1)
+
+
+    def test_fault(self):
+        sensor = self._sensor(conversion_mode='continuous')
+        self.chip.fault_status = 0x80
+
+        with self.assertRaises(MAX31865FaultError) as context:
+            sensor.temperature()
+
+        self.assertEqual(str(context.exception), 'High threshold limit (Cable fault/open)')
+
+        # fault is cleared when reconfiguring
+        self.assertAlmostEqual(sensor.temperature(), 18.5, places=1)
+
+
+    def test_lookup_table(self):
+        sensor = self._sensor(conversion_mode='continuous', lookup_table=True)
+        sensor.offset(0.25)
+
+        for temperature in [-20.0, -0.3, 0.0, 4.0, 18.5, 100.0]:
+            self.chip.set_temperature(temperature)
+            self.assertAlmostEqual(sensor.temperature(), temperature + 0.25, places=1)
+
+
+class TestLookupTable(unittest.TestCase):
+
+    def test_accuracy(self):
+        for ref_resistor, rtd_nominal in [(430.0, 100.0), (4300.0, 1000.0)]:
+            table = rtd_lookup_table(ref_resistor, rtd_nominal)
+            self.assertEqual(len(table), 32768)
+
+            for code in range(0, 32768, 7):
+                expected = resistance_to_celsius(code / 32768 * ref_resistor, rtd_nominal)
+                self.assertAlmostEqual(table[code], expected, delta=1e-9)
+
+
+    def test_cached(self):
+        self.assertIs(rtd_lookup_table(430.0, 100.0), rtd_lookup_table(430.0, 100.0))
+        self.assertIsNot(rtd_lookup_table(430.0, 100.0), rtd_lookup_table(400.0, 100.0))
+
+
+    def test_codes_to_celsius(self):
+        codes = [0x1000, 0x2000, 0x2345, 0x3000]
+        expected = [resistance_to_celsius(code / 32768 * 430.0) for code in codes]
+
+        for converted, temperature in zip(codes_to_celsius(codes), expected):
+            self.assertAlmostEqual(converted, temperature, delta=1e-9)
+
+
+    @unittest.skipIf(Drivers.MAX31865._numpy() is None, 'requires numpy')
+    def test_codes_to_celsius_array(self):
+        import numpy
+        codes = numpy.array([[0x1000, 0x2000], [0x2345, 0x3000]], dtype=numpy.uint16)
+        converted = codes_to_celsius(codes)
+        self.assertEqual(converted.shape, (2, 2))
+        self.assertAlmostEqual(converted[1, 0], resistance_to_celsius(0x2345 / 32768 * 430.0), delta=1e-9)
+
+
+    def test_without_numpy(self):
+        with patch.object(Drivers.MAX31865, 'numpy', None):
+            rtd_lookup_table.cache_clear()
+            self.addCleanup(rtd_lookup_table.cache_clear)
+            table = rtd_lookup_table(430.0, 100.0)
+            self.assertAlmostEqual(table[0x2345], resistance_to_celsius(0x2345 / 32768 * 430.0), delta=1e-9)
+            self.assertIsInstance(codes_to_celsius([0x2345]), list)
+
+
+class TestMAX31865BitBang(MAX31865TestCase, unittest.TestCase):
+
+    def _spi(self):
+        self.gpio = FakeGPIO(self.chip, cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11)
+        return BitBangSPI(cs_pin=8, miso_pin=9, mosi_pin=10, clk_pin=11, gpio=RPiGpioBackend(self.gpio))
+
+
+class TestMAX31865HardwareSPI(MAX31865TestCase, unittest.TestCase):
+
+    def _spi(self):
+        self.spi_device = FakeSpiDev(self.chip)
+        return HardwareSPI(bus=0, device=1, max_speed_hz=1000000, spi_device=self.spi_device)
+
+
+    def test_open(self):
+        self._sensor()
+        self.assertEqual(self.spi_device.opened, (0, 1))
+        self.assertEqual(self.spi_device.mode, 1)
+        self.assertEqual(self.spi_device.max_speed_hz, 1000000)
+
+
+    def test_destroy(self):
+        self._sensor().destroy()
+        self.assertIsNone(self.spi_device.opened)
+
+
+if __name__ == '__main__':
+    unittest.main()
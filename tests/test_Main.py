@@ -0,0 +1,214 @@
+import unittest
+from unittest.mock import Mock, patch
+from support import mock_rpi, mock_bluetooth
+
+mock_rpi()
+mock_bluetooth()
+
+import Main
+from Configuration import compile_configuration, ApplicationConfiguration, GpioConfiguration, DEFAULT_SETPOINT, DEFAULT_HYSTERESIS
+from Sampling import SamplingScheduler
+from Drivers.MAX31865 import MAX31865
+from Drivers.SPI import HardwareSPI
+from Drivers.Fakes.FakeMAX31865 import FakeMAX31865, FakeSpiDev
+
+
+class TestChambers(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(Main, 'temperature_factory', side_effect=self._sensor)
+        self.mock_temperature_factory = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(Main, 'relay_factory', side_effect=self._relay)
+        self.mock_relay_factory = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.gpio = Mock()
+        self.sampler = SamplingScheduler()
+        self.drivers = dict()
+
+
+    def _sensor(self, config, gpio):
+        sensor = Mock(spec=['temperature'])
+        sensor.temperature.return_value = config.options['temperature']
+        return sensor
+
+
+    def _relay(self, config, gpio, initial_state=False):
+        relay = Mock(name=f'relay{config.pin}')
+        relay.state.return_value = initial_state
+        return relay
+
+
+    def _chamber(self, name, pin, beer_temperature=None, fridge_temperature=None, **kwargs):
+        config = {
+            'name': name,
+            'beer_temperature': dict({'type': 'fake', 'temperature': 20.0, 'sample_period': 15.0}, **(beer_temperature or {})),
+            'fridge_temperature': dict({'type': 'fake', 'temperature': 10.0}, **(fridge_temperature or {})),
+            'compressor_relay': {'type': 'ssr', 'pin': pin, 'active_high': True},
+        }
+        config['compressor_relay'].update(kwargs.pop('compressor_relay', {}))
+        config.update(kwargs)
+        return compile_configuration({'chambers': [config]}).chambers[0]
+
+
+    def test_chambers(self):
+        ale = Main.create_chamber(self._chamber('ale', 18, setpoint=19.0, hysteresis=0.3), self.gpio, self.sampler, self.drivers)
+        lager = Main.create_chamber(self._chamber('lager', 20), self.gpio, self.sampler, self.drivers)
+
+        self.assertEqual(sorted(self.drivers), ['ale.beer_temp', 'ale.compressor_relay', 'ale.fridge_temp',
+                                                'lager.beer_temp', 'lager.compressor_relay', 'lager.fridge_temp'])
+        self.assertEqual((ale.name, ale.setpoint(), ale._hysteresis), ('ale', 19.0, 0.3))
+        self.assertEqual((lager.name, lager.setpoint(), lager._hysteresis), ('lager', DEFAULT_SETPOINT, DEFAULT_HYSTERESIS))
+        self.assertEqual(ale._logger.name, 'TemperatureControl.ale')
+
+        # sensors share the GPIO backend and the sampler
+        for call in self.mock_temperature_factory.call_args_list:
+            self.assertIs(call.args[1], self.gpio)
+
+        self.assertEqual(sorted(sampled.name for _, _, sampled in self.sampler._queue),
+                         ['ale.beer_temp', 'ale.fridge_temp', 'lager.beer_temp', 'lager.fridge_temp'])
+
+
+    def test_setpoint_override(self):
+        ale = Main.create_chamber(self._chamber('ale', 18, setpoint=19.0), self.gpio, self.sampler, self.drivers, setpoint=12.0)
+        self.assertEqual(ale.setpoint(), 12.0)
+
+
+    def test_profile(self):
+        profile = {'start': 1000000.0, 'segments': [{'type': 'hold', 'temperature': 18.0, 'days': 5},
+                                                    {'type': 'ramp', 'temperature': 21.0, 'days': 2}]}
+        ale = Main.create_chamber(self._chamber('ale', 18, profile=profile), self.gpio, self.sampler, self.drivers)
+        self.assertEqual(ale.profile().breakpoints(), [(0.0, 18.0), (5 * 86400.0, 18.0), (7 * 86400.0, 21.0)])
+        self.assertEqual(ale.profile().start, 1000000.0)
+
+        # an overridden setpoint replaces the profile
+        lager = Main.create_chamber(self._chamber('lager', 20, profile=profile), self.gpio, self.sampler, self.drivers,
+                                    setpoint=10.0)
+        self.assertIsNone(lager.profile())
+
+        # removing the profile restores the configured setpoint
+        current = ApplicationConfiguration(chambers=(self._chamber('ale', 18, profile=profile),))
+        new = ApplicationConfiguration(chambers=(self._chamber('ale', 18, setpoint=12.0),))
+        Main.apply_configuration(current, new, {'ale': ale}, self.drivers, self.sampler, self.gpio)
+        self.assertIsNone(ale.profile())
+        self.assertEqual(ale.setpoint(), 12.0)
+
+
+    def test_apply_configuration(self):
+        current = ApplicationConfiguration(chambers=(self._chamber('ale', 18, setpoint=19.0), self._chamber('lager', 20)))
+        controllers = {chamber.name: Main.create_chamber(chamber, self.gpio, self.sampler, self.drivers)
+                       for chamber in current.chambers}
+        beer_temp, fridge_temp = self.drivers['ale.beer_temp'], self.drivers['ale.fridge_temp']
+        relay = self.drivers['ale.compressor_relay']
+
+        ale = self._chamber('ale', 21, setpoint=12.0, hysteresis=0.2, beer_temperature={'sample_period': 5.0},
+                            fridge_temperature={'temperature': 4.0})
+        new = ApplicationConfiguration(chambers=(ale, self._chamber('lager', 20)))
+
+        self.assertIs(Main.apply_configuration(current, new, controllers, self.drivers, self.sampler, self.gpio), new)
+        ale = controllers['ale']
+        self.assertEqual((ale.setpoint(), ale._hysteresis), (12.0, 0.2))
+
+        # sampling changes apply to the running sensor, other changes rebuild it
+        self.assertIs(self.drivers['ale.beer_temp'], beer_temp)
+        self.assertEqual((self.sampler.find('ale.beer_temp').period, self.sampler.find('ale.beer_temp').max_age), (5.0, 50.0))
+        self.assertIsNot(self.drivers['ale.fridge_temp'], fridge_temp)
+        self.assertIs(self.sampler.find('ale.fridge_temp').sensor, self.drivers['ale.fridge_temp'])
+
+        # the relay is replaced keeping its timing, and the old one switched off
+        self.assertIsNot(self.drivers['ale.compressor_relay'], relay)
+        self.assertIs(ale._comp_relay, self.drivers['ale.compressor_relay'])
+        relay.off.assert_called_once()
+        self.drivers['ale.compressor_relay'].restore.assert_called_once()
+
+        self.assertEqual(self.mock_temperature_factory.call_count, 5)
+        self.assertEqual(self.mock_relay_factory.call_count, 3)
+
+
+    @patch('time.sleep')
+    def test_rebuilt_sensor_closed(self, sleep):
+        devices = dict()
+
+        def max31865(config, gpio):
+            temperature = config.options['temperature']
+            devices[temperature] = FakeSpiDev(FakeMAX31865(temperature=temperature))
+            return MAX31865(spi=HardwareSPI(spi_device=devices[temperature]))
+
+        self.mock_temperature_factory.side_effect = max31865
+        current = ApplicationConfiguration(chambers=(self._chamber('ale', 18),))
+        controllers = {'ale': Main.create_chamber(current.chambers[0], self.gpio, self.sampler, self.drivers)}
+
+        new = ApplicationConfiguration(chambers=(self._chamber('ale', 18, fridge_temperature={'temperature': 4.0}),))
+        Main.apply_configuration(current, new, controllers, self.drivers, self.sampler, self.gpio)
+
+        # the transport of the replaced fridge sensor is closed
+        self.assertIsNone(devices[10.0].opened)
+        self.assertEqual(devices[4.0].opened, (0, 0))
+        self.assertEqual(devices[20.0].opened, (0, 0))
+
+
+    def test_relay_same_pin(self):
+        current = ApplicationConfiguration(chambers=(self._chamber('ale', 18),))
+        controllers = {'ale': Main.create_chamber(current.chambers[0], self.gpio, self.sampler, self.drivers)}
+        relay = self.drivers['ale.compressor_relay']
+        relay.state.return_value = True
+        relay.elapsed_time.return_value = 60.0
+
+        new = ApplicationConfiguration(chambers=(self._chamber('ale', 18, compressor_relay={'active_high': False}),))
+        Main.apply_configuration(current, new, controllers, self.drivers, self.sampler, self.gpio)
+
+        # the running compressor stays on, the new relay is created on and the old one doesn't switch the pin off
+        self.mock_relay_factory.assert_called_with(new.chambers[0].compressor_relay, self.gpio, initial_state=True)
+        relay.off.assert_not_called()
+        self.drivers['ale.compressor_relay'].restore.assert_called_once_with(True, 60.0)
+
+
+    def test_failing_driver(self):
+        current = ApplicationConfiguration(chambers=(self._chamber('ale', 18, setpoint=19.0),))
+        controllers = {'ale': Main.create_chamber(current.chambers[0], self.gpio, self.sampler, self.drivers)}
+        drivers = dict(self.drivers)
+        new = ApplicationConfiguration(chambers=(self._chamber('ale', 21, setpoint=12.0),))
+        self.mock_relay_factory.side_effect = RuntimeError('pin in use')
+
+        # nothing changes when a driver can't be created
+        with self.assertRaises(RuntimeError):
+            Main.apply_configuration(current, new, controllers, self.drivers, self.sampler, self.gpio)
+
+        self.assertEqual(controllers['ale'].setpoint(), 19.0)
+        self.assertEqual(self.drivers, drivers)
+
+
+    def test_restart_required(self):
+        current = ApplicationConfiguration(chambers=(self._chamber('ale', 18),))
+        controllers = {'ale': Main.create_chamber(current.chambers[0], self.gpio, self.sampler, self.drivers)}
+        new = ApplicationConfiguration(gpio=GpioConfiguration(backend='gpiomem'),
+                                       chambers=(self._chamber('ale', 18), self._chamber('lager', 20)))
+
+        with self.assertLogs('Main', 'WARNING') as logs:
+            Main.apply_configuration(current, new, controllers, self.drivers, self.sampler, self.gpio)
+
+        self.assertEqual([record.getMessage() for record in logs.records],
+                         ['gpio configuration changed, restart to apply', 'chamber lager added, restart to apply'])
+        self.assertEqual(list(controllers), ['ale'])
+
+
+    def test_reload_invalid(self):
+        current = ApplicationConfiguration()
+
+        with patch.object(Main, 'import_configuration', side_effect=Main.ConfigurationError('chambers must be a list')):
+            with self.assertLogs('Main', 'ERROR'):
+                self.assertIs(Main.reload_configuration('configuration.yaml', current, dict(), self.drivers,
+                                                        self.sampler, self.gpio), current)
+
+
+    def test_control_loop(self):
+        controllers = {'ale': Mock(), 'lager': Mock()}
+        Main.control_loop(controllers)
+        controllers['ale'].control_loop.assert_called_once()
+        controllers['lager'].control_loop.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import unittest
+import urllib.error
+import urllib.request
+import support
+from Drivers.Metrics import MetricsRegistry, registry
+from Drivers.SolidStateRelay import SolidStateRelay
+from MetricsServer import MetricsServer
+
+
+class TestMetricsRegistry(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+
+    def test_counter(self):
+        counter = self.registry.counter('relay_switches', 'Relay output changes', pin=17)
+        counter.inc()
+        counter.inc(2)
+
+        self.assertIs(self.registry.counter('relay_switches', 'Relay output changes', pin=17), counter)
+        self.assertEqual(self.registry.render(), '# HELP relay_switches Relay output changes\n'
+                                                 '# TYPE relay_switches counter\n'
+                                                 'relay_switches_total{pin="17"} 3\n')
+
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('read_seconds', 'Read duration', buckets=(0.1, 1.0))
+
+        for value in (0.05, 0.1, 0.5, 2.0):
+            histogram.observe(value)
+
+        self.assertEqual(self.registry.render().splitlines()[2:], [
+            'read_seconds_bucket{le="0.1"} 2',
+            'read_seconds_bucket{le="1.0"} 3',
+            'read_seconds_bucket{le="+Inf"} 4',
+            'read_seconds_sum 2.65',
+            'read_seconds_count 4',
+        ])
+
+
+    def test_label_escaping(self):
+        self.registry.counter('events', 'Events', chamber='a "quoted"\\name').inc()
+        self.assertIn('events_total{chamber="a \\"quoted\\"\\\\name"} 1', self.registry.render())
+
+
+    def test_kind_conflict(self):
+        self.registry.counter('events', 'Events')
+
+        with self.assertRaises(Exception):
+            self.registry.histogram('events', 'Events')
+
+
+class FakeGpio:
+
+    def __init__(self):
+        self.pins = dict()
+
+
+    def setup_output(self, pin):
+        self.pins[pin] = False
+
+
+    def write(self, pin, value):
+        self.pins[pin] = bool(value)
+
+
+    def read(self, pin):
+        return self.pins[pin]
+
+
+class TestInstrumentation(unittest.TestCase):
+
+    def test_relay_switches(self):
+        switches = registry.counter('relay_switches', 'Relay output changes', pin=99)
+        before = switches.value
+        relay = SolidStateRelay(99, gpio=FakeGpio())
+
+        relay.off()
+        relay.on()
+        relay.on()
+        relay.toggle()
+
+        self.assertEqual(switches.value - before, 2)
+
+
+class TestMetricsServer(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.registry.counter('events', 'Events').inc()
+        self.server = MetricsServer(port=0, registry=self.registry)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+
+    def test_metrics(self):
+        with urllib.request.urlopen(f'http://127.0.0.1:{self.server.port()}/metrics') as response:
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain; version=0.0.4'))
+            self.assertIn('events_total 1', response.read().decode())
+
+
+    def test_not_found(self):
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            urllib.request.urlopen(f'http://127.0.0.1:{self.server.port()}/')
+
+        self.assertEqual(context.exception.code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
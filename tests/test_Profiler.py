@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest.mock import Mock
+import support
+from Profiler import Profiler, StackSampler, PHASES
+from TemperatureControl import TemperatureControl
+
+
+def burn(seconds):
+    end = time.process_time() + seconds
+    total = 0
+
+    while time.process_time() < end:
+        total += sum(range(100))
+
+    return total
+
+
+class TestStackSampler(unittest.TestCase):
+
+    def test_sample(self):
+        sampler = StackSampler(interval=0.001)
+        sampler.start()
+
+        try:
+            burn(0.2)
+
+        finally:
+            stacks = sampler.stop()
+
+        self.assertGreater(sampler.samples, 0)
+        burning = [stack for stack in stacks if 'burn (test_Profiler.py' in stack]
+        self.assertTrue(burning)
+        self.assertTrue(all(stack.startswith('MainThread;') for stack in burning))
+        self.assertTrue(all('_sample (Profiler.py' not in stack for stack in burning))
+
+
+    def test_write_collapsed(self):
+        sampler = StackSampler()
+        sampler.stacks.update({'MainThread;main (Main.py:1)': 3, 'MainThread;main (Main.py:1);tick (Main.py:5)': 2})
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'profile.collapsed')
+
+        sampler.write_collapsed(path)
+
+        with open(path) as collapsed:
+            self.assertEqual(collapsed.read(), 'MainThread;main (Main.py:1) 3\nMainThread;main (Main.py:1);tick (Main.py:5) 2\n')
+
+
+class TestProfiler(unittest.TestCase):
+
+    def setUp(self):
+        sensor = Mock()
+        sensor.temperature.return_value = 20.0
+        relay = Mock()
+        relay.elapsed_time.return_value = 0
+        self.temp_control = TemperatureControl(sensor, sensor, relay, name='profiled')
+        self.temp_control.start()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+    def test_phase_timing(self):
+        self.assertEqual(self.temp_control.phase_summary(), dict())
+
+        self.temp_control.profile_phases(True)
+        self.temp_control.control_loop()
+        self.temp_control.control_loop()
+        summary = self.temp_control.phase_summary()
+
+        self.assertEqual(tuple(summary), PHASES)
+        self.assertTrue(all(count == 2 and mean >= 0.0 for count, mean in summary.values()))
+
+
+    def test_toggle(self):
+        profiler = Profiler(os.path.join(self.directory, 'profiles'), [self.temp_control], interval=0.001)
+
+        profiler.toggle()
+        self.assertTrue(profiler.running())
+        self.temp_control.control_loop()
+        burn(0.05)
+
+        with self.assertLogs('Profiler') as logs:
+            profiler.toggle()
+
+        self.assertFalse(profiler.running())
+        self.assertEqual(self.temp_control.phase_summary(), dict())
+        self.assertEqual(len(os.listdir(os.path.join(self.directory, 'profiles'))), 1)
+        self.assertIn('profiled loop phases: read', logs.output[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
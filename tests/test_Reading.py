@@ -0,0 +1,39 @@
+import unittest
+from unittest.mock import patch
+import support
+from Drivers.Reading import Reading
+
+
+class TestReading(unittest.TestCase):
+
+    def test_immutable(self):
+        reading = Reading(20.0, gravity=1050, timestamp=10.0, sequence=1)
+
+        with self.assertRaises(AttributeError):
+            reading.value = 21.0
+
+        with self.assertRaises(AttributeError):
+            reading.offset = 1.0
+
+        with self.assertRaises(AttributeError):
+            del reading.gravity
+
+
+    def test_age(self):
+        reading = Reading(20.0, timestamp=10.0)
+        self.assertEqual(reading.age(now=15.0), 5.0)
+        self.assertFalse(reading.is_stale(5.0, now=15.0))
+        self.assertTrue(reading.is_stale(5.0, now=15.5))
+
+        with patch('time.monotonic', return_value=12.0):
+            self.assertEqual(reading.age(), 2.0)
+
+
+    def test_never_received(self):
+        reading = Reading(None)
+        self.assertEqual(reading.age(now=15.0), float('inf'))
+        self.assertTrue(reading.is_stale(1000.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
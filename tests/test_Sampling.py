@@ -0,0 +1,225 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import Mock, patch
+import support
+from Sampling import SamplingScheduler, SampledSensor, read_sample
+from Drivers.Reading import Reading
+from TemperatureControl import TemperatureControl, COMPRESSOR_MIN_OFF_TIME_SEC, STALE_WARNING_INTERVAL_SEC
+
+
+class TestSamplingScheduler(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('time.monotonic', return_value=1000.0)
+        self.mock_monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.fast_sensor = Mock(spec=['temperature'])
+        self.fast_sensor.temperature.return_value = 4.0
+        self.slow_sensor = Mock(spec=['temperature'])
+        self.slow_sensor.temperature.return_value = 18.0
+
+        self.scheduler = SamplingScheduler()
+        self.fast = self.scheduler.add(self.fast_sensor, period=1.0, max_age=5.0, name='fast')
+        self.slow = self.scheduler.add(self.slow_sensor, period=10.0, max_age=30.0, name='slow')
+
+
+    def test_sampled_when_added(self):
+        self.assertEqual(self.fast.temperature(), 4.0)
+        self.assertEqual(self.slow.temperature(), 18.0)
+        self.assertEqual(self.fast_sensor.temperature.call_count, 1)
+
+
+    def test_own_sample_rate(self):
+        for now in range(1001, 1021):
+            self.mock_monotonic.return_value = float(now)
+            self.scheduler.run_pending()
+
+        self.assertEqual(self.fast_sensor.temperature.call_count, 21)
+        self.assertEqual(self.slow_sensor.temperature.call_count, 3)
+
+
+    def test_next_due(self):
+        self.mock_monotonic.return_value = 1000.25
+        self.assertAlmostEqual(self.scheduler.run_pending(), 0.75)
+
+
+    def test_missed_samples_skipped(self):
+        self.mock_monotonic.return_value = 1005.5
+        self.assertAlmostEqual(self.scheduler.run_pending(), 0.5)
+        self.assertEqual(self.fast_sensor.temperature.call_count, 2)
+
+
+    def test_cached(self):
+        self.fast_sensor.temperature.return_value = 5.0
+        self.assertEqual(self.fast.temperature(), 4.0)
+
+        self.mock_monotonic.return_value = 1001.0
+        self.scheduler.run_pending()
+        self.assertEqual(self.fast.temperature(), 5.0)
+
+
+    def test_age_and_stale(self):
+        self.mock_monotonic.return_value = 1004.0
+        sample = self.fast.sample()
+        self.assertEqual(sample.value, 4.0)
+        self.assertEqual(sample.age, 4.0)
+        self.assertFalse(sample.stale)
+
+        self.mock_monotonic.return_value = 1006.0
+        self.assertTrue(self.fast.sample().stale)
+
+
+    def test_failed_read(self):
+        self.fast_sensor.temperature.side_effect = IOError()
+        self.mock_monotonic.return_value = 1001.0
+        self.scheduler.run_pending()
+
+        sample = self.fast.sample()
+        self.assertEqual(sample.value, 4.0)
+        self.assertEqual(sample.age, 1.0)
+
+
+    def test_never_sampled(self):
+        sensor = Mock(spec=['temperature'])
+        sensor.temperature.side_effect = IOError()
+        sample = SampledSensor(sensor, period=1.0, max_age=5.0).sample()
+        self.assertIsNone(sample.value)
+        self.assertTrue(sample.stale)
+
+
+    def test_driver_reading_age(self):
+        sensor = Mock(spec=['temperature', 'reading'])
+        sensor.reading.return_value = Reading(19.5, gravity=1050, timestamp=990.0, sequence=3)
+        sampled = self.scheduler.add(sensor, period=1.0, max_age=5.0)
+
+        self.assertIs(sampled.reading(), sensor.reading.return_value)
+        sample = sampled.sample()
+        self.assertEqual(sample.value, 19.5)
+        self.assertEqual(sample.age, 10.0)
+        self.assertTrue(sample.stale)
+
+
+    def test_read_sample(self):
+        self.assertIs(read_sample(self.fast).value, 4.0)
+
+        sample = read_sample(self.slow_sensor)
+        self.assertEqual(sample.value, 18.0)
+        self.assertEqual(sample.age, 0.0)
+        self.assertFalse(sample.stale)
+
+
+class TestSamplingAsync(unittest.TestCase):
+
+    def test_added_while_running(self):
+        sensor = Mock(spec=['temperature'])
+        sensor.temperature.return_value = 10.0
+        scheduler = SamplingScheduler()
+
+        async def run():
+            task = asyncio.ensure_future(scheduler.run_async(idle_delay=0.01))
+            await asyncio.sleep(0.02)
+            scheduler.add(sensor, period=0.01, max_age=1.0)
+            deadline = time.monotonic() + 5.0
+
+            while sensor.temperature.call_count < 5 and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+
+            task.cancel()
+
+        asyncio.run(run())
+        self.assertGreaterEqual(sensor.temperature.call_count, 5)
+
+
+    def test_concurrent_reads(self):
+        active = []
+        overlap = []
+        slow = []
+
+        def read():
+            active.append(None)
+            overlap.append(len(active))
+
+            if slow:
+                time.sleep(0.15)
+
+            active.pop()
+            return 20.0
+
+        scheduler = SamplingScheduler()
+
+        for name in ['fridge', 'beer']:
+            sensor = Mock(spec=['temperature'])
+            sensor.temperature.side_effect = read
+            scheduler.add(sensor, period=0.2, max_age=1.0, name=name)
+
+        async def run():
+            slow.append(None)
+            task = asyncio.ensure_future(scheduler.run_async())
+            await asyncio.sleep(0.3)
+            task.cancel()
+            await asyncio.sleep(0.1)
+
+        asyncio.run(run())
+
+        # sampled one after the other when added, then at the same time
+        self.assertEqual(overlap, [1, 1, 1, 2])
+
+
+class TestStaleControl(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch('time.monotonic', return_value=1000.0)
+        self.mock_monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.fridge_sensor = Mock(spec=['temperature'])
+        self.fridge_sensor.temperature.return_value = 25.0
+        self.beer_sensor = Mock(spec=['temperature'])
+        self.beer_sensor.temperature.return_value = 20.0
+        self.mock_relay = Mock()
+        self.mock_relay.elapsed_time.return_value = COMPRESSOR_MIN_OFF_TIME_SEC + 1
+
+        self.scheduler = SamplingScheduler()
+        fridge = self.scheduler.add(self.fridge_sensor, period=1.0, max_age=5.0)
+        beer = self.scheduler.add(self.beer_sensor, period=10.0, max_age=60.0)
+
+        self.temp_control = TemperatureControl(fridge_temp=fridge, beer_temp=beer, comp_relay=self.mock_relay)
+        self.temp_control.set_temperature_setpoint(20.0)
+        self.temp_control.start()
+
+
+    def test_fresh(self):
+        self.temp_control.control_loop()
+        self.assertEqual(self.temp_control.state, 'cooling')
+        self.fridge_sensor.temperature.assert_called_once()
+
+
+    def test_stale_no_cooling(self):
+        self.mock_monotonic.return_value = 1010.0
+        self.temp_control.control_loop()
+        self.assertEqual(self.temp_control.state, 'neutral')
+        self.mock_relay.on.assert_not_called()
+
+
+    def test_stale_warnings(self):
+        self.temp_control.control_loop()
+
+        # warned when the readings become stale, and again only after STALE_WARNING_INTERVAL_SEC
+        with self.assertLogs('TemperatureControl', 'INFO') as logs:
+            for now in [1010.0, 1011.0, 1010.0 + STALE_WARNING_INTERVAL_SEC - 1, 1010.0 + STALE_WARNING_INTERVAL_SEC]:
+                self.mock_monotonic.return_value = now
+                self.temp_control.control_loop()
+
+            self.scheduler.run_pending()
+            self.temp_control.control_loop()
+            self.temp_control.control_loop()
+
+        messages = [record.getMessage() for record in logs.records]
+        self.assertEqual(len([message for message in messages if message.startswith('stale temperature readings')]), 2)
+        self.assertEqual(messages.count('temperature readings recovered'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import unittest
+import support
+from Drivers.Clock import SimulatedClock
+from Simulation.ThermalModel import ThermalModel, fermentation_curve
+from Simulation.SimulatedDevices import SimulatedSensor, SimulatedTilt, SimulatedRelay
+from Simulation.Simulator import Simulator, SimulationReport
+
+
+class TestSimulatedClock(unittest.TestCase):
+
+    def test_advance(self):
+        clock = SimulatedClock(start=10.0, epoch=1000.0)
+        self.assertEqual((clock.monotonic(), clock.time()), (10.0, 1000.0))
+
+        clock.sleep(5.0)
+        clock.advance(1.5)
+        self.assertEqual((clock.monotonic(), clock.time()), (16.5, 1006.5))
+
+        with self.assertRaises(ValueError):
+            clock.advance(-1.0)
+
+
+class TestThermalModel(unittest.TestCase):
+
+    def test_ambient_equilibrium(self):
+        model = ThermalModel(air_temperature=10.0, beer_temperature=10.0, ambient_temperature=22.0)
+        model.step(30 * 86400.0, compressor_on=False)
+        self.assertAlmostEqual(model.air_temperature, 22.0, places=2)
+        self.assertAlmostEqual(model.beer_temperature, 22.0, places=2)
+
+
+    def test_compressor_cools_air_first(self):
+        model = ThermalModel(air_temperature=20.0, beer_temperature=20.0, ambient_temperature=20.0)
+        model.step(3600.0, compressor_on=True)
+        self.assertLess(model.air_temperature, model.beer_temperature)
+        self.assertLess(model.beer_temperature, 20.0)
+
+
+    def test_fermentation_heat(self):
+        model = ThermalModel(ambient_temperature=20.0, fermentation_power=10.0)
+        model.step(86400.0, compressor_on=False)
+        self.assertGreater(model.beer_temperature, model.air_temperature)
+        self.assertGreater(model.air_temperature, 20.0)
+
+
+    def test_fermentation_curve(self):
+        power = fermentation_curve(peak_power=10.0, peak_time=100.0, duration=300.0)
+        self.assertEqual([power(t) for t in [0.0, 50.0, 100.0, 200.0, 300.0]], [0.0, 5.0, 10.0, 5.0, 0.0])
+
+
+class TestSimulatedDevices(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = SimulatedClock()
+        self.model = ThermalModel(air_temperature=4.01, beer_temperature=18.3)
+
+
+    def test_sensor(self):
+        sensor = SimulatedSensor(self.model, 'air_temperature', self.clock)
+        self.assertEqual(sensor.temperature(), 4.0)
+        self.assertEqual(sensor.reading().sequence, 1)
+
+
+    def test_tilt(self):
+        tilt = SimulatedTilt(self.model, self.clock, interval=30.0)
+        self.assertEqual(tilt.temperature(), 18.33)
+
+        # no new beacon until the interval has passed
+        self.model.beer_temperature = 10.0
+        self.clock.advance(29.0)
+        self.assertEqual(tilt.temperature(), 18.33)
+        self.clock.advance(1.0)
+        self.assertEqual(tilt.temperature(), 10.0)
+        self.assertEqual(tilt.reading().timestamp, 30.0)
+
+
+    def test_relay(self):
+        relay = SimulatedRelay(self.clock)
+        self.clock.advance(10.0)
+        self.assertEqual(relay.elapsed_time(), 10.0)
+
+        relay.on()
+        relay.on()
+        self.clock.advance(2.0)
+        self.assertTrue(relay.state())
+        self.assertEqual(relay.elapsed_time(), 2.0)
+        self.assertEqual(relay.switch_count, 1)
+
+
+class TestSimulator(unittest.TestCase):
+
+    def test_holds_setpoint(self):
+        model = ThermalModel(air_temperature=20.0, beer_temperature=20.0, ambient_temperature=22.0,
+                             fermentation_power=fermentation_curve(peak_power=5.0))
+        simulator = Simulator(model=model, setpoints=[(0.0, 18.0), (3 * 86400.0, 16.0)])
+        report = simulator.run(5 * 86400.0)
+
+        self.assertEqual(report.duration, 5 * 86400.0)
+        self.assertAlmostEqual(model.beer_temperature, 16.0, delta=1.0)
+        self.assertGreater(report.compressor_cycles, 0)
+        self.assertGreater(report.time_in_band_ratio(), 0.5)
+        self.assertLess(report.overshoot, 2.0)
+        self.assertEqual(simulator.clock.monotonic(), 5 * 86400.0)
+        self.assertEqual(simulator.controller.state, 'stop')
+
+
+    def test_report(self):
+        report = SimulationReport(band=0.5)
+        report.record(10.0, 18.0, 20.0, True)
+        report.record(10.0, 18.0, 18.2, False)
+        report.record(10.0, 18.0, 18.6, False)
+
+        self.assertEqual(report.overshoot, 0.6000000000000014)
+        self.assertAlmostEqual(report.time_in_band_ratio(), 1 / 3)
+        self.assertAlmostEqual(report.compressor_duty(), 1 / 3)
+        self.assertIn('compressor', str(report))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import unittest
+from unittest.mock import Mock
+import support
+from StateMachine import StateMachine, MachineError
+from Drivers.Metrics import registry
+
+
+class Model:
+
+    def __init__(self):
+        self.calls = []
+        self.ready = True
+        self.busy = False
+
+
+    def is_ready(self, *args, **kwargs):
+        self.calls.append(('is_ready', args, kwargs))
+        return self.ready
+
+
+    def is_busy(self, *args, **kwargs):
+        return self.busy
+
+
+    def on_go(self, *args, **kwargs):
+        self.calls.append(('on_go', args, kwargs))
+
+
+class TestStateMachine(unittest.TestCase):
+
+    def setUp(self):
+        self.model = Model()
+        self.machine = StateMachine(self.model, states=['idle', 'running', 'stopped'], initial='idle')
+        self.machine.add_transition('go', 'idle', 'running', conditions='is_ready', unless=['is_busy'], before='on_go')
+        self.machine.add_transition('halt', '*', 'stopped')
+
+
+    def test_initial(self):
+        self.assertEqual(self.model.state, 'idle')
+
+
+    def test_trigger(self):
+        self.assertTrue(self.model.go(1, x=2))
+        self.assertEqual(self.model.state, 'running')
+        self.assertEqual(self.model.calls, [('is_ready', (1,), {'x': 2}), ('on_go', (1,), {'x': 2})])
+
+
+    def test_conditions(self):
+        self.model.ready = False
+        self.assertFalse(self.model.go())
+        self.assertEqual(self.model.state, 'idle')
+
+        self.model.ready = True
+        self.model.busy = True
+        self.assertFalse(self.model.go())
+        self.assertEqual(self.model.state, 'idle')
+
+
+    def test_transitions_counted(self):
+        taken = registry.counter('state_machine_transitions', 'State machine transitions taken', machine='Model',
+                                 trigger='halt', dest='stopped')
+        before = taken.value
+
+        self.model.halt()
+        self.model.halt()
+
+        self.assertEqual(taken.value - before, 2)
+
+
+    def test_after_state_change(self):
+        model = Model()
+        after = Mock()
+        machine = StateMachine(model, states=['idle', 'running'], initial='idle', after_state_change=after)
+        machine.add_transition('go', 'idle', 'running')
+
+        model.go(1)
+        model.go(2)
+        after.assert_called_once_with(1)
+
+
+    def test_invalid_trigger_ignored(self):
+        self.model.halt()
+        self.assertFalse(self.model.go())
+        self.assertEqual(self.model.state, 'stopped')
+
+
+    def test_wildcard_includes_dest(self):
+        self.assertTrue(self.model.halt())
+        self.assertTrue(self.model.halt())
+        self.assertEqual(self.model.state, 'stopped')
+
+
+    def test_first_allowed_transition_taken(self):
+        first = Mock(return_value=False)
+        second = Mock(return_value=True)
+        self.machine.add_transition('next', 'idle', 'stopped', conditions=first)
+        self.machine.add_transition('next', 'idle', 'running', conditions=second)
+
+        self.assertTrue(self.model.next())
+        self.assertEqual(self.model.state, 'running')
+        first.assert_called_once_with()
+
+
+    def test_bound_methods(self):
+        callback = Mock()
+        self.machine.add_transition('jump', ['idle', 'running'], 'running', conditions=self.model.is_ready, before=[callback, callback])
+        self.model.jump(5)
+        self.assertEqual(self.model.state, 'running')
+        self.assertEqual(callback.call_count, 2)
+
+
+    def test_unknown_states(self):
+        with self.assertRaises(MachineError):
+            StateMachine(Model(), states=['idle'], initial='running')
+
+        with self.assertRaises(MachineError):
+            self.machine.add_transition('go', 'idle', 'flying')
+
+        with self.assertRaises(MachineError):
+            self.machine.add_transition('go', 'flying', 'idle')
+
+
+    def test_unknown_callback(self):
+        with self.assertRaises(AttributeError):
+            self.machine.add_transition('go', 'idle', 'running', conditions='is_flying')
+
+
+if __name__ == '__main__':
+    unittest.main()
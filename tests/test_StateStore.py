@@ -0,0 +1,152 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+import support
+from Drivers.Clock import SimulatedClock
+from Simulation.SimulatedDevices import SimulatedRelay
+from StateStore import StateStore
+from TemperatureControl import TemperatureControl, COMPRESSOR_MIN_OFF_TIME_SEC, CHECKPOINT_INTERVAL_SEC
+
+
+class TestStateStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'state.json')
+        self.clock = SimulatedClock(start=100.0, epoch=1000000.0)
+
+
+    def test_save_and_load(self):
+        store = StateStore(self.path, clock=self.clock, boot_id='boot')
+        self.assertIsNone(store.load('ale'))
+
+        store.save('ale', {'state': 'cooling'})
+        store.save('lager', {'state': 'neutral'})
+
+        self.assertEqual(os.listdir(self.directory), ['state.json'])
+        record = StateStore(self.path, clock=self.clock, boot_id='boot').load('ale')
+        self.assertEqual(record, {'state': 'cooling', 'boot_id': 'boot', 'saved': {'time': 1000000.0, 'monotonic': 100.0}})
+
+
+    def test_unreadable_file(self):
+        with open(self.path, 'w') as state_file:
+            state_file.write('{"ale": ')
+
+        with self.assertLogs('StateStore', 'WARNING'):
+            store = StateStore(self.path, clock=self.clock, boot_id='boot')
+
+        self.assertIsNone(store.load('ale'))
+
+
+    def test_elapsed(self):
+        store = StateStore(self.path, clock=self.clock, boot_id='boot')
+        stamp = store.stamp(30.0)
+        self.assertEqual(stamp, {'time': 999970.0, 'monotonic': 70.0})
+
+        # the monotonic clock within the same boot, the wall clock after a reboot
+        self.assertEqual(store.elapsed({'time': 0.0, 'monotonic': 70.0}, {'boot_id': 'boot'}), 30.0)
+        self.assertEqual(store.elapsed({'time': 999970.0, 'monotonic': 0.0}, {'boot_id': 'other'}), 30.0)
+
+        # wall clock gone backwards
+        self.assertEqual(store.elapsed({'time': 2000000.0, 'monotonic': 0.0}, {'boot_id': 'other'}), 0.0)
+
+
+class TestWarmRestart(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.path = os.path.join(self.directory, 'state.json')
+
+
+    def _controller(self, clock, boot_id, setpoint=20.0):
+        self.fridge_temp = Mock()
+        self.fridge_temp.temperature.return_value = 25.0
+        self.beer_temp = Mock()
+        self.beer_temp.temperature.return_value = 20.0
+        self.relay = SimulatedRelay(clock)
+        store = StateStore(self.path, clock=clock, boot_id=boot_id)
+        temp_control = TemperatureControl(self.fridge_temp, self.beer_temp, self.relay, name='ale', clock=clock,
+                                          state_store=store)
+        temp_control.set_temperature_setpoint(setpoint, configured=True)
+        return temp_control
+
+
+    def _cool(self, clock):
+        temp_control = self._controller(clock, 'first')
+        self.assertFalse(temp_control.restore())
+        temp_control.start()
+        temp_control.set_temperature_setpoint(19.0)
+        clock.advance(COMPRESSOR_MIN_OFF_TIME_SEC + 1)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.state, 'cooling')
+
+        with open(self.path) as state_file:
+            record = json.load(state_file)['ale']
+
+        self.assertEqual((record['state'], record['beer_setpoint'], record['compressor']['state']), ('cooling', 19.0, True))
+        return temp_control
+
+
+    def test_restart_after_clean_shutdown(self):
+        clock = SimulatedClock(epoch=1000000.0)
+        temp_control = self._cool(clock)
+        clock.advance(600.0)
+        self.relay.off()
+        temp_control.checkpoint()
+
+        # rebooted 100s later
+        clock = SimulatedClock(epoch=clock.time() + 100.0)
+        temp_control = self._controller(clock, 'second')
+        self.assertTrue(temp_control.restore())
+
+        self.assertEqual((temp_control.state, temp_control.setpoint()), ('neutral', 19.0))
+        self.assertFalse(self.relay.state())
+        self.assertEqual(self.relay.elapsed_time(), 100.0)
+
+        temp_control.start()
+        clock.advance(COMPRESSOR_MIN_OFF_TIME_SEC - 100.0 + 1)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.state, 'cooling')
+
+
+    def test_restart_with_changed_setpoint(self):
+        clock = SimulatedClock(epoch=1000000.0)
+        self._cool(clock)
+
+        # the setpoint changed at runtime is restored while the configuration is unchanged
+        temp_control = self._controller(clock, 'first')
+        temp_control.restore()
+        self.assertEqual(temp_control.setpoint(), 19.0)
+
+        # the configuration wins once its setpoint was changed
+        temp_control = self._controller(clock, 'first', setpoint=12.0)
+        temp_control.restore()
+        self.assertEqual(temp_control.setpoint(), 12.0)
+
+
+    def test_restart_after_crash_while_cooling(self):
+        clock = SimulatedClock(epoch=1000000.0)
+        temp_control = self._cool(clock)
+
+        for i in range(150):
+            clock.advance(1.0)
+            temp_control.control_loop()
+
+        # crashed 150s after the compressor turned on, last checkpoint at 120s, restarted 500s after the crash
+        clock = SimulatedClock(epoch=clock.time() + 500.0)
+        temp_control = self._controller(clock, 'second')
+        temp_control.restore()
+
+        self.assertFalse(self.relay.state())
+        self.assertEqual(self.relay.elapsed_time(), 30.0 + 500.0 - CHECKPOINT_INTERVAL_SEC)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.state, 'cooling')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 from unittest.mock import Mock
+import support
 from fermentation.TemperatureControl import TemperatureControl, COMPRESSOR_MIN_OFF_TIME_SEC, COMPRESSOR_MIN_ON_TIME_SEC
 
 
@@ -0,0 +1,140 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import Mock
+import support
+from Drivers.Clock import SimulatedClock
+from StateStore import StateStore
+from TemperatureControl import TemperatureControl
+from TemperatureProfile import TemperatureProfile, SECONDS_PER_DAY
+
+
+DAY = SECONDS_PER_DAY
+START = 1000000.0
+
+
+def fermentation_profile(start=START):
+    """
+    18°C for 5 days, ramp to 21°C over 2 days, then cold crash to 2°C for 3 days
+    """
+    return TemperatureProfile([('hold', 18.0, 5 * DAY), ('ramp', 21.0, 2 * DAY), ('hold', 2.0, 3 * DAY)], start=start)
+
+
+class TestTemperatureProfile(unittest.TestCase):
+
+    def test_breakpoints(self):
+        profile = fermentation_profile()
+        self.assertEqual(profile.breakpoints(), [(0.0, 18.0), (5 * DAY, 18.0), (7 * DAY, 21.0), (7 * DAY, 2.0), (10 * DAY, 2.0)])
+        self.assertEqual(profile.duration(), 10 * DAY)
+
+
+    def test_setpoint(self):
+        profile = fermentation_profile()
+
+        self.assertIsNone(profile.setpoint(START - 1.0))
+        self.assertEqual(profile.setpoint(START), 18.0)
+        self.assertEqual(profile.setpoint(START + 5 * DAY), 18.0)
+        self.assertAlmostEqual(profile.setpoint(START + 6 * DAY), 19.5)
+        self.assertAlmostEqual(profile.setpoint(START + 7 * DAY - 1.0), 21.0, places=3)
+
+        # straight from the end of the ramp into the cold crash
+        self.assertEqual(profile.setpoint(START + 7 * DAY), 2.0)
+        self.assertFalse(profile.finished(START + 10 * DAY - 1.0))
+
+        # the last temperature is held once finished
+        self.assertEqual(profile.setpoint(START + 20 * DAY), 2.0)
+        self.assertTrue(profile.finished(START + 10 * DAY))
+
+
+    def test_not_started(self):
+        profile = fermentation_profile(start=None)
+        self.assertIsNone(profile.setpoint(START))
+        self.assertFalse(profile.finished(START + 20 * DAY))
+
+
+    def test_invalid(self):
+        with self.assertRaisesRegex(ValueError, 'can not start with a ramp'):
+            TemperatureProfile([('ramp', 21.0, DAY)])
+
+        with self.assertRaisesRegex(ValueError, 'duration must be positive'):
+            TemperatureProfile([('hold', 18.0, 0.0)])
+
+        with self.assertRaisesRegex(ValueError, 'at least one segment'):
+            TemperatureProfile([])
+
+
+class TestProfileControl(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = SimulatedClock(epoch=START)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+    def _controller(self, profile, state_store=None, restore=False):
+        sensor = Mock()
+        sensor.temperature.return_value = 18.0
+        relay = Mock()
+        relay.elapsed_time.return_value = 0.0
+        relay.state.return_value = False
+        temp_control = TemperatureControl(sensor, sensor, relay, name='ale', clock=self.clock, state_store=state_store,
+                                          profile=profile)
+
+        if restore:
+            temp_control.restore()
+
+        temp_control.start()
+        return temp_control
+
+
+    def test_follow(self):
+        temp_control = self._controller(fermentation_profile(start=START + DAY))
+
+        # the configured setpoint applies until the profile starts
+        temp_control.control_loop()
+        self.assertEqual(temp_control.setpoint(), 20.0)
+
+        self.clock.advance(DAY)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.setpoint(), 18.0)
+
+        # ramps move in steps of the profile resolution
+        self.clock.advance(5 * DAY + 3600.0)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.setpoint(), 18.05)
+
+        self.clock.advance(10 * DAY)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.setpoint(), 2.0)
+
+
+    def test_restart(self):
+        path = os.path.join(self.directory, 'state.json')
+        temp_control = self._controller(fermentation_profile(start=None), StateStore(path, clock=self.clock, boot_id='boot'))
+        temp_control.control_loop()
+        self.assertEqual(temp_control.profile().start, START)
+
+        # restarted 6 days later, the profile continues from its saved start rather than starting over
+        self.clock.advance(6 * DAY)
+        temp_control = self._controller(fermentation_profile(start=None), StateStore(path, clock=self.clock, boot_id='boot'),
+                                        restore=True)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.profile().start, START)
+        self.assertEqual(temp_control.setpoint(), 19.5)
+
+
+    def test_replace(self):
+        temp_control = self._controller(fermentation_profile(start=None))
+        temp_control.control_loop()
+        self.clock.advance(DAY)
+
+        # an edited profile keeps the start of the running one
+        temp_control.set_temperature_profile(TemperatureProfile([('hold', 16.0, 5 * DAY)]))
+        self.assertEqual(temp_control.profile().start, START)
+        temp_control.control_loop()
+        self.assertEqual(temp_control.setpoint(), 16.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+from unittest.mock import patch
+from support import mock_bluetooth
+
+mock_bluetooth()
+
+import Drivers.Tilt.TiltScanner as TiltScanner
+from Drivers.Tilt.Tilt import Tilt, TILTS
+from Drivers.Tilt.decoder import Beacon
+
+
+class TestTiltScanner(unittest.TestCase):
+
+    def setUp(self):
+        patcher = patch.object(TiltScanner.TiltScanner, 'start')
+        self.mock_start = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = patch.object(TiltScanner.TiltScanner, 'stop')
+        self.mock_stop = patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+    def test_shared_scanner(self):
+        red = Tilt('red')
+        purple = Tilt('purple')
+        self.assertIs(red._scanner, purple._scanner)
+        self.mock_start.assert_called_once()
+
+        red.destroy()
+        self.mock_stop.assert_not_called()
+        purple.destroy()
+        self.mock_stop.assert_called_once()
+        self.assertIsNone(TiltScanner._scanner)
+
+
+    def test_release_failing_scanner(self):
+        self.mock_stop.side_effect = RuntimeError('scanner failed')
+        red = Tilt('red')
+
+        with self.assertRaises(RuntimeError):
+            red.destroy()
+
+        self.assertIsNone(TiltScanner._scanner)
+        self.assertEqual(TiltScanner._references, 0)
+
+
+    def test_destroy_twice(self):
+        red = Tilt('red')
+        purple = Tilt('purple')
+        red.destroy()
+        red.destroy()
+        self.mock_stop.assert_not_called()
+        purple.destroy()
+        self.mock_stop.assert_called_once()
+
+
+    def test_kernel_filter_conflict(self):
+        red = Tilt('red', kernel_filter='tilt')
+        purple = Tilt('purple')
+        self.assertEqual(red._scanner.kernel_filter(), 'tilt')
+
+        with self.assertRaisesRegex(Exception, 'Kernel filter ibeacon conflicts with tilt'):
+            Tilt('green', kernel_filter='ibeacon')
+
+        green = Tilt('green', kernel_filter='tilt')
+
+        for tilt in (red, purple, green):
+            tilt.destroy()
+
+        self.assertEqual(TiltScanner._references, 0)
+
+
+    def test_dispatch_by_uuid(self):
+        red = Tilt('red')
+        purple = Tilt('purple')
+
+        red._scanner.dispatch([
+            Beacon(bytes.fromhex(TILTS['purple']), 68, 1050, -59, -70),
+            Beacon(bytes.fromhex('e2c56db5dffb48d2b060d0f5a71096e0'), 1, 2, -59, -70),
+        ])
+
+        self.assertEqual(purple.temperature(), 20.0)
+        self.assertEqual(purple.gravity(), 1050)
+        self.assertEqual(red.temperature(), 0.0)
+
+        red.destroy()
+        purple.destroy()
+
+
+    def test_reading(self):
+        purple = Tilt('purple')
+        self.assertIsNone(purple.reading().timestamp)
+        self.assertEqual(purple.reading().sequence, 0)
+
+        with patch('time.monotonic', return_value=100.0):
+            purple.beacon(68, 1050)
+
+        reading = purple.reading()
+        self.assertEqual((reading.value, reading.gravity, reading.timestamp, reading.sequence), (20.0, 1050, 100.0, 1))
+
+        purple.beacon(77, 1040)
+        self.assertEqual(purple.reading().sequence, 2)
+
+        # published readings are never modified
+        self.assertEqual(reading.value, 20.0)
+
+        purple.destroy()
+
+
+    def test_unsubscribed_not_dispatched(self):
+        red = Tilt('red')
+        scanner = red._scanner
+        red.destroy()
+
+        scanner.dispatch([Beacon(bytes.fromhex(TILTS['red']), 68, 1050, -59, -70)])
+        self.assertEqual(red.temperature(), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import math
+import os
+import shutil
+import tempfile
+import unittest
+import support
+from TimeSeries import TimeSeries, RecordFile, RAW
+
+
+class TestTimeSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+
+    def _open(self, **kwargs):
+        timeseries = TimeSeries(self.directory, **kwargs)
+        self.addCleanup(timeseries.close)
+        return timeseries
+
+
+    def _append(self, timeseries, start, end):
+        """
+        One tick per second, beer temperature rising 0.01 per tick, fridge temperature alternating, relay on every third tick
+        """
+        for t in range(start, end):
+            timeseries.append(float(t), 18.0 + t * 0.01, 4.0 if t % 2 else 6.0, 15.0, 2, t % 3 == 0)
+
+
+    def test_batched_writes(self):
+        timeseries = self._open(batch_size=10, flush_interval=1000.0)
+        self._append(timeseries, 0, 9)
+        raw = timeseries._levels[0].file
+        self.assertEqual(len(raw), 0)
+
+        # pending records are included in queries
+        self.assertEqual(len(timeseries.query_level('raw', 0.0, 100.0)), 9)
+
+        self._append(timeseries, 9, 10)
+        self.assertEqual(len(raw), 10)
+
+
+    def test_flush_interval(self):
+        timeseries = self._open(batch_size=1000, flush_interval=5.0)
+        self._append(timeseries, 0, 6)
+        self.assertEqual(len(timeseries._levels[0].file), 6)
+
+
+    def test_rollups(self):
+        timeseries = self._open(batch_size=100)
+        self._append(timeseries, 0, 7200)
+        timeseries.flush()
+
+        minutes = timeseries.query_level('1m', 0.0, 7200.0)
+        # the bucket still open isn't rolled up yet
+        self.assertEqual(len(minutes), 119)
+
+        first = minutes[0]
+        self.assertEqual((first.timestamp, first.count, first.beer_count, first.fridge_count), (0.0, 60, 60, 60))
+        self.assertAlmostEqual(first.beer_min, 18.0, places=4)
+        self.assertAlmostEqual(first.beer_max, 18.59, places=4)
+        self.assertAlmostEqual(first.beer_mean, 18.295, places=4)
+        self.assertEqual((first.fridge_min, first.fridge_max, first.fridge_mean), (4.0, 6.0, 5.0))
+        self.assertAlmostEqual(first.relay_duty, 1 / 3, places=5)
+
+        quarters = timeseries.query_level('15m', 0.0, 7200.0)
+        self.assertEqual([quarter.timestamp for quarter in quarters], [900.0 * i for i in range(7)])
+        self.assertEqual(quarters[1].count, 900)
+        self.assertAlmostEqual(quarters[1].beer_mean, 18.0 + 0.01 * (900 + 1799) / 2, places=3)
+        self.assertAlmostEqual(quarters[1].beer_max, 18.0 + 17.99, places=3)
+
+        hours = timeseries.query_level('1h', 0.0, 7200.0)
+        self.assertEqual(len(hours), 1)
+        self.assertEqual(hours[0].count, 3600)
+        self.assertAlmostEqual(hours[0].beer_mean, 18.0 + 0.01 * 3599 / 2, places=2)
+
+
+    def test_reopen(self):
+        timeseries = self._open(batch_size=100)
+        self._append(timeseries, 0, 5000)
+        timeseries.close()
+
+        timeseries = self._open(batch_size=100)
+        self._append(timeseries, 5000, 7300)
+        timeseries.flush()
+
+        reference_directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, reference_directory)
+        reference = TimeSeries(reference_directory, batch_size=100)
+        self.addCleanup(reference.close)
+        self._append(reference, 0, 7300)
+        reference.flush()
+
+        for name in ['raw', '1m', '15m', '1h']:
+            self.assertEqual(timeseries.query_level(name, 0.0, 8000.0), reference.query_level(name, 0.0, 8000.0))
+
+
+    def test_query_resolution(self):
+        timeseries = self._open(batch_size=1000)
+        self._append(timeseries, 0, 7200)
+
+        name, records = timeseries.query(7000.0, 7100.0, max_points=1000)
+        self.assertEqual((name, len(records)), ('raw', 100))
+
+        name, records = timeseries.query(0.0, 7200.0, max_points=1000)
+        self.assertEqual((name, len(records)), ('1m', 119))
+
+        name, records = timeseries.query(0.0, 7200.0, max_points=10)
+        self.assertEqual((name, len(records)), ('15m', 7))
+
+        # partially overlapping buckets are included
+        name, records = timeseries.query(930.0, 1000.0, max_points=5)
+        self.assertEqual((name, [record.timestamp for record in records]), ('1m', [900.0, 960.0]))
+
+
+    def test_missing_temperatures(self):
+        timeseries = self._open()
+        timeseries.append(0.0, None, 4.0, 15.0, 1, False)
+        timeseries.append(1.0, 18.0, 4.0, 15.0, 1, False)
+        timeseries.append(60.0, 18.0, 4.0, 15.0, 1, False)
+
+        raw = timeseries.query_level('raw', 0.0, 1.0)
+        self.assertTrue(math.isnan(raw[0].beer_temperature))
+
+        minute = timeseries.query_level('1m', 0.0, 60.0)[0]
+        self.assertEqual((minute.count, minute.beer_count, minute.beer_mean), (2, 1, 18.0))
+
+
+    def test_out_of_order_dropped(self):
+        timeseries = self._open()
+        self._append(timeseries, 10, 12)
+
+        with self.assertLogs('TimeSeries', 'WARNING'):
+            timeseries.append(5.0, 18.0, 4.0, 15.0, 1, False)
+
+        self.assertEqual(len(timeseries.query_level('raw', 0.0, 100.0)), 2)
+
+
+class TestRecordFile(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp()
+        os.close(handle)
+        os.unlink(self.path)
+        self.addCleanup(lambda: os.path.exists(self.path) and os.unlink(self.path))
+
+
+    def test_growth(self):
+        records = RecordFile(self.path, RAW, growth=16)
+        records.append([(float(i), 1.0, 2.0, 3.0, 1, 0) for i in range(40)])
+        self.assertEqual(len(records), 40)
+        self.assertEqual(records.bisect(25.5), 26)
+        records.close()
+
+        self.assertEqual(os.path.getsize(self.path), 64 + 48 * RAW.size)
+
+        records = RecordFile(self.path, RAW)
+        self.assertEqual(len(records), 40)
+        self.assertEqual(records.read(39)[0], 39.0)
+        records.close()
+
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a time series' * 10)
+
+        with self.assertRaises(ValueError):
+            RecordFile(self.path, RAW)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import asyncio
+import errno
+import socket
+import time
+import unittest
+from unittest.mock import MagicMock
+from support import mock_bluetooth
+
+mock_bluetooth()
+
+from Drivers.Tilt.aioscan import BeaconScanner
+from Drivers.Tilt.decoder import decode_packet
+from Drivers.Tilt.TiltScanner import TiltScanner
+from hci_corpus import load_corpus
+
+
+PURPLE_UUID = bytes.fromhex('a495bb40c5b14b44b5121370f02d74de')
+PURPLE_PACKET = bytes.fromhex('043e2a0201030151fb6b4a42651e0201061aff4c000215a495bb40c5b14b44b5121370f02d74de0050042dc5b4')
+
+
+class TestBeaconScanner(unittest.TestCase):
+
+    def setUp(self):
+        self.hci, self.replay = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(self.hci.close)
+        self.addCleanup(self.replay.close)
+
+
+    def test_replay_corpus(self):
+        corpus = load_corpus()
+        received = []
+
+        async def scan():
+            scanner = BeaconScanner(self.hci, received.extend)
+            task = asyncio.create_task(scanner.run())
+
+            for pkt in corpus:
+                self.replay.send(pkt)
+                await asyncio.sleep(0)
+
+            self.replay.close()
+            await asyncio.wait_for(task, timeout=1.0)
+            return scanner
+
+        scanner = asyncio.run(scan())
+        self.assertEqual(scanner.packets, len(corpus))
+        self.assertEqual(received, [beacon for pkt in corpus for beacon in decode_packet(pkt)])
+
+
+    def test_pushed_on_arrival(self):
+        received = []
+
+        async def scan():
+            task = asyncio.create_task(BeaconScanner(self.hci, received.extend).run())
+            await asyncio.sleep(0)
+            self.replay.send(PURPLE_PACKET)
+
+            for i in range(10):
+                await asyncio.sleep(0)
+
+            task.cancel()
+
+        asyncio.run(scan())
+        self.assertEqual([b.uuid for b in received], [PURPLE_UUID])
+
+
+    def test_cancel(self):
+        async def scan():
+            loop = asyncio.get_running_loop()
+            task = asyncio.create_task(BeaconScanner(self.hci, lambda beacons: None).run())
+            await asyncio.sleep(0)
+            task.cancel()
+
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+            self.assertFalse(loop.remove_reader(self.hci.fileno()))
+
+        asyncio.run(scan())
+
+
+    def test_consumer_failure(self):
+        def consumer(beacons):
+            raise RuntimeError('consumer failure')
+
+        async def scan():
+            task = asyncio.create_task(BeaconScanner(self.hci, consumer).run())
+            self.replay.send(PURPLE_PACKET)
+            self.replay.close()
+            await asyncio.wait_for(task, timeout=1.0)
+
+        with self.assertLogs('Drivers.Tilt.aioscan', level='ERROR'):
+            asyncio.run(scan())
+
+
+    def test_socket_error(self):
+        sock = MagicMock(wraps=self.hci)
+        sock.fileno.return_value = self.hci.fileno()
+        sock.recv.side_effect = OSError(errno.ENETDOWN, 'Network is down')
+
+        async def scan():
+            loop = asyncio.get_running_loop()
+            task = asyncio.create_task(BeaconScanner(sock, lambda beacons: None).run())
+            await asyncio.sleep(0)
+            self.replay.send(PURPLE_PACKET)
+
+            with self.assertRaises(OSError) as context:
+                await asyncio.wait_for(task, timeout=1.0)
+
+            self.assertEqual(context.exception.errno, errno.ENETDOWN)
+            self.assertFalse(loop.remove_reader(self.hci.fileno()))
+
+        asyncio.run(scan())
+        sock.recv.assert_called_once()
+
+
+class TestTiltScannerThread(unittest.TestCase):
+
+    def test_dispatch_and_stop(self):
+        hci, replay = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.addCleanup(replay.close)
+        subscriber = MagicMock()
+
+        scanner = TiltScanner(socket_factory=lambda dev_id: hci)
+        scanner.subscribe(PURPLE_UUID, subscriber)
+        scanner.start()
+        replay.send(PURPLE_PACKET)
+
+        deadline = time.monotonic() + 1.0
+        while not subscriber.beacon.called and time.monotonic() < deadline:
+            time.sleep(0.001)
+
+        subscriber.beacon.assert_called_once_with(80, 1069)
+
+        start = time.monotonic()
+        scanner.stop()
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(hci.fileno(), -1)
+
+
+    def test_stop_after_failure(self):
+        def no_adapter(dev_id):
+            raise OSError(errno.ENODEV, 'No such device')
+
+        scanner = TiltScanner(socket_factory=no_adapter)
+
+        with self.assertLogs('Drivers.Tilt.TiltScanner', level='ERROR'):
+            scanner.start()
+            scanner._thread.join(timeout=1.0)
+
+        self.assertTrue(scanner._loop.is_closed())
+        scanner.stop()
+        self.assertIsNone(scanner._thread)
+
+
+if __name__ == '__main__':
+    unittest.main()
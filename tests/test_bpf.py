@@ -0,0 +1,84 @@
+import socket
+import unittest
+import support
+from Drivers.Tilt.bpf import ibeacon_filter, attach_filter, detach_filter
+from Drivers.Tilt.decoder import decode_packet
+from hci_corpus import load_corpus
+
+
+PURPLE_UUID = bytes.fromhex('a495bb40c5b14b44b5121370f02d74de')
+RED_UUID = bytes.fromhex('a495bb10c5b14b44b5121370f02d74de')
+
+
+class TestBpfFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.corpus = load_corpus()
+        self.hci, self.replay = socket.socketpair(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        self.hci.setblocking(False)
+        self.addCleanup(self.hci.close)
+        self.addCleanup(self.replay.close)
+
+
+    def _replay(self, packets):
+        delivered = []
+
+        for pkt in packets:
+            self.replay.send(pkt)
+
+            try:
+                delivered.append(self.hci.recv(260))
+
+            except BlockingIOError:
+                pass
+
+        return delivered
+
+
+    def _expected(self, uuids=None):
+        return [pkt for pkt in self.corpus if decode_packet(pkt, uuids) or (pkt[1] == 0x3e and pkt[4] > 1)]
+
+
+    def test_no_filter(self):
+        self.assertEqual(self._replay(self.corpus), self.corpus)
+
+
+    def test_ibeacon(self):
+        attach_filter(self.hci, ibeacon_filter())
+        delivered = self._replay(self.corpus)
+        self.assertEqual(delivered, self._expected())
+        self.assertLess(len(delivered), len(self.corpus) / 2)
+
+
+    def test_uuids(self):
+        attach_filter(self.hci, ibeacon_filter([PURPLE_UUID, RED_UUID]))
+        delivered = self._replay(self.corpus)
+        self.assertEqual(delivered, self._expected({PURPLE_UUID, RED_UUID}))
+        self.assertLess(len(delivered), len(self._expected()))
+
+        # every delivered single report packet is from one of the uuids
+        for pkt in [pkt for pkt in delivered if pkt[4] == 1]:
+            self.assertTrue(decode_packet(pkt, {PURPLE_UUID, RED_UUID}))
+
+
+    def test_no_uuids(self):
+        attach_filter(self.hci, ibeacon_filter([]))
+        self.assertEqual(self._replay(self.corpus), [pkt for pkt in self.corpus if pkt[1] == 0x3e and pkt[4] > 1])
+
+
+    def test_without_flags(self):
+        pkt = bytes.fromhex('043e270201030151fb6b4a42651b1aff4c000215a495bb40c5b14b44b5121370f02d74de0050042dc5b4')
+        attach_filter(self.hci, ibeacon_filter([PURPLE_UUID]))
+        self.assertEqual(self._replay([pkt]), [pkt])
+        attach_filter(self.hci, ibeacon_filter([RED_UUID]))
+        self.assertEqual(self._replay([pkt]), [])
+
+
+    def test_detach(self):
+        attach_filter(self.hci, ibeacon_filter([]))
+        detach_filter(self.hci)
+        self.assertEqual(self._replay(self.corpus), self.corpus)
+
+
+if __name__ == '__main__':
+    unittest.main()
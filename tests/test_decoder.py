@@ -0,0 +1,68 @@
+import unittest
+import support
+from Drivers.Tilt.decoder import decode_packet, Beacon
+from hci_corpus import load_corpus, legacy_decode_packet
+
+
+TILT_UUIDS = {'a495bb%d0c5b14b44b5121370f02d74de' % i for i in range(1, 9)}
+PURPLE_UUID = bytes.fromhex('a495bb40c5b14b44b5121370f02d74de')
+RED_UUID = bytes.fromhex('a495bb10c5b14b44b5121370f02d74de')
+
+
+class TestDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.corpus = load_corpus()
+
+
+    def test_identical_to_legacy(self):
+        compared = 0
+
+        for pkt in self.corpus:
+            legacy = legacy_decode_packet(pkt)
+
+            # the legacy decoder only handles the last report of a packet correctly
+            if len(legacy) != 1:
+                continue
+
+            expected = [(b['uuid'], b['major'], b['minor']) for b in legacy if b['uuid'] in TILT_UUIDS]
+            decoded = [(b.uuid.hex(), b.major, b.minor) for b in decode_packet(pkt) if b.uuid.hex() in TILT_UUIDS]
+            self.assertEqual(decoded, expected)
+            compared += len(expected)
+
+        self.assertGreater(compared, 0)
+
+
+    def test_multiple_reports(self):
+        multi = [pkt for pkt in self.corpus if len(pkt) > 4 and pkt[1] == 0x3e and pkt[4] > 1]
+        self.assertGreater(len(multi), 0)
+
+        for pkt in multi:
+            tilts = [b for b in decode_packet(pkt) if b.uuid.hex() in TILT_UUIDS]
+            self.assertEqual(len(tilts), 1)
+
+
+    def test_decode(self):
+        pkt = bytes.fromhex('043e2a0201030151fb6b4a42651e0201061aff4c000215a495bb40c5b14b44b5121370f02d74de0050042dc5b4')
+        self.assertEqual(decode_packet(pkt), [Beacon(PURPLE_UUID, 80, 1069, -59, -76)])
+
+
+    def test_uuid_filter(self):
+        pkt = bytes.fromhex('043e2a0201030151fb6b4a42651e0201061aff4c000215a495bb40c5b14b44b5121370f02d74de0050042dc5b4')
+        self.assertEqual(len(decode_packet(pkt, uuids={PURPLE_UUID})), 1)
+        self.assertEqual(decode_packet(pkt, uuids={RED_UUID}), [])
+
+
+    def test_truncated(self):
+        pkt = bytes.fromhex('043e2a0201030151fb6b4a42651e0201061aff4c000215a495bb40c5b14b44b5121370f02d74de0050042dc5b4')
+
+        for length in range(len(pkt)):
+            self.assertEqual(decode_packet(pkt[:length]), [])
+
+
+    def test_not_advertising_report(self):
+        self.assertEqual(decode_packet(bytes.fromhex('040e04010c2000')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()